@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+# Per-day sums, the same fields as the daily_nutrition_rollups table
+DAILY_COLUMNS = ["meal_count", "calories", "protein", "carbs", "fats", "health_score_sum", "health_score_count"]
+MACRO_COLUMNS = ["calories", "protein", "carbs", "fats"]
+
+MACRO_COLORS = {"Protein": "#3B82F6", "Carbs": "#F97316", "Fats": "#8B5CF6"}
+
+
+def _meal_json(meal):
+    return meal.get("meal_json") or {}
+
+
+def meal_dates(meals):
+    """
+    Parse the day of each meal: consumed_date, falling back to the day of uploaded_at.
+
+    Returns:
+        datetime64 Series indexed by the meal's position in `meals`, NaT when unknown
+    """
+    # consumed_date is a plain date, uploaded_at an ISO timestamp; both start with YYYY-MM-DD
+    dates = [str(meal.get("consumed_date") or meal.get("uploaded_at") or "")[:10] for meal in meals]
+    return pd.to_datetime(pd.Series(dates, dtype="object"), format="%Y-%m-%d", errors="coerce")
+
+
+def daily_frame_from_rollups(rollups):
+    """Index daily rollup rows by date, keeping only DAILY_COLUMNS"""
+    if not rollups:
+        return pd.DataFrame(columns=DAILY_COLUMNS, index=pd.DatetimeIndex([], name="date"), dtype="float64")
+    frame = pd.DataFrame(rollups)
+    frame.index = pd.DatetimeIndex(pd.to_datetime(frame["date"].astype("string").str.slice(0, 10)), name="date")
+    return frame[DAILY_COLUMNS].astype("float64")
+
+
+def group_meals_by_date(meals, start_date, end_date):
+    """
+    Group meals by their date, keeping only meals between start_date and end_date (inclusive).
+
+    Returns:
+        Dict of "YYYY-MM-DD" -> list of meals, in their original order
+    """
+    dates = meal_dates(meals)
+    in_range = dates.between(pd.Timestamp(start_date), pd.Timestamp(end_date))
+    day_keys = dates[in_range].dt.strftime("%Y-%m-%d")
+
+    meals_by_date = {}
+    for day, day_positions in day_keys.groupby(day_keys, sort=False).groups.items():
+        meals_by_date[day] = [meals[position] for position in day_positions]
+    return meals_by_date
+
+
+def build_daily_stats(daily, start_date, end_date, date_format, meals_by_date=None):
+    """
+    Build the chart series with one entry per date in the range, including days without meals.
+
+    Args:
+        daily: Frame of DAILY_COLUMNS indexed by date
+        start_date, end_date: First and last day of the range
+        date_format: strftime format of display_date
+        meals_by_date: Optional dict of "YYYY-MM-DD" -> meals, added as each day's "meals"
+    """
+    dates = pd.date_range(start_date, end_date, freq="D")
+    daily = daily.reindex(dates, fill_value=0.0)
+
+    count = daily["health_score_count"].to_numpy()
+    health_score = np.divide(daily["health_score_sum"].to_numpy(), count,
+                             out=np.zeros(len(daily)), where=count > 0)
+
+    columns = {
+        "date": dates.strftime("%Y-%m-%d").tolist(),
+        "display_date": dates.strftime(date_format).tolist(),
+        "meal_count": daily["meal_count"].astype(int).tolist(),
+        "calories": daily["calories"].tolist(),
+        "protein": daily["protein"].tolist(),
+        "carbs": daily["carbs"].tolist(),
+        "fats": daily["fats"].tolist(),
+        "health_score": health_score.tolist(),
+    }
+    daily_stats = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    if meals_by_date is not None:
+        for day in daily_stats:
+            day["meals"] = meals_by_date.get(day["date"], [])
+    return daily_stats
+
+
+def average_macros(daily):
+    """Per-meal averages of calories and macros over a frame of DAILY_COLUMNS"""
+    totals = daily[["meal_count"] + MACRO_COLUMNS].sum()
+    if totals["meal_count"] <= 0:
+        return {column: 0.0 for column in MACRO_COLUMNS}
+    return {column: float(totals[column] / totals["meal_count"]) for column in MACRO_COLUMNS}
+
+
+def summarize(daily):
+    """
+    Summary over a frame of DAILY_COLUMNS. Macro averages are per meal and the
+    health score is averaged over the meals that have one.
+    """
+    averages = average_macros(daily)
+    health_score_count = daily["health_score_count"].sum()
+    avg_health_score = daily["health_score_sum"].sum() / health_score_count if health_score_count else 0
+
+    return {
+        "days_tracked": int((daily["meal_count"] > 0).sum()),
+        "avg_calories": round(averages["calories"]),
+        "avg_health_score": round(float(avg_health_score), 1),
+        "total_meals": int(daily["meal_count"].sum()),
+        "avg_protein": round(averages["protein"]),
+        "avg_carbs": round(averages["carbs"]),
+        "avg_fats": round(averages["fats"]),
+    }
+
+
+def macro_distribution(avg_protein, avg_carbs, avg_fats):
+    """Share of calories from protein, carbs and fats, as whole percentages adding up to 100"""
+    calories = np.array([avg_protein * 4, avg_carbs * 4, avg_fats * 9], dtype="float64")
+    total = calories.sum()
+
+    if total > 0:
+        percentages = np.rint(calories / total * 100).astype(int)
+        # Ensure percentages add up to 100% by adjusting the largest value
+        percentages[int(np.argmax(percentages))] += 100 - percentages.sum()
+    else:
+        percentages = np.array([33, 34, 33])
+
+    return [
+        {"name": name, "value": int(value), "color": MACRO_COLORS[name]}
+        for name, value in zip(MACRO_COLORS, percentages)
+    ]
+
+
+def top_foods(meals, limit=10):
+    """
+    Most frequent ingredient names across meals.
+
+    Ingredients may be dicts (name, food or matched_food) or plain strings.
+    Ties keep the order in which the foods first appear.
+
+    Returns:
+        List of {"name", "count"} dicts, most frequent first
+    """
+    names = [
+        (ingredient.get("name") or ingredient.get("food") or ingredient.get("matched_food"))
+        if isinstance(ingredient, dict) else ingredient
+        for meal in meals
+        for ingredient in (_meal_json(meal).get("ingredients") or [])
+    ]
+    names = [name for name in names if name and isinstance(name, str)]
+    if not names:
+        return []
+
+    # Count the raw names, then merge the few distinct ones case-insensitively
+    codes, uniques = pd.factorize(pd.Series(names, dtype="object"))
+    counts = pd.Series(np.bincount(codes), index=pd.Index(uniques).str.lower())
+    counts = counts.groupby(level=0, sort=False).sum()
+    counts = counts.sort_values(ascending=False, kind="stable").head(limit)
+    return [{"name": name.title(), "count": int(count)} for name, count in counts.items()]
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from prompts import get_chat_summary_prompt
+from settings import (CHAT_HISTORY_RECENT_TURNS, CHAT_HISTORY_TOKEN_BUDGET, CHAT_SUMMARY_BATCH_TURNS,
+                      CHAT_SUMMARY_MAX_TOKENS, CHAT_SUMMARY_CACHE_MAX_ENTRIES, CONVERSATION_CACHE_MAX_ENTRIES)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    """tiktoken encoding of a model, or None if tiktoken or its encoding files are unavailable"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # The encoding files are downloaded on first use
+        print(f"[chat-context] tiktoken encoding for {model} unavailable, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text, model):
+    """Number of tokens of text for a model, estimated as 4 characters per token without tiktoken"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def format_message(message):
+    """One chat message as a prompt line, "User: ..." or "Bot: ..." """
+    role = "User" if message.get("type") == "user" else "Bot"
+    return f"{role}: {message.get('message')}\n"
+
+
+def messages_digest(messages):
+    """Digest identifying a list of chat messages"""
+    payload = json.dumps([[message.get("type"), message.get("message")] for message in messages])
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class ChatContextManager:
+    """
+    Builds the chat history part of the chatbot prompt within a token budget.
+
+    The last recent_turns turns (a user message and its reply) are kept verbatim,
+    as long as they fit in token_budget tokens. Older messages are folded into a
+    rolling summary of at most summary_max_tokens tokens, cached per conversation,
+    so the prompt stays the same size however long the chat runs. The summary is
+    only extended once summary_batch_turns turns have dropped out of the verbatim
+    window, which spreads the summarization calls over several turns.
+
+    Each cached summary remembers a digest of the messages it covers and is
+    rebuilt if a conversation's earlier messages no longer match it. Stored
+    conversations are append-only, so their summaries skip that check.
+    """
+
+    def __init__(self, model, recent_turns=CHAT_HISTORY_RECENT_TURNS, token_budget=CHAT_HISTORY_TOKEN_BUDGET,
+                 summary_batch_turns=CHAT_SUMMARY_BATCH_TURNS, summary_max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+                 max_entries=CHAT_SUMMARY_CACHE_MAX_ENTRIES):
+        self.model = model
+        self.recent_turns = recent_turns
+        self.token_budget = token_budget
+        self.summary_batch_turns = summary_batch_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.max_entries = max_entries
+        self._summaries = OrderedDict()  # conversation key -> (summarized message count, digest, summary)
+        self._lock = threading.Lock()
+        self._stats = {"summaries": 0, "summary_failures": 0, "cache_hits": 0, "cache_misses": 0}
+
+    def count_tokens(self, text):
+        return count_tokens(text, self.model)
+
+    def _get_summary(self, key, messages):
+        """Cached (summarized count, summary) for the conversation if it still matches its messages"""
+        with self._lock:
+            entry = self._summaries.get(key)
+            if entry is not None:
+                summarized, digest, summary = entry
+                matches = digest is None or messages_digest(messages[:summarized]) == digest
+                if summarized <= len(messages) and matches:
+                    self._summaries.move_to_end(key)
+                    self._stats["cache_hits"] += 1
+                    return summarized, summary
+                del self._summaries[key]
+            self._stats["cache_misses"] += 1
+            return 0, ""
+
+    def _set_summary(self, key, messages, summarized, summary, append_only):
+        digest = None if append_only else messages_digest(messages[:summarized])
+        with self._lock:
+            self._summaries[key] = (summarized, digest, summary)
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.max_entries:
+                self._summaries.popitem(last=False)
+
+    def _verbatim_start(self, messages):
+        """Index of the first message kept verbatim: the last turns that fit the token budget"""
+        start, tokens = len(messages), 0
+        while start > 0 and len(messages) - start < 2 * self.recent_turns:
+            tokens += self.count_tokens(format_message(messages[start - 1]))
+            if tokens > self.token_budget and start < len(messages):
+                break
+            start -= 1
+        return start
+
+    def _truncate(self, text, max_tokens):
+        """Cut text to about max_tokens tokens, keeping its end"""
+        if self.count_tokens(text) <= max_tokens:
+            return text
+        encoding = get_encoding(self.model)
+        if encoding is None:
+            return text[-4 * max_tokens:]
+        return encoding.decode(encoding.encode(text, disallowed_special=())[-max_tokens:])
+
+    async def _summarize(self, llm, previous_summary, messages):
+        prompt = get_chat_summary_prompt().format(
+            previous_summary=previous_summary or "None",
+            new_messages="".join(format_message(message) for message in messages),
+            max_words=int(self.summary_max_tokens * 0.75)
+        )
+        result = await llm.ask_async(prompt)
+        if result.get("error") or not result.get("response"):
+            raise ValueError(result.get("error") or "empty summary")
+        return self._truncate(result["response"].strip(), self.summary_max_tokens)
+
+    async def build(self, llm, key, messages, append_only=False):
+        """
+        Build the history of a conversation for the chatbot prompt.
+
+        Args:
+            llm: LLMProvider used to extend the rolling summary
+            key: Conversation key the summary is cached under, e.g. (user_id, conversation_id)
+            messages: The conversation so far, [{"type": "user" | "bot", "message": ...}]
+            append_only: Whether earlier messages can never change, as in stored conversations
+
+        Returns:
+            Tuple of (summary of the earlier messages, recent messages formatted as "User: ..." lines)
+        """
+        messages = messages or []
+        summarized, summary = self._get_summary(key, messages)
+        verbatim_start = max(self._verbatim_start(messages), summarized)
+
+        # Fold the messages that left the verbatim window into the summary once enough
+        # of them add up, or straight away if they would break the token budget
+        pending = messages[summarized:verbatim_start]
+        if pending and (len(pending) >= 2 * self.summary_batch_turns or self.count_tokens(
+                "".join(format_message(message) for message in messages[summarized:])) > self.token_budget):
+            try:
+                summary = await self._summarize(llm, summary, pending)
+                summarized = verbatim_start
+                self._set_summary(key, messages, summarized, summary, append_only)
+                self._stats["summaries"] += 1
+            except Exception as e:
+                # Leave the cache as is so the next turn retries, and drop what did not fit
+                print(f"[chat-context] Summarizing conversation {key} failed: {e}")
+                self._stats["summary_failures"] += 1
+                summarized = verbatim_start
+
+        history = "".join(format_message(message) for message in messages[summarized:])
+        return summary, self._truncate(history, self.token_budget)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "entries": len(self._summaries), "max_entries": self.max_entries}
+
+
+class ConversationCache:
+    """
+    In-process LRU cache of stored conversations and their messages.
+
+    Messages are append-only, so a cached conversation is brought up to date by
+    reading only the messages with an id above its last one. Messages are only
+    added from those reads, never from this process's own writes, which keeps the
+    cache gap-free when several processes append to the same conversation.
+    """
+
+    def __init__(self, max_entries=CONVERSATION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # conversation_id -> (conversation, messages)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, conversation_id):
+        """
+        Returns:
+            Tuple of (conversation, copy of its cached messages), or None if not cached
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(conversation_id)
+            self._stats["hits"] += 1
+            return entry[0], list(entry[1])
+
+    def extend(self, conversation, new_messages):
+        """
+        Add messages read after the last cached one (all of them if not cached).
+
+        Returns:
+            A copy of the conversation's messages, oldest first
+        """
+        with self._lock:
+            _, messages = self._entries.get(conversation["id"], (conversation, []))
+            last_id = messages[-1]["id"] if messages else 0
+            messages.extend(message for message in new_messages if message["id"] > last_id)
+            self._entries[conversation["id"]] = (conversation, messages)
+            self._entries.move_to_end(conversation["id"])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return list(messages)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "max_entries": self.max_entries}
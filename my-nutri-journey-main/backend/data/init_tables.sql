@@ -31,21 +31,142 @@ CREATE TABLE IF NOT EXISTS meals (
     id BIGINT PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
     user_id INTEGER,
     meal_type TEXT,
-    consumed_date TEXT NOT NULL,
+    consumed_date DATE NOT NULL,
     meal_json JSONB,
-    uploaded_at TEXT
+    uploaded_at TIMESTAMPTZ
 );
 
 -- 3. Recommended Meals Table
 CREATE TABLE IF NOT EXISTS recommended_meals (
     id BIGINT PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
     user_id INTEGER NOT NULL,
-    planned_date TEXT NOT NULL,
+    planned_date DATE NOT NULL,
     meal_type TEXT NOT NULL,
     meal_json JSONB,
     created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 4. Daily Nutrition Rollups - per-day totals maintained by a trigger on meals
+CREATE TABLE IF NOT EXISTS daily_nutrition_rollups (
+    user_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    meal_count INTEGER NOT NULL DEFAULT 0,
+    calories DOUBLE PRECISION NOT NULL DEFAULT 0,
+    protein DOUBLE PRECISION NOT NULL DEFAULT 0,
+    carbs DOUBLE PRECISION NOT NULL DEFAULT 0,
+    fats DOUBLE PRECISION NOT NULL DEFAULT 0,
+    health_score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    health_score_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, date)
+);
+
+-- 5. Chatbot conversations and their append-only messages (see data/migrations/004)
+CREATE TABLE IF NOT EXISTS conversations (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id INTEGER NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    id BIGINT PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    conversation_id UUID NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('user', 'bot')),
+    message TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Applies a meal's contribution (or its removal, with negative values) to a day's rollup
+CREATE OR REPLACE FUNCTION apply_daily_nutrition_delta(
+    p_user_id INTEGER,
+    p_date DATE,
+    p_meal_count INTEGER,
+    p_calories DOUBLE PRECISION,
+    p_protein DOUBLE PRECISION,
+    p_carbs DOUBLE PRECISION,
+    p_fats DOUBLE PRECISION,
+    p_health_score_sum DOUBLE PRECISION,
+    p_health_score_count INTEGER
+) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO daily_nutrition_rollups AS r
+        (user_id, date, meal_count, calories, protein, carbs, fats, health_score_sum, health_score_count)
+    VALUES
+        (p_user_id, p_date, p_meal_count, p_calories, p_protein, p_carbs, p_fats, p_health_score_sum, p_health_score_count)
+    ON CONFLICT (user_id, date) DO UPDATE SET
+        meal_count = r.meal_count + EXCLUDED.meal_count,
+        calories = r.calories + EXCLUDED.calories,
+        protein = r.protein + EXCLUDED.protein,
+        carbs = r.carbs + EXCLUDED.carbs,
+        fats = r.fats + EXCLUDED.fats,
+        health_score_sum = r.health_score_sum + EXCLUDED.health_score_sum,
+        health_score_count = r.health_score_count + EXCLUDED.health_score_count;
+
+    DELETE FROM daily_nutrition_rollups
+    WHERE user_id = p_user_id AND date = p_date AND meal_count <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- A nutrition value from meal_json as a number, 0 if missing or not numeric (like _to_number in db_service.py)
+CREATE OR REPLACE FUNCTION nutrition_value(p_value TEXT) RETURNS DOUBLE PRECISION AS $$
+    SELECT CASE WHEN p_value ~ '^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$'
+                THEN p_value::DOUBLE PRECISION ELSE 0 END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Adds (p_sign 1) or removes (p_sign -1) one meal row's contribution to its day's rollup
+CREATE OR REPLACE FUNCTION apply_meal_to_daily_rollup(m meals, p_sign INTEGER) RETURNS VOID AS $$
+DECLARE
+    v_date DATE := COALESCE(m.consumed_date, m.uploaded_at::DATE);
+    v_score DOUBLE PRECISION := nutrition_value(m.meal_json->>'health_score');
+BEGIN
+    IF m.user_id IS NULL OR v_date IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM apply_daily_nutrition_delta(
+        m.user_id,
+        v_date,
+        p_sign,
+        p_sign * nutrition_value(m.meal_json->'macronutrients'->>'calories'),
+        p_sign * nutrition_value(m.meal_json->'macronutrients'->>'protein'),
+        p_sign * nutrition_value(m.meal_json->'macronutrients'->>'carbs'),
+        p_sign * nutrition_value(COALESCE(m.meal_json->'macronutrients'->>'fats', m.meal_json->'macronutrients'->>'fat')),
+        CASE WHEN v_score > 0 THEN p_sign * v_score ELSE 0 END,
+        CASE WHEN v_score > 0 THEN p_sign ELSE 0 END
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Keeps the rollups in step with meals inside the transaction of every meal write
+CREATE OR REPLACE FUNCTION maintain_daily_nutrition_rollups() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_meal_to_daily_rollup(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_meal_to_daily_rollup(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS meals_daily_nutrition_rollups ON meals;
+CREATE TRIGGER meals_daily_nutrition_rollups
+AFTER INSERT OR UPDATE OF user_id, consumed_date, uploaded_at, meal_json OR DELETE ON meals
+FOR EACH ROW EXECUTE FUNCTION maintain_daily_nutrition_rollups();
+
+-- Fills in consumed_date for meals logged without one (see data/migrations/003)
+CREATE OR REPLACE FUNCTION backfill_meal_consumed_dates() RETURNS INTEGER AS $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    UPDATE meals
+    SET consumed_date = uploaded_at::DATE
+    WHERE consumed_date IS NULL AND uploaded_at IS NOT NULL;
+
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Add foreign key constraints (optional but recommended)
 ALTER TABLE meals 
 ADD CONSTRAINT fk_meals_user 
@@ -59,7 +180,22 @@ FOREIGN KEY (user_id)
 REFERENCES users(id) 
 ON DELETE CASCADE;
 
+ALTER TABLE conversations 
+ADD CONSTRAINT fk_conversations_user 
+FOREIGN KEY (user_id) 
+REFERENCES users(id) 
+ON DELETE CASCADE;
+
+ALTER TABLE conversation_messages 
+ADD CONSTRAINT fk_conversation_messages_conversation 
+FOREIGN KEY (conversation_id) 
+REFERENCES conversations(id) 
+ON DELETE CASCADE;
+
 -- Add indexes for performance (optional but recommended)
-CREATE INDEX IF NOT EXISTS idx_meals_user_id ON meals(user_id);
-CREATE INDEX IF NOT EXISTS idx_recommended_meals_user_id ON recommended_meals(user_id);
-CREATE INDEX IF NOT EXISTS idx_recommended_meals_planned_date ON recommended_meals(planned_date);
\ No newline at end of file
+-- Per-user date queries filter on user_id plus one date column, so these are range scans
+CREATE INDEX IF NOT EXISTS idx_meals_user_consumed_date ON meals(user_id, consumed_date, uploaded_at);
+CREATE INDEX IF NOT EXISTS idx_meals_user_uploaded_at ON meals(user_id, uploaded_at);
+CREATE INDEX IF NOT EXISTS idx_recommended_meals_user_planned_date ON recommended_meals(user_id, planned_date);
+CREATE INDEX IF NOT EXISTS idx_conversation_messages_conversation_id ON conversation_messages(conversation_id, id);
+CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id);
\ No newline at end of file
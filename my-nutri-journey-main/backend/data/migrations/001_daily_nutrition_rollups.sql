@@ -0,0 +1,65 @@
+-- Adds the daily_nutrition_rollups table and backfills it from existing meals
+-- Run this in the Supabase SQL Editor
+
+CREATE TABLE IF NOT EXISTS daily_nutrition_rollups (
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    meal_count INTEGER NOT NULL DEFAULT 0,
+    calories DOUBLE PRECISION NOT NULL DEFAULT 0,
+    protein DOUBLE PRECISION NOT NULL DEFAULT 0,
+    carbs DOUBLE PRECISION NOT NULL DEFAULT 0,
+    fats DOUBLE PRECISION NOT NULL DEFAULT 0,
+    health_score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    health_score_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, date)
+);
+
+-- Applies a meal's contribution (or its removal, with negative values) to a day's rollup
+CREATE OR REPLACE FUNCTION apply_daily_nutrition_delta(
+    p_user_id INTEGER,
+    p_date TEXT,
+    p_meal_count INTEGER,
+    p_calories DOUBLE PRECISION,
+    p_protein DOUBLE PRECISION,
+    p_carbs DOUBLE PRECISION,
+    p_fats DOUBLE PRECISION,
+    p_health_score_sum DOUBLE PRECISION,
+    p_health_score_count INTEGER
+) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO daily_nutrition_rollups AS r
+        (user_id, date, meal_count, calories, protein, carbs, fats, health_score_sum, health_score_count)
+    VALUES
+        (p_user_id, p_date, p_meal_count, p_calories, p_protein, p_carbs, p_fats, p_health_score_sum, p_health_score_count)
+    ON CONFLICT (user_id, date) DO UPDATE SET
+        meal_count = r.meal_count + EXCLUDED.meal_count,
+        calories = r.calories + EXCLUDED.calories,
+        protein = r.protein + EXCLUDED.protein,
+        carbs = r.carbs + EXCLUDED.carbs,
+        fats = r.fats + EXCLUDED.fats,
+        health_score_sum = r.health_score_sum + EXCLUDED.health_score_sum,
+        health_score_count = r.health_score_count + EXCLUDED.health_score_count;
+
+    DELETE FROM daily_nutrition_rollups
+    WHERE user_id = p_user_id AND date = p_date AND meal_count <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill from existing meals
+INSERT INTO daily_nutrition_rollups
+    (user_id, date, meal_count, calories, protein, carbs, fats, health_score_sum, health_score_count)
+SELECT
+    user_id,
+    LEFT(COALESCE(NULLIF(consumed_date, ''), uploaded_at), 10) AS date,
+    COUNT(*),
+    SUM(COALESCE((meal_json->'macronutrients'->>'calories')::DOUBLE PRECISION, 0)),
+    SUM(COALESCE((meal_json->'macronutrients'->>'protein')::DOUBLE PRECISION, 0)),
+    SUM(COALESCE((meal_json->'macronutrients'->>'carbs')::DOUBLE PRECISION, 0)),
+    SUM(COALESCE((meal_json->'macronutrients'->>'fats')::DOUBLE PRECISION,
+                 (meal_json->'macronutrients'->>'fat')::DOUBLE PRECISION, 0)),
+    SUM(GREATEST(COALESCE((meal_json->>'health_score')::DOUBLE PRECISION, 0), 0)),
+    SUM(CASE WHEN COALESCE((meal_json->>'health_score')::DOUBLE PRECISION, 0) > 0 THEN 1 ELSE 0 END)
+FROM meals
+WHERE user_id IS NOT NULL AND COALESCE(NULLIF(consumed_date, ''), uploaded_at) IS NOT NULL
+GROUP BY 1, 2
+ON CONFLICT (user_id, date) DO NOTHING;
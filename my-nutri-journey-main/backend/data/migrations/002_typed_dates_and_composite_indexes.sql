@@ -0,0 +1,69 @@
+-- Converts the date columns stored as TEXT to DATE/TIMESTAMPTZ and replaces the
+-- single-column indexes with (user_id, date) composite indexes
+-- Run this in the Supabase SQL Editor after 001_daily_nutrition_rollups.sql
+
+-- 1. Meals: uploaded_at values that do not start with YYYY-MM-DD become NULL instead of
+--    failing the cast, and a missing consumed_date falls back to the day of uploaded_at
+ALTER TABLE meals
+    ALTER COLUMN uploaded_at TYPE TIMESTAMPTZ
+        USING CASE WHEN uploaded_at ~ '^\d{4}-\d{2}-\d{2}' THEN uploaded_at::TIMESTAMPTZ END,
+    ALTER COLUMN consumed_date TYPE DATE
+        USING COALESCE(
+            CASE WHEN consumed_date ~ '^\d{4}-\d{2}-\d{2}' THEN LEFT(consumed_date, 10)::DATE END,
+            CASE WHEN uploaded_at ~ '^\d{4}-\d{2}-\d{2}' THEN LEFT(uploaded_at, 10)::DATE END
+        );
+
+-- 2. Recommended meals
+ALTER TABLE recommended_meals
+    ALTER COLUMN planned_date TYPE DATE USING LEFT(planned_date, 10)::DATE;
+
+-- 3. Daily nutrition rollups, and the function that maintains them
+DROP FUNCTION IF EXISTS apply_daily_nutrition_delta(
+    INTEGER, TEXT, INTEGER, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION,
+    DOUBLE PRECISION, DOUBLE PRECISION, INTEGER
+);
+
+ALTER TABLE daily_nutrition_rollups
+    ALTER COLUMN date TYPE DATE USING date::DATE;
+
+CREATE OR REPLACE FUNCTION apply_daily_nutrition_delta(
+    p_user_id INTEGER,
+    p_date DATE,
+    p_meal_count INTEGER,
+    p_calories DOUBLE PRECISION,
+    p_protein DOUBLE PRECISION,
+    p_carbs DOUBLE PRECISION,
+    p_fats DOUBLE PRECISION,
+    p_health_score_sum DOUBLE PRECISION,
+    p_health_score_count INTEGER
+) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO daily_nutrition_rollups AS r
+        (user_id, date, meal_count, calories, protein, carbs, fats, health_score_sum, health_score_count)
+    VALUES
+        (p_user_id, p_date, p_meal_count, p_calories, p_protein, p_carbs, p_fats, p_health_score_sum, p_health_score_count)
+    ON CONFLICT (user_id, date) DO UPDATE SET
+        meal_count = r.meal_count + EXCLUDED.meal_count,
+        calories = r.calories + EXCLUDED.calories,
+        protein = r.protein + EXCLUDED.protein,
+        carbs = r.carbs + EXCLUDED.carbs,
+        fats = r.fats + EXCLUDED.fats,
+        health_score_sum = r.health_score_sum + EXCLUDED.health_score_sum,
+        health_score_count = r.health_score_count + EXCLUDED.health_score_count;
+
+    DELETE FROM daily_nutrition_rollups
+    WHERE user_id = p_user_id AND date = p_date AND meal_count <= 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 4. Composite indexes; the user_id-only and planned_date-only indexes are prefixes of these
+CREATE INDEX IF NOT EXISTS idx_meals_user_consumed_date ON meals(user_id, consumed_date, uploaded_at);
+CREATE INDEX IF NOT EXISTS idx_meals_user_uploaded_at ON meals(user_id, uploaded_at);
+CREATE INDEX IF NOT EXISTS idx_recommended_meals_user_planned_date ON recommended_meals(user_id, planned_date);
+
+DROP INDEX IF EXISTS idx_meals_user_id;
+DROP INDEX IF EXISTS idx_recommended_meals_user_id;
+DROP INDEX IF EXISTS idx_recommended_meals_planned_date;
+
+ANALYZE meals;
+ANALYZE recommended_meals;
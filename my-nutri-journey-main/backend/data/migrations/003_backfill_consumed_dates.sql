@@ -0,0 +1,25 @@
+-- Fills in consumed_date for meals logged without one, so a day's meals are a single
+-- consumed_date lookup instead of a consumed_date/uploaded_at fallback
+-- Run this in the Supabase SQL Editor after 002_typed_dates_and_composite_indexes.sql
+
+-- 1. Backfill function, also called by SupabaseService.backfill_consumed_dates().
+--    Rollups already count these meals towards the day of uploaded_at, so they stay valid.
+CREATE OR REPLACE FUNCTION backfill_meal_consumed_dates() RETURNS INTEGER AS $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    UPDATE meals
+    SET consumed_date = uploaded_at::DATE
+    WHERE consumed_date IS NULL AND uploaded_at IS NOT NULL;
+
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 2. Run it once
+SELECT backfill_meal_consumed_dates();
+
+-- 3. Meals with neither date can not be placed on any day; check before making the column required
+-- SELECT COUNT(*) FROM meals WHERE consumed_date IS NULL;
+-- ALTER TABLE meals ALTER COLUMN consumed_date SET NOT NULL;
@@ -0,0 +1,23 @@
+-- Adds server-side chatbot conversations, so clients send only the new message
+-- instead of the whole transcript
+-- Run this in the Supabase SQL Editor after 003_backfill_consumed_dates.sql
+
+-- 1. Conversations, with ids generated by the backend
+CREATE TABLE IF NOT EXISTS conversations (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 2. Append-only messages; ids increase in the order messages are appended
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    id BIGINT PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    conversation_id UUID NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    type TEXT NOT NULL CHECK (type IN ('user', 'bot')),
+    message TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 3. A conversation's messages after a given id are a range of this index
+CREATE INDEX IF NOT EXISTS idx_conversation_messages_conversation_id ON conversation_messages(conversation_id, id);
+CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id);
@@ -0,0 +1,77 @@
+-- Maintains daily_nutrition_rollups with a trigger on meals, in the same transaction
+-- as each meal write, instead of separate calls from the backend, and rebuilds the
+-- rollups from meals so they start out matching them
+-- Run this in the Supabase SQL Editor after 004_conversations.sql
+
+BEGIN;
+
+-- Holds off meal writes until the trigger covers them and the rebuild is done
+LOCK TABLE meals IN SHARE ROW EXCLUSIVE MODE;
+
+-- A nutrition value from meal_json as a number, 0 if missing or not numeric (like _to_number in db_service.py)
+CREATE OR REPLACE FUNCTION nutrition_value(p_value TEXT) RETURNS DOUBLE PRECISION AS $$
+    SELECT CASE WHEN p_value ~ '^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$'
+                THEN p_value::DOUBLE PRECISION ELSE 0 END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Adds (p_sign 1) or removes (p_sign -1) one meal row's contribution to its day's rollup
+CREATE OR REPLACE FUNCTION apply_meal_to_daily_rollup(m meals, p_sign INTEGER) RETURNS VOID AS $$
+DECLARE
+    v_date DATE := COALESCE(m.consumed_date, m.uploaded_at::DATE);
+    v_score DOUBLE PRECISION := nutrition_value(m.meal_json->>'health_score');
+BEGIN
+    IF m.user_id IS NULL OR v_date IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM apply_daily_nutrition_delta(
+        m.user_id,
+        v_date,
+        p_sign,
+        p_sign * nutrition_value(m.meal_json->'macronutrients'->>'calories'),
+        p_sign * nutrition_value(m.meal_json->'macronutrients'->>'protein'),
+        p_sign * nutrition_value(m.meal_json->'macronutrients'->>'carbs'),
+        p_sign * nutrition_value(COALESCE(m.meal_json->'macronutrients'->>'fats', m.meal_json->'macronutrients'->>'fat')),
+        CASE WHEN v_score > 0 THEN p_sign * v_score ELSE 0 END,
+        CASE WHEN v_score > 0 THEN p_sign ELSE 0 END
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Keeps the rollups in step with meals inside the transaction of every meal write
+CREATE OR REPLACE FUNCTION maintain_daily_nutrition_rollups() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_meal_to_daily_rollup(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_meal_to_daily_rollup(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS meals_daily_nutrition_rollups ON meals;
+CREATE TRIGGER meals_daily_nutrition_rollups
+AFTER INSERT OR UPDATE OF user_id, consumed_date, uploaded_at, meal_json OR DELETE ON meals
+FOR EACH ROW EXECUTE FUNCTION maintain_daily_nutrition_rollups();
+
+-- Rebuild
+DELETE FROM daily_nutrition_rollups;
+
+INSERT INTO daily_nutrition_rollups
+    (user_id, date, meal_count, calories, protein, carbs, fats, health_score_sum, health_score_count)
+SELECT
+    user_id,
+    COALESCE(consumed_date, uploaded_at::DATE) AS date,
+    COUNT(*),
+    SUM(nutrition_value(meal_json->'macronutrients'->>'calories')),
+    SUM(nutrition_value(meal_json->'macronutrients'->>'protein')),
+    SUM(nutrition_value(meal_json->'macronutrients'->>'carbs')),
+    SUM(nutrition_value(COALESCE(meal_json->'macronutrients'->>'fats', meal_json->'macronutrients'->>'fat'))),
+    SUM(GREATEST(nutrition_value(meal_json->>'health_score'), 0)),
+    SUM(CASE WHEN nutrition_value(meal_json->>'health_score') > 0 THEN 1 ELSE 0 END)
+FROM meals
+WHERE user_id IS NOT NULL AND COALESCE(consumed_date, uploaded_at::DATE) IS NOT NULL
+GROUP BY 1, 2;
+
+COMMIT;
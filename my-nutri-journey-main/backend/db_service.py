@@ -1,10 +1,13 @@
 from typing import Dict, List, Any, Optional, Union
-from datetime import datetime
+from datetime import datetime, date as date_type, timedelta
 import json
 import os
 import ast
+import threading
+import uuid
 from fastapi import HTTPException
-from settings import ACTIVE_DB_SERVICE
+from settings import (ACTIVE_DB_SERVICE, SUPABASE_PAGE_SIZE, SQLITE_CACHED_STATEMENTS, SQLITE_CACHE_SIZE_KB,
+                      SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT)
 
 # Import only when needed based on chosen DB service
 try:
@@ -22,6 +25,112 @@ except ImportError:
 # The active database service (can be changed to 'sqlite' or 'supabase')
 ACTIVE_DB_SERVICE = ACTIVE_DB_SERVICE
 
+# Meal fields used by analytics
+ANALYTICS_MEAL_COLUMNS = ["id", "user_id", "meal_type", "meal_json", "consumed_date", "uploaded_at"]
+
+# Summed fields of the daily_nutrition_rollups table
+ROLLUP_FIELDS = ["meal_count", "calories", "protein", "carbs", "fats", "health_score_sum", "health_score_count"]
+
+
+def _to_number(value) -> float:
+    """Convert a nutrition value to a float, treating missing or invalid values as 0"""
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def next_day(date: str) -> str:
+    """The day after a YYYY-MM-DD date, as the exclusive end of a one-day range"""
+    return (date_type.fromisoformat(date) + timedelta(days=1)).isoformat()
+
+
+def get_meal_date(meal: Dict) -> Optional[str]:
+    """The day (YYYY-MM-DD) a meal counts towards: consumed_date, else the date part of uploaded_at"""
+    meal_date = meal.get("consumed_date") or meal.get("uploaded_at")
+    if not meal_date:
+        return None
+    return str(meal_date)[:10]
+
+
+def with_consumed_date(meal_data: Dict) -> Dict:
+    """A copy of meal_data whose missing consumed_date is set to the day of uploaded_at"""
+    if meal_data.get("consumed_date") or not meal_data.get("uploaded_at"):
+        return meal_data
+    return {**meal_data, "consumed_date": str(meal_data["uploaded_at"])[:10]}
+
+
+def get_meal_nutrition(meal_json) -> Dict[str, float]:
+    """Calories, macros and health score of a meal's meal_json"""
+    if isinstance(meal_json, str):
+        try:
+            meal_json = json.loads(meal_json)
+        except ValueError:
+            meal_json = {}
+    meal_json = meal_json or {}
+    macros = meal_json.get("macronutrients", {}) or {}
+    return {
+        "calories": _to_number(macros.get("calories")),
+        "protein": _to_number(macros.get("protein")),
+        "carbs": _to_number(macros.get("carbs")),
+        "fats": _to_number(macros.get("fats", macros.get("fat"))),
+        "health_score": _to_number(meal_json.get("health_score")),
+    }
+
+
+def build_rollup_delta(meal: Dict, sign: int = 1) -> Optional[Dict]:
+    """
+    Change to apply to a user's daily rollup when a meal is added (sign=1)
+    or removed (sign=-1). Returns None if the meal has no usable date.
+    """
+    meal_date = get_meal_date(meal)
+    if not meal.get("user_id") or not meal_date:
+        return None
+    nutrition = get_meal_nutrition(meal.get("meal_json"))
+    has_health_score = nutrition["health_score"] > 0
+    return {
+        "user_id": meal["user_id"],
+        "date": meal_date,
+        "meal_count": sign,
+        "calories": sign * nutrition["calories"],
+        "protein": sign * nutrition["protein"],
+        "carbs": sign * nutrition["carbs"],
+        "fats": sign * nutrition["fats"],
+        "health_score_sum": sign * nutrition["health_score"] if has_health_score else 0.0,
+        "health_score_count": sign if has_health_score else 0,
+    }
+
+def new_conversation(user_id: int) -> Dict:
+    """Row of a new, empty conversation with a generated id"""
+    return {"id": str(uuid.uuid4()), "user_id": user_id, "created_at": datetime.now().isoformat()}
+
+
+def conversation_message_rows(conversation_id: str, messages: List[Dict]) -> List[Dict]:
+    """conversation_messages rows for chat messages ({"type": "user" | "bot", "message": ...})"""
+    created_at = datetime.now().isoformat()
+    return [
+        {"conversation_id": conversation_id, "type": message["type"], "message": message["message"],
+         "created_at": message.get("created_at") or created_at}
+        for message in messages
+    ]
+
+
+def build_rollup_deltas(meals: List[Dict], sign: int = 1) -> List[Dict]:
+    """build_rollup_delta for many meals, summed into one delta per user and day"""
+    deltas = {}
+    for meal in meals:
+        delta = build_rollup_delta(meal, sign)
+        if delta is None:
+            continue
+        key = (delta["user_id"], delta["date"])
+        if key in deltas:
+            for field in ROLLUP_FIELDS:
+                deltas[key][field] += delta[field]
+        else:
+            deltas[key] = delta
+    return list(deltas.values())
+
+
 class DatabaseService:
     """Abstract base class for database services"""
     
@@ -57,6 +166,13 @@ class DatabaseService:
         """Insert a meal"""
         raise NotImplementedError
         
+    def insert_meals_bulk(self, meals_data: List[Dict]) -> List[Dict]:
+        """
+        Insert many meals in one round trip and update their daily rollups.
+        Returns the inserted meals with their ids, in the same order.
+        """
+        raise NotImplementedError
+        
     def get_meals_by_date(self, user_id: int, date: str) -> List[Dict]:
         """Get meals for a user on a specific date"""
         raise NotImplementedError
@@ -69,8 +185,22 @@ class DatabaseService:
         """Get recommended meals for a user on a specific date"""
         raise NotImplementedError
 
-    def get_meals_by_timeframe(self, user_id: int, start_date: str) -> List[Dict]:
-        """Get all meals for a user after a specific date"""
+    def get_last_planned_date(self, user_id: int) -> Optional[str]:
+        """Get the last date (YYYY-MM-DD) a user has recommended meals for, or None"""
+        raise NotImplementedError
+
+    def get_meals_by_timeframe(self, user_id: int, start_date: str, columns: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Get all meals for a user whose consumed_date or uploaded_at is on/after start_date,
+        newest first. Pass columns to fetch only those fields.
+        """
+        raise NotImplementedError
+    
+    def get_meal_ingredients_by_timeframe(self, user_id: int, start_date: str) -> List[Dict]:
+        """
+        Like get_meals_by_timeframe, but each meal only carries consumed_date,
+        uploaded_at and meal_json reduced to {"ingredients": [...]}
+        """
         raise NotImplementedError
     
     def get_meal_by_id(self, meal_id: int) -> Dict:
@@ -85,6 +215,58 @@ class DatabaseService:
         """Get meals where consumed_date is missing but uploaded_at starts with the date."""
         pass  # This will be implemented in the specific service classes
 
+    def get_meals_for_day(self, user_id: int, date: str, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """
+        Get a user's meals for a day in one query, oldest upload first: meals consumed
+        on the date plus meals without a consumed_date that were uploaded that day.
+        With a limit, only that many meals after the first offset are read.
+        """
+        raise NotImplementedError
+
+    def backfill_consumed_dates(self) -> int:
+        """Set consumed_date to the day of uploaded_at where it is missing. Returns the number of meals updated"""
+        raise NotImplementedError
+
+    def upload_image(self, path: str, content: bytes, content_type: str) -> Optional[str]:
+        """Upload an image to storage and return its public URL, or None if storage is unavailable"""
+        raise NotImplementedError
+
+    def delete_image(self, path: str) -> bool:
+        """Delete an image from storage. Returns True if it was removed"""
+        raise NotImplementedError
+
+    def get_daily_rollups(self, user_id: int, start_date: str, end_date: str) -> List[Dict]:
+        """
+        Get a user's per-day nutrition totals between two dates (inclusive), oldest first.
+        Rows hold the ROLLUP_FIELDS sums and are kept in step with every meal write
+        (by a trigger on meals in Supabase, see data/migrations/005).
+        """
+        raise NotImplementedError
+
+    def get_earliest_meal_date(self, user_id: int) -> Optional[str]:
+        """Get the date (YYYY-MM-DD) of a user's first meal, or None if they have no meals"""
+        raise NotImplementedError
+
+    def create_conversation(self, user_id: int) -> Dict:
+        """Create an empty chat conversation for a user. Returns it with its generated id"""
+        raise NotImplementedError
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict]:
+        """Get a conversation by id, or None"""
+        raise NotImplementedError
+
+    def append_conversation_messages(self, conversation_id: str, messages: List[Dict]) -> List[Dict]:
+        """
+        Append messages ({"type": "user" | "bot", "message": ...}) to a conversation in one
+        round trip. Messages are never updated, and ids increase in the order they are appended.
+        Returns the stored messages with their ids, in order.
+        """
+        raise NotImplementedError
+
+    def get_conversation_messages(self, conversation_id: str, after_id: int = 0) -> List[Dict]:
+        """Get a conversation's messages with an id above after_id, oldest first"""
+        raise NotImplementedError
+
 
 class SupabaseService(DatabaseService):
     """Supabase implementation of the database service"""
@@ -107,6 +289,12 @@ class SupabaseService(DatabaseService):
         
     def get_recommended_meal_db(self):
         return self.supabase.table("recommended_meals")
+
+    def get_conversation_db(self):
+        return self.supabase.table("conversations")
+        
+    def get_conversation_message_db(self):
+        return self.supabase.table("conversation_messages")
         
     def get_user(self, user_id: int) -> Dict:
         response = self.get_user_db().select("*").eq("id", user_id).execute()
@@ -161,13 +349,29 @@ class SupabaseService(DatabaseService):
         
         return response.data[0]
         
+    def get_rollup_db(self):
+        return self.supabase.table("daily_nutrition_rollups")
+
     def insert_meal(self, meal_data: Dict) -> Dict:
-        response = self.get_meal_db().insert(meal_data).execute()
+        response = self.get_meal_db().insert(with_consumed_date(meal_data)).execute()
         
         if not response.data or len(response.data) == 0:
             raise HTTPException(status_code=500, detail="Failed to insert meal")
         
+        # The meals trigger updates the day's rollup in the same transaction (data/migrations/005)
         return response.data[0]
+
+    def insert_meals_bulk(self, meals_data: List[Dict]) -> List[Dict]:
+        if not meals_data:
+            return []
+        
+        # One multi-row INSERT; PostgREST returns the rows in the order they were sent
+        response = self.get_meal_db().insert([with_consumed_date(meal) for meal in meals_data]).execute()
+        
+        if not response.data or len(response.data) != len(meals_data):
+            raise HTTPException(status_code=500, detail="Failed to insert meals")
+        
+        return response.data
         
     def get_meals_by_date(self, user_id: int, date: str) -> List[Dict]:
         # For Supabase service
@@ -185,41 +389,39 @@ class SupabaseService(DatabaseService):
         response = self.get_recommended_meal_db().select("*").eq("user_id", user_id).eq("planned_date", date).execute()
         return response.data
 
-    def get_meals_by_timeframe(self, user_id: int, start_date: str) -> List[Dict]:
+    def get_last_planned_date(self, user_id: int) -> Optional[str]:
+        # Served by the (user_id, planned_date) index
+        response = self.get_recommended_meal_db() \
+            .select("planned_date") \
+            .eq("user_id", user_id) \
+            .order("planned_date", desc=True) \
+            .limit(1) \
+            .execute()
+        return str(response.data[0]["planned_date"])[:10] if response.data else None
+
+    def get_meals_by_timeframe(self, user_id: int, start_date: str, columns: Optional[List[str]] = None) -> List[Dict]:
         """Get all meals for a user after a specific date"""
         try:
             print(f"Fetching meals from {start_date} for user {user_id}")
+            select_clause = ",".join(columns) if columns else "*"
             
-            # First try with consumed_date field
-            response = self.get_meal_db() \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .gte("consumed_date", start_date) \
-                .execute()
-            
-            meals_by_consumed_date = response.data
-            print(f"Found {len(meals_by_consumed_date)} meals with consumed_date >= {start_date}")
-            
-            # Then try with uploaded_at field
-            response = self.get_meal_db() \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .gte("uploaded_at", start_date) \
-                .execute()
-            
-            meals_by_uploaded_at = response.data
-            print(f"Found {len(meals_by_uploaded_at)} meals with uploaded_at >= {start_date}")
-            
-            # Combine the results, avoiding duplicates by ID
-            all_meals = {}
-            for meal in meals_by_consumed_date:
-                all_meals[meal["id"]] = meal
-                
-            for meal in meals_by_uploaded_at:
-                if meal["id"] not in all_meals:
-                    all_meals[meal["id"]] = meal
-            
-            meals = list(all_meals.values())
+            # One query matching either date field, sorted and paged server-side
+            meals = []
+            offset = 0
+            while True:
+                response = self.get_meal_db() \
+                    .select(select_clause) \
+                    .eq("user_id", user_id) \
+                    .or_(f"consumed_date.gte.{start_date},uploaded_at.gte.{start_date}") \
+                    .order("uploaded_at", desc=True) \
+                    .order("id", desc=True) \
+                    .range(offset, offset + SUPABASE_PAGE_SIZE - 1) \
+                    .execute()
+                meals.extend(response.data)
+                if len(response.data) < SUPABASE_PAGE_SIZE:
+                    break
+                offset += SUPABASE_PAGE_SIZE
+            print(f"Found {len(meals)} meals since {start_date}")
             
             # Parse the meal_json field if it's stored as a string
             for meal in meals:
@@ -228,15 +430,21 @@ class SupabaseService(DatabaseService):
                         meal["meal_json"] = json.loads(meal["meal_json"])
                     except:
                         meal["meal_json"] = {}
-                        
-            # Sort by date
-            meals.sort(key=lambda m: m.get("uploaded_at", "") or m.get("consumed_date", ""), reverse=True)
             
             return meals
         except Exception as e:
             print(f"Error fetching meals by timeframe: {e}")
             return []
     
+    def get_meal_ingredients_by_timeframe(self, user_id: int, start_date: str) -> List[Dict]:
+        # Only the ingredients array leaves the database, not the whole meal_json
+        meals = self.get_meals_by_timeframe(
+            user_id, start_date, columns=["consumed_date", "uploaded_at", "ingredients:meal_json->ingredients"]
+        )
+        for meal in meals:
+            meal["meal_json"] = {"ingredients": meal.pop("ingredients", None) or []}
+        return meals
+    
     def get_meal_by_id(self, meal_id: int) -> Dict:
         response = self.get_meal_db().select("*").eq("id", meal_id).execute()
         
@@ -251,28 +459,175 @@ class SupabaseService(DatabaseService):
         # Return True if the deletion was successful
         return len(response.data) > 0
 
+    def get_daily_rollups(self, user_id: int, start_date: str, end_date: str) -> List[Dict]:
+        response = self.get_rollup_db() \
+            .select("*") \
+            .eq("user_id", user_id) \
+            .gte("date", start_date) \
+            .lte("date", end_date) \
+            .order("date") \
+            .execute()
+        return response.data
+
+    def get_earliest_meal_date(self, user_id: int) -> Optional[str]:
+        # Served by the (user_id, date) primary key of the rollups
+        response = self.get_rollup_db() \
+            .select("date") \
+            .eq("user_id", user_id) \
+            .order("date") \
+            .limit(1) \
+            .execute()
+        return response.data[0]["date"] if response.data else None
+
     def get_meals_by_upload_date(self, user_id: int, date: str) -> List[Dict]:
-        # For Supabase, we use the LIKE operator to match the date prefix
+        # A [date, next day) range on uploaded_at is a scan of the (user_id, uploaded_at) index
         response = self.get_meal_db().select("*") \
             .eq("user_id", user_id) \
             .is_("consumed_date", "null") \
-            .like("uploaded_at", f"{date}%") \
+            .gte("uploaded_at", date) \
+            .lt("uploaded_at", next_day(date)) \
             .execute()
         return response.data
 
+    def get_meals_for_day(self, user_id: int, date: str, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        # Both branches are ranges of the (user_id, consumed_date, uploaded_at) index
+        query = self.get_meal_db().select("*") \
+            .eq("user_id", user_id) \
+            .or_(f"consumed_date.eq.{date},"
+                 f"and(consumed_date.is.null,uploaded_at.gte.{date},uploaded_at.lt.{next_day(date)})") \
+            .order("uploaded_at") \
+            .order("id")
+        if limit is not None:
+            query = query.range(offset, offset + limit - 1)
+        response = query.execute()
+        return response.data
+
+    def backfill_consumed_dates(self) -> int:
+        # An UPDATE ... SET consumed_date = uploaded_at::date needs SQL, see data/migrations/003
+        response = self.supabase.rpc("backfill_meal_consumed_dates", {}).execute()
+        return response.data or 0
+
+    def create_conversation(self, user_id: int) -> Dict:
+        response = self.get_conversation_db().insert(new_conversation(user_id)).execute()
+        
+        if not response.data:
+            raise HTTPException(status_code=500, detail="Failed to create conversation")
+        return response.data[0]
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict]:
+        response = self.get_conversation_db().select("*").eq("id", conversation_id).execute()
+        return response.data[0] if response.data else None
+
+    def append_conversation_messages(self, conversation_id: str, messages: List[Dict]) -> List[Dict]:
+        if not messages:
+            return []
+        
+        # One multi-row INSERT; PostgREST returns the rows in the order they were sent
+        response = self.get_conversation_message_db() \
+            .insert(conversation_message_rows(conversation_id, messages)) \
+            .execute()
+        
+        if not response.data or len(response.data) != len(messages):
+            raise HTTPException(status_code=500, detail="Failed to append conversation messages")
+        return response.data
+
+    def get_conversation_messages(self, conversation_id: str, after_id: int = 0) -> List[Dict]:
+        # Keyset pages over the (conversation_id, id) index
+        messages = []
+        while True:
+            response = self.get_conversation_message_db() \
+                .select("*") \
+                .eq("conversation_id", conversation_id) \
+                .gt("id", after_id) \
+                .order("id") \
+                .limit(SUPABASE_PAGE_SIZE) \
+                .execute()
+            messages.extend(response.data)
+            if len(response.data) < SUPABASE_PAGE_SIZE:
+                break
+            after_id = response.data[-1]["id"]
+        return messages
+
+    def upload_image(self, path: str, content: bytes, content_type: str) -> Optional[str]:
+        from settings import BUCKET_NAME
+
+        storage = self.supabase.storage.from_(BUCKET_NAME)
+        storage.upload(
+            path=path,
+            file=content,
+            file_options={"content-type": content_type, "upsert": "true"}
+        )
+        return storage.get_public_url(path)
+
+    def delete_image(self, path: str) -> bool:
+        from settings import BUCKET_NAME
+
+        removed = self.supabase.storage.from_(BUCKET_NAME).remove([path])
+        return len(removed or []) > 0
+
 
 class SQLiteService(DatabaseService):
     """SQLite implementation of the database service"""
     
-    def __init__(self):
-        from settings import USER_DB_PATH, MEAL_DB_PATH, RECOMMENDED_MEALS_DB_PATH
-        # Ensure the database files exist and have the proper schema
+    # Tables copied over from the legacy one-file-per-table layout
+    LEGACY_TABLES = ["users", "meals", "recommended_meals"]
+    
+    def __init__(self, db_path: str = None, legacy_db_paths: Optional[Dict[str, str]] = None):
+        from settings import SQLITE_DB_PATH, USER_DB_PATH, MEAL_DB_PATH, RECOMMENDED_MEALS_DB_PATH
+        self.db_path = db_path or SQLITE_DB_PATH
+        if legacy_db_paths is None:
+            legacy_db_paths = {
+                "users": USER_DB_PATH,
+                "meals": MEAL_DB_PATH,
+                "recommended_meals": RECOMMENDED_MEALS_DB_PATH
+            }
+        self.legacy_db_paths = legacy_db_paths
+        
+        # One connection per thread, reused across calls
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        
+        # Ensure the database file exists and has the proper schema
         self._init_db()
         
+    def _connect(self, path: str):
+        """Open a connection configured for a long-lived, concurrently read database"""
+        conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, cached_statements=SQLITE_CACHED_STATEMENTS,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers run alongside a writer; NORMAL only syncs at checkpoints in WAL mode
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{int(SQLITE_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size = {int(SQLITE_MMAP_SIZE)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+    
+    def _get_connection(self):
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect(self.db_path)
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def close(self):
+        """Close every connection opened by this service, in any thread"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+        
     def _init_db(self):
-        """Initialize the SQLite databases if they don't exist"""
-        # Create users table
-        with sqlite3.connect(USER_DB_PATH) as conn:
+        """Create the schema if needed and migrate data from the legacy per-table files"""
+        with self._get_connection() as conn:
+            rollups_exist = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_nutrition_rollups'"
+            ).fetchone()
+            
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS users (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -299,20 +654,18 @@ class SQLiteService(DatabaseService):
                 )
             """)
             
-        # Create meals table
-        with sqlite3.connect(MEAL_DB_PATH) as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS meals (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     user_id INTEGER,
                     meal_type TEXT,
+                    consumed_date TEXT,
                     meal_json TEXT,
-                    uploaded_at TEXT  # Removed extra comma
+                    uploaded_at TEXT,
+                    health_score REAL
                 )
             """)
             
-        # Create recommended_meals table
-        with sqlite3.connect(RECOMMENDED_MEALS_DB_PATH) as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS recommended_meals (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -325,23 +678,205 @@ class SQLiteService(DatabaseService):
                     created_at TEXT DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+            
+            # Per-day nutrition totals, kept next to meals so both change in one transaction
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS daily_nutrition_rollups (
+                    user_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    meal_count INTEGER NOT NULL DEFAULT 0,
+                    calories REAL NOT NULL DEFAULT 0,
+                    protein REAL NOT NULL DEFAULT 0,
+                    carbs REAL NOT NULL DEFAULT 0,
+                    fats REAL NOT NULL DEFAULT 0,
+                    health_score_sum REAL NOT NULL DEFAULT 0,
+                    health_score_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, date)
+                )
+            """)
+            
+            # Chatbot conversations; messages are append-only
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            
+            # Every per-user query filters on user_id plus one date column; uploaded_at
+            # also orders a day's meals, so it completes the consumed_date index
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_meals_user_consumed_date ON meals(user_id, consumed_date, uploaded_at)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_meals_user_uploaded_at ON meals(user_id, uploaded_at)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_recommended_meals_user_planned_date "
+                "ON recommended_meals(user_id, planned_date)"
+            )
+            # A conversation's messages after a given id are a range of this index
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_conversation_messages_conversation_id "
+                "ON conversation_messages(conversation_id, id)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id)")
+            
+            migrated_meals = self._migrate_legacy_files(conn)
+            if not rollups_exist or migrated_meals:
+                self._rebuild_daily_rollups(conn)
+            
+            # One-off data migrations, tracked in the database's user_version
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if schema_version < 1 or migrated_meals:
+                self._backfill_consumed_dates(conn)
+                conn.execute("PRAGMA user_version = 1")
+    
+    def _migrate_legacy_files(self, conn) -> bool:
+        """
+        Copy users, meals and recommended_meals from the legacy one-file-per-table
+        layout into this database. A legacy file is only copied into an empty
+        table, then renamed to <file>.migrated so it is not picked up again.
+        Returns True if any meals were copied.
+        """
+        migrated_meals = False
+        for table in self.LEGACY_TABLES:
+            legacy_path = self.legacy_db_paths.get(table)
+            if not legacy_path or not os.path.exists(legacy_path):
+                continue
+            if os.path.abspath(legacy_path) == os.path.abspath(self.db_path):
+                continue
+            if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                print(f"Skipping migration of {legacy_path}: {table} already has rows")
+                continue
+            
+            conn.execute("ATTACH DATABASE ? AS legacy", (legacy_path,))
+            try:
+                legacy_columns = [row["name"] for row in conn.execute(f"PRAGMA legacy.table_info({table})")]
+                columns = [row["name"] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+                shared_columns = ", ".join(column for column in columns if column in legacy_columns)
+                if shared_columns:
+                    cursor = conn.execute(
+                        f"INSERT INTO main.{table} ({shared_columns}) SELECT {shared_columns} FROM legacy.{table}"
+                    )
+                    print(f"Migrated {cursor.rowcount} rows of {table} from {legacy_path}")
+                    migrated_meals = migrated_meals or (table == "meals" and cursor.rowcount > 0)
+                conn.commit()
+            finally:
+                conn.execute("DETACH DATABASE legacy")
+            os.replace(legacy_path, legacy_path + ".migrated")
+        return migrated_meals
+    
+    def _rebuild_daily_rollups(self, conn):
+        """Recompute daily_nutrition_rollups from the meals table"""
+        conn.execute("DELETE FROM daily_nutrition_rollups")
+        conn.execute("""
+            INSERT INTO daily_nutrition_rollups
+                (user_id, date, meal_count, calories, protein, carbs, fats, health_score_sum, health_score_count)
+            SELECT
+                user_id,
+                date,
+                COUNT(*),
+                SUM(calories),
+                SUM(protein),
+                SUM(carbs),
+                SUM(fats),
+                SUM(CASE WHEN health_score > 0 THEN health_score ELSE 0 END),
+                SUM(CASE WHEN health_score > 0 THEN 1 ELSE 0 END)
+            FROM (
+                SELECT
+                    user_id,
+                    substr(COALESCE(NULLIF(consumed_date, ''), uploaded_at), 1, 10) AS date,
+                    COALESCE(json_extract(meal_json, '$.macronutrients.calories'), 0) AS calories,
+                    COALESCE(json_extract(meal_json, '$.macronutrients.protein'), 0) AS protein,
+                    COALESCE(json_extract(meal_json, '$.macronutrients.carbs'), 0) AS carbs,
+                    COALESCE(json_extract(meal_json, '$.macronutrients.fats'),
+                             json_extract(meal_json, '$.macronutrients.fat'), 0) AS fats,
+                    COALESCE(json_extract(meal_json, '$.health_score'), 0) AS health_score
+                FROM meals
+                WHERE user_id IS NOT NULL AND COALESCE(NULLIF(consumed_date, ''), uploaded_at) IS NOT NULL
+            )
+            GROUP BY user_id, date
+        """)
+
+    def _backfill_consumed_dates(self, conn) -> int:
+        """
+        Set consumed_date to the date part of uploaded_at where it is missing. Rollups
+        already count these meals towards that day, so they stay valid.
+        """
+        cursor = conn.execute(
+            "UPDATE meals SET consumed_date = substr(uploaded_at, 1, 10) "
+            "WHERE consumed_date IS NULL AND uploaded_at IS NOT NULL"
+        )
+        return cursor.rowcount
     
+    def _apply_rollup_delta(self, conn, meal: Dict, sign: int):
+        """Add (sign=1) or remove (sign=-1) a meal from its day's rollup, inside conn's transaction"""
+        delta = build_rollup_delta(meal, sign)
+        if delta is None:
+            return
+        updates = ", ".join(f"{field} = {field} + excluded.{field}" for field in ROLLUP_FIELDS)
+        conn.execute(
+            f"INSERT INTO daily_nutrition_rollups (user_id, date, {', '.join(ROLLUP_FIELDS)}) "
+            f"VALUES (?, ?, {', '.join(['?'] * len(ROLLUP_FIELDS))}) "
+            f"ON CONFLICT(user_id, date) DO UPDATE SET {updates}",
+            [delta["user_id"], delta["date"]] + [delta[field] for field in ROLLUP_FIELDS]
+        )
+        if sign < 0:
+            conn.execute(
+                "DELETE FROM daily_nutrition_rollups WHERE user_id = ? AND date = ? AND meal_count <= 0",
+                (delta["user_id"], delta["date"])
+            )
+
+    def _apply_rollup_deltas(self, conn, meals: List[Dict], sign: int):
+        """_apply_rollup_delta for many meals, with one upsert per day"""
+        deltas = build_rollup_deltas(meals, sign)
+        updates = ", ".join(f"{field} = {field} + excluded.{field}" for field in ROLLUP_FIELDS)
+        conn.executemany(
+            f"INSERT INTO daily_nutrition_rollups (user_id, date, {', '.join(ROLLUP_FIELDS)}) "
+            f"VALUES (?, ?, {', '.join(['?'] * len(ROLLUP_FIELDS))}) "
+            f"ON CONFLICT(user_id, date) DO UPDATE SET {updates}",
+            [[delta["user_id"], delta["date"]] + [delta[field] for field in ROLLUP_FIELDS] for delta in deltas]
+        )
+    
+    def _insert_rows(self, conn, table: str, rows: List[Dict]) -> List[int]:
+        """
+        Insert rows with one prepared statement over the union of their columns
+        (missing values are NULL) and return their rowids, in order. The rowid is
+        the id of tables with an INTEGER PRIMARY KEY.
+        """
+        fields = list(dict.fromkeys(field for row in rows for field in row))
+        query = f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({', '.join(['?'] * len(fields))})"
+        # Ids are read back per row rather than assumed to be consecutive
+        cursor = conn.cursor()
+        row_ids = []
+        for row in rows:
+            cursor.execute(query, [row.get(field) for field in fields])
+            row_ids.append(cursor.lastrowid)
+        return row_ids
+
+    # All tables share one database file, so these return the same connection.
+    # Connections are persistent; "with conn:" commits or rolls back but does not close
     def get_user_db(self):
-        return sqlite3.connect(USER_DB_PATH)
+        return self._get_connection()
         
     def get_meal_db(self):
-        return sqlite3.connect(MEAL_DB_PATH)
+        return self._get_connection()
         
     def get_recommended_meal_db(self):
-        return sqlite3.connect(RECOMMENDED_MEALS_DB_PATH)
-        
-    def get_user(self, user_id: int) -> Dict:
-        with self.get_user_db() as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-            user = cursor.fetchone()
-            
+        return self._get_connection()
+    
+    def _parse_user(self, user) -> Dict:
+        """Convert a users row to a dict, raising 404 if it is missing"""
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
             
@@ -351,6 +886,14 @@ class SQLiteService(DatabaseService):
         user_dict["favoriteFoods"] = ast.literal_eval(user_dict["favoriteFoods"])
         return user_dict
         
+    def get_user(self, user_id: int) -> Dict:
+        with self.get_user_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+            user = cursor.fetchone()
+            
+        return self._parse_user(user)
+        
     def create_user(self, user_data: Dict) -> Dict:
         user_data_copy = user_data.copy()
         # Convert lists to JSON strings
@@ -366,14 +909,12 @@ class SQLiteService(DatabaseService):
             placeholders = ", ".join(["?"] * len(fields))
             field_names = ", ".join(fields)
             
-            query = f"INSERT INTO users ({field_names}) VALUES ({placeholders})"
+            # RETURNING gives back the full user record without a second query
+            query = f"INSERT INTO users ({field_names}) VALUES ({placeholders}) RETURNING *"
             cursor.execute(query, list(user_data_copy.values()))
+            user = cursor.fetchone()
             
-            # Get the ID of the newly inserted user
-            user_id = cursor.lastrowid
-            
-        # Return the full user record
-        return self.get_user(user_id)
+        return self._parse_user(user)
         
     def update_user(self, user_id: int, user_data: Dict) -> Dict:
         user_data_copy = user_data.copy()
@@ -387,19 +928,19 @@ class SQLiteService(DatabaseService):
             
             # Build the UPDATE query dynamically
             set_clause = ", ".join([f"{field} = ?" for field in user_data_copy.keys()])
-            query = f"UPDATE users SET {set_clause} WHERE id = ?"
+            query = f"UPDATE users SET {set_clause} WHERE id = ? RETURNING *"
             
             values = list(user_data_copy.values())
             values.append(user_id)
             
             cursor.execute(query, values)
+            user = cursor.fetchone()
             
         # Return the updated user record
-        return self.get_user(user_id)
+        return self._parse_user(user)
         
     def get_user_by_email(self, email: str) -> Optional[Dict]:
         with self.get_user_db() as conn:
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
             user = cursor.fetchone()
@@ -410,6 +951,7 @@ class SQLiteService(DatabaseService):
         return dict(user)
         
     def insert_meal(self, meal_data: Dict) -> Dict:
+        meal_data = with_consumed_date(meal_data)
         meal_data_copy = meal_data.copy()
         
         # Ensure meal_json is a JSON string
@@ -430,11 +972,34 @@ class SQLiteService(DatabaseService):
             # Get the ID of the newly inserted meal
             meal_id = cursor.lastrowid
             
+            self._apply_rollup_delta(conn, meal_data, 1)
+            
         return {"id": meal_id, **meal_data}
         
+    def insert_meals_bulk(self, meals_data: List[Dict]) -> List[Dict]:
+        if not meals_data:
+            return []
+        
+        meals_data = [with_consumed_date(meal_data) for meal_data in meals_data]
+        rows = []
+        for meal_data in meals_data:
+            meal_data_copy = meal_data.copy()
+            
+            # Ensure meal_json is a JSON string
+            if "meal_json" in meal_data_copy and not isinstance(meal_data_copy["meal_json"], str):
+                meal_data_copy["meal_json"] = json.dumps(meal_data_copy["meal_json"])
+            
+            rows.append(meal_data_copy)
+        
+        # Meals and their rollups commit together, or not at all
+        with self.get_meal_db() as conn:
+            meal_ids = self._insert_rows(conn, "meals", rows)
+            self._apply_rollup_deltas(conn, meals_data, 1)
+            
+        return [{"id": meal_id, **meal_data} for meal_id, meal_data in zip(meal_ids, meals_data)]
+        
     def get_meals_by_date(self, user_id: int, date: str) -> List[Dict]:
         with self.get_meal_db() as conn:
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT * FROM meals WHERE user_id = ? AND consumed_date = ? ORDER BY uploaded_at",
@@ -456,35 +1021,26 @@ class SQLiteService(DatabaseService):
         if not meals_data:
             return []
             
-        inserted_ids = []
-        with self.get_recommended_meal_db() as conn:
-            cursor = conn.cursor()
+        rows = []
+        for meal_data in meals_data:
+            meal_data_copy = meal_data.copy()
             
-            for meal_data in meals_data:
-                meal_data_copy = meal_data.copy()
-                
-                # Ensure JSON fields are strings
-                if "macronutrients_json" in meal_data_copy and not isinstance(meal_data_copy["macronutrients_json"], str):
-                    meal_data_copy["macronutrients_json"] = json.dumps(meal_data_copy["macronutrients_json"])
-                    
-                if "ingredients_json" in meal_data_copy and not isinstance(meal_data_copy["ingredients_json"], str):
-                    meal_data_copy["ingredients_json"] = json.dumps(meal_data_copy["ingredients_json"])
-                
-                # Build the INSERT query dynamically
-                fields = list(meal_data_copy.keys())
-                placeholders = ", ".join(["?"] * len(fields))
-                field_names = ", ".join(fields)
-                
-                query = f"INSERT INTO recommended_meals ({field_names}) VALUES ({placeholders})"
-                cursor.execute(query, list(meal_data_copy.values()))
-                
-                inserted_ids.append(cursor.lastrowid)
+            # Ensure JSON fields are strings
+            if "macronutrients_json" in meal_data_copy and not isinstance(meal_data_copy["macronutrients_json"], str):
+                meal_data_copy["macronutrients_json"] = json.dumps(meal_data_copy["macronutrients_json"])
                 
+            if "ingredients_json" in meal_data_copy and not isinstance(meal_data_copy["ingredients_json"], str):
+                meal_data_copy["ingredients_json"] = json.dumps(meal_data_copy["ingredients_json"])
+            
+            rows.append(meal_data_copy)
+        
+        with self.get_recommended_meal_db() as conn:
+            inserted_ids = self._insert_rows(conn, "recommended_meals", rows)
+            
         return [{"id": id, **meal} for id, meal in zip(inserted_ids, meals_data)]
         
     def get_recommended_meals_by_date(self, user_id: int, date: str) -> List[Dict]:
         with self.get_recommended_meal_db() as conn:
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT * FROM recommended_meals WHERE user_id = ? AND planned_date = ?",
@@ -506,13 +1062,24 @@ class SQLiteService(DatabaseService):
             
         return meals
 
-    def get_meals_by_timeframe(self, user_id: int, start_date: str) -> List[Dict]:
+    def get_last_planned_date(self, user_id: int) -> Optional[str]:
+        with self.get_recommended_meal_db() as conn:
+            row = conn.execute(
+                "SELECT MAX(planned_date) AS planned_date FROM recommended_meals WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        return row["planned_date"]
+
+    def get_meals_by_timeframe(self, user_id: int, start_date: str, columns: Optional[List[str]] = None) -> List[Dict]:
+        select_clause = ", ".join(columns) if columns else "*"
         with self.get_meal_db() as conn:
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
+            # "+uploaded_at" keeps the planner from walking the whole uploaded_at index to
+            # avoid a sort; it range-searches both date indexes instead (MULTI-INDEX OR)
             cursor.execute(
-                "SELECT * FROM meals WHERE user_id = ? AND uploaded_at >= ? ORDER BY uploaded_at",
-                (user_id, start_date)
+                f"SELECT {select_clause} FROM meals WHERE user_id = ? "
+                "AND (consumed_date >= ? OR uploaded_at >= ?) ORDER BY +uploaded_at DESC",
+                (user_id, start_date, start_date)
             )
             rows = cursor.fetchall()
             
@@ -526,9 +1093,27 @@ class SQLiteService(DatabaseService):
             
         return meals
     
+    def get_meal_ingredients_by_timeframe(self, user_id: int, start_date: str) -> List[Dict]:
+        with self.get_meal_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT consumed_date, uploaded_at, json_extract(meal_json, '$.ingredients') FROM meals "
+                "WHERE user_id = ? AND (consumed_date >= ? OR uploaded_at >= ?) ORDER BY +uploaded_at DESC",
+                (user_id, start_date, start_date)
+            )
+            rows = cursor.fetchall()
+            
+        return [
+            {
+                "consumed_date": consumed_date,
+                "uploaded_at": uploaded_at,
+                "meal_json": {"ingredients": json.loads(ingredients) if ingredients else []}
+            }
+            for consumed_date, uploaded_at, ingredients in rows
+        ]
+    
     def get_meal_by_id(self, meal_id: int) -> Dict:
         with self.get_meal_db() as conn:
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM meals WHERE id = ?", (meal_id,))
             meal = cursor.fetchone()
@@ -546,18 +1131,25 @@ class SQLiteService(DatabaseService):
     def delete_meal(self, meal_id: int) -> bool:
         with self.get_meal_db() as conn:
             cursor = conn.cursor()
+            cursor.execute("SELECT * FROM meals WHERE id = ?", (meal_id,))
+            meal = cursor.fetchone()
+            if meal is None:
+                return False
+            
             cursor.execute("DELETE FROM meals WHERE id = ?", (meal_id,))
+            self._apply_rollup_delta(conn, dict(meal), -1)
             
         # Return True if rows were affected
         return cursor.rowcount > 0
 
     def get_meals_by_upload_date(self, user_id: int, date: str) -> List[Dict]:
         with self.get_meal_db() as conn:
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
+            # A range instead of LIKE 'date%' so the (user_id, uploaded_at) index is used
             cursor.execute(
-                "SELECT * FROM meals WHERE user_id = ? AND consumed_date IS NULL AND uploaded_at LIKE ?",
-                (user_id, f"{date}%")
+                "SELECT * FROM meals WHERE user_id = ? AND consumed_date IS NULL "
+                "AND uploaded_at >= ? AND uploaded_at < ?",
+                (user_id, date, next_day(date))
             )
             rows = cursor.fetchall()
             
@@ -570,8 +1162,92 @@ class SQLiteService(DatabaseService):
             meals.append(meal)
             
         return meals
+
+    def get_meals_for_day(self, user_id: int, date: str, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        with self.get_meal_db() as conn:
+            cursor = conn.cursor()
+            # The branches are disjoint ranges of idx_meals_user_consumed_date, both already
+            # in uploaded_at order, so SQLite merges them without a sort and stops at the limit
+            # (LIMIT -1 is no limit)
+            cursor.execute(
+                "SELECT * FROM meals WHERE user_id = ? AND consumed_date = ? "
+                "UNION ALL "
+                "SELECT * FROM meals WHERE user_id = ? AND consumed_date IS NULL "
+                "AND uploaded_at >= ? AND uploaded_at < ? "
+                "ORDER BY uploaded_at, id LIMIT ? OFFSET ?",
+                (user_id, date, user_id, date, next_day(date), -1 if limit is None else limit, offset)
+            )
+            rows = cursor.fetchall()
+            
+        meals = []
+        for row in rows:
+            meal = dict(row)
+            if meal["meal_json"]:
+                meal["meal_json"] = json.loads(meal["meal_json"])
+            meals.append(meal)
+        return meals
+
+    def backfill_consumed_dates(self) -> int:
+        with self.get_meal_db() as conn:
+            return self._backfill_consumed_dates(conn)
+
+    def upload_image(self, path: str, content: bytes, content_type: str) -> Optional[str]:
+        # The SQLite backend has no object storage, images are not persisted
+        return None
+
+    def delete_image(self, path: str) -> bool:
+        return False
+
+    def get_daily_rollups(self, user_id: int, start_date: str, end_date: str) -> List[Dict]:
+        with self.get_meal_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM daily_nutrition_rollups WHERE user_id = ? AND date >= ? AND date <= ? ORDER BY date",
+                (user_id, start_date, end_date)
+            )
+            rows = cursor.fetchall()
+            
+        return [dict(row) for row in rows]
+
+    def get_earliest_meal_date(self, user_id: int) -> Optional[str]:
+        with self.get_meal_db() as conn:
+            cursor = conn.cursor()
+            # MIN over the (user_id, date) primary key is a single index seek
+            cursor.execute("SELECT MIN(date) FROM daily_nutrition_rollups WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            
+        return row[0] if row else None
     
 
+    def create_conversation(self, user_id: int) -> Dict:
+        conversation = new_conversation(user_id)
+        with self._get_connection() as conn:
+            self._insert_rows(conn, "conversations", [conversation])
+        return conversation
+
+    def get_conversation(self, conversation_id: str) -> Optional[Dict]:
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def append_conversation_messages(self, conversation_id: str, messages: List[Dict]) -> List[Dict]:
+        if not messages:
+            return []
+        
+        rows = conversation_message_rows(conversation_id, messages)
+        with self._get_connection() as conn:
+            message_ids = self._insert_rows(conn, "conversation_messages", rows)
+        return [{"id": message_id, **row} for message_id, row in zip(message_ids, rows)]
+
+    def get_conversation_messages(self, conversation_id: str, after_id: int = 0) -> List[Dict]:
+        with self._get_connection() as conn:
+            rows = conn.execute(
+                "SELECT * FROM conversation_messages WHERE conversation_id = ? AND id > ? ORDER BY id",
+                (conversation_id, after_id)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
 def get_db_service() -> DatabaseService:
     """Get the active database service based on configuration"""
     if ACTIVE_DB_SERVICE == "sqlite":
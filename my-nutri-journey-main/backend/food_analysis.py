@@ -1,13 +1,13 @@
 import pandas as pd
 import difflib
 from prompts import get_image_food_identification_prompt
-from llm_provider import LLMProvider
+from llm_provider import get_llm_provider
 from settings import OPENAI_MODEL, LLM_PROVIDER, OPENAI_KEY
 
 
 def dish_analysis(image_path):
     prompt = get_image_food_identification_prompt().format()
-    llm = LLMProvider(provider=LLM_PROVIDER, model=OPENAI_MODEL, openai_api_key=OPENAI_KEY)
+    llm = get_llm_provider(provider=LLM_PROVIDER, model=OPENAI_MODEL, openai_api_key=OPENAI_KEY)
     result = llm.ask_with_image(prompt, image_path, json_response=True)
     data = result["response"]
     if data is None:
@@ -15,6 +15,21 @@ def dish_analysis(image_path):
     return data
 
 
+async def dish_analysis_async(image_path=None, image_bytes=None, mime_type="image/jpeg"):
+    """
+    Async version of dish_analysis that does not block the event loop.
+    Accepts either a path or the image bytes already in memory.
+    """
+    prompt = get_image_food_identification_prompt().format()
+    llm = get_llm_provider(provider=LLM_PROVIDER, model=OPENAI_MODEL, openai_api_key=OPENAI_KEY)
+    result = await llm.ask_with_image_async(prompt, image_path, mime_type=mime_type,
+                                            json_response=True, image_bytes=image_bytes)
+    data = result["response"]
+    if data is None:
+        return None
+    return data
+
+
 def compute_health_score(dish_data):
     """
     Compute a health score (0-10) based on dish nutritional data.
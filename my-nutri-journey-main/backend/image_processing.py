@@ -0,0 +1,143 @@
+import io
+import hashlib
+from settings import VISION_IMAGE_PRESETS, IMAGE_CACHE_PERCEPTUAL_HASH
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+
+# Magic bytes of the formats accepted by the vision models
+_IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def detect_image_mime(image_bytes, default="image/jpeg"):
+    """
+    Detect the mime type of an image from its first bytes.
+
+    Args:
+        image_bytes: The raw image content
+        default: Mime type returned when the format is not recognized
+
+    Returns:
+        A mime type such as "image/jpeg" or "image/webp"
+    """
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime_type in _IMAGE_SIGNATURES:
+        if image_bytes.startswith(signature):
+            return mime_type
+    return default
+
+
+def image_content_hash(image_bytes):
+    """Fast content hash of an image, used for cache keys and storage paths"""
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def get_vision_preset(model):
+    """Preprocessing settings for a vision model, falling back to the default preset"""
+    return VISION_IMAGE_PRESETS.get(model) or VISION_IMAGE_PRESETS["default"]
+
+
+def _fit_scale(size, preset):
+    """Scale factor (at most 1) that fits an image of this size inside the preset's limits"""
+    width, height = size
+    return min(
+        1.0,
+        preset["max_long_side"] / max(width, height),
+        preset["max_short_side"] / min(width, height),
+    )
+
+
+def prepare_image_for_vision(image_bytes, model=None):
+    """
+    Downscale, strip metadata and re-encode an image before sending it to a vision model.
+
+    The image is rotated according to its EXIF orientation, shrunk so it fits
+    the model's useful resolution (max_long_side x max_short_side) and saved
+    without EXIF in the preset's format. If Pillow is not installed, the image
+    cannot be decoded, or the original has no EXIF and is already smaller than
+    the re-encoded version, the original bytes are returned.
+
+    Args:
+        image_bytes: The raw image content
+        model: Vision model name, used to pick a preset from VISION_IMAGE_PRESETS
+
+    Returns:
+        Tuple of (image bytes, mime type)
+    """
+    original_mime = detect_image_mime(image_bytes)
+    preset = get_vision_preset(model)
+    if Image is None or not preset.get("enabled", True):
+        return image_bytes, original_mime
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            has_exif = bool(img.info.get("exif"))
+            scale = _fit_scale(img.size, preset)
+            if scale < 1.0:
+                # Let the JPEG decoder skip resolution we are about to throw away
+                img.draft("RGB", (round(img.width * scale), round(img.height * scale)))
+
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            resize_scale = _fit_scale(img.size, preset)
+            if resize_scale < 1.0:
+                target_size = (max(1, round(img.width * resize_scale)), max(1, round(img.height * resize_scale)))
+                img = img.resize(target_size, Image.LANCZOS)
+
+            output = io.BytesIO()
+            img.save(output, format=preset["format"], quality=preset["quality"], optimize=True)
+    except Exception as e:
+        print(f"Error preprocessing image, sending original: {str(e)}")
+        return image_bytes, original_mime
+
+    processed = output.getvalue()
+    if not has_exif and len(processed) >= len(image_bytes):
+        # No metadata to strip and the original encoding is already smaller
+        return image_bytes, original_mime
+    return processed, f"image/{preset['format'].lower()}"
+
+
+def perceptual_hash(image_bytes):
+    """
+    Compute a 64-bit difference hash (dHash) of an image.
+
+    Visually similar images (re-encoded, resized, slightly recompressed) get
+    hashes within a small Hamming distance of each other.
+
+    Returns:
+        The hash as an int, or None if perceptual hashing is disabled,
+        Pillow is not installed or the image cannot be decoded
+    """
+    if not IMAGE_CACHE_PERCEPTUAL_HASH or Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            # Let the JPEG decoder downscale while decoding, we only need a thumbnail
+            img.draft("L", (64, 64))
+            pixels = img.convert("L").resize((9, 8)).tobytes()
+    except Exception:
+        return None
+
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two perceptual hashes"""
+    return bin(hash_a ^ hash_b).count("1")
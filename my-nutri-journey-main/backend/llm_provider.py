@@ -1,9 +1,16 @@
+import asyncio
 import base64
+import hashlib
 import json
 import diskcache
 import concurrent.futures
+import threading
 import time
-from settings import LLM_TIMEOUT
+import httpx
+from settings import (LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS,
+                      LLM_EXECUTOR_MAX_WORKERS, LLM_EXECUTOR_MAX_QUEUE, LLM_EXECUTOR_ADMISSION_TIMEOUT,
+                      IMAGE_CACHE_DIR, IMAGE_CACHE_SIZE_LIMIT, IMAGE_CACHE_EVICTION_POLICY, IMAGE_CACHE_TTL,
+                      IMAGE_CACHE_CULL_INTERVAL, IMAGE_CACHE_PHASH_MAX_DISTANCE, IMAGE_CACHE_PHASH_INDEX_SIZE)
 #from langchain_g4f import G4FLLM
 #from g4f import models as g4f_models
 
@@ -17,18 +24,180 @@ try:
 except ImportError:
     DeepSeekLLM = None
 
+from image_processing import prepare_image_for_vision, image_content_hash, perceptual_hash, hamming_distance
+
+
+class LLMExecutorSaturated(Exception):
+    """Raised when the shared LLM executor has no room for another request"""
+
+
+class LLMExecutor:
+    """
+    Process-wide, bounded thread pool for blocking LLM calls.
+
+    At most max_workers calls run at once and up to max_queue more wait for a
+    worker. Callers beyond that wait admission_timeout seconds for a slot and
+    are then rejected. Timed-out calls are counted as abandoned until their
+    worker thread finishes.
+    """
+
+    def __init__(self, max_workers, max_queue, admission_timeout):
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="llm"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._admission_timeout = admission_timeout
+        self._lock = threading.Lock()
+        self._abandoned_futures = set()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._abandoned_total = 0
+
+    def submit(self, fn, *args):
+        """Submit fn(*args), raising LLMExecutorSaturated if no slot frees up in time"""
+        if not self._slots.acquire(timeout=self._admission_timeout):
+            with self._lock:
+                self._rejected += 1
+            raise LLMExecutorSaturated("LLM capacity exceeded, please retry shortly")
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def abandon(self, future):
+        """Stop waiting for a future: drop it if still queued, otherwise track it as abandoned"""
+        if future.cancel():
+            return
+        with self._lock:
+            if not future.done():
+                self._abandoned_futures.add(future)
+                self._abandoned_total += 1
+
+    def _on_done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            self._abandoned_futures.discard(future)
+        self._slots.release()
+
+    def stats(self) -> dict:
+        """Snapshot of the executor counters"""
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "abandoned": len(self._abandoned_futures),
+                "abandoned_total": self._abandoned_total,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+
+_llm_executor = LLMExecutor(
+    max_workers=LLM_EXECUTOR_MAX_WORKERS,
+    max_queue=LLM_EXECUTOR_MAX_QUEUE,
+    admission_timeout=LLM_EXECUTOR_ADMISSION_TIMEOUT,
+)
+
+
+def get_llm_executor_stats() -> dict:
+    """Counters for the shared LLM executor (in flight, abandoned, rejected...)"""
+    return _llm_executor.stats()
+
+
+_image_cache_stats = {
+    "hits": 0,
+    "near_duplicate_hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "expirations": 0,
+}
+_image_cache_stats_lock = threading.Lock()
+_image_cache_janitor = None
+_image_cache_janitor_lock = threading.Lock()
+
+
+def _count_image_cache_event(name, amount=1):
+    with _image_cache_stats_lock:
+        _image_cache_stats[name] += amount
+
+
+def _run_image_cache_janitor(cache):
+    """Expire and cull the image cache periodically, off the request path"""
+    while True:
+        time.sleep(IMAGE_CACHE_CULL_INTERVAL)
+        try:
+            expired = cache.expire()
+            evicted = cache.cull()
+            _count_image_cache_event("expirations", expired)
+            _count_image_cache_event("evictions", evicted)
+        except Exception as e:
+            print(f"Error culling image cache: {str(e)}")
+
+
+def _start_image_cache_janitor(cache):
+    global _image_cache_janitor
+    with _image_cache_janitor_lock:
+        if _image_cache_janitor is None:
+            _image_cache_janitor = threading.Thread(
+                target=_run_image_cache_janitor, args=(cache,),
+                name="image-cache-janitor", daemon=True
+            )
+            _image_cache_janitor.start()
+
+
+def get_image_cache_stats() -> dict:
+    """Hit/miss/eviction counters and current size of the image analysis cache"""
+    with _image_cache_stats_lock:
+        stats = dict(_image_cache_stats)
+    cache = LLMProvider._image_cache
+    stats["volume_bytes"] = cache.volume()
+    stats["size_limit_bytes"] = IMAGE_CACHE_SIZE_LIMIT
+    stats["eviction_policy"] = IMAGE_CACHE_EVICTION_POLICY
+    return stats
+
 
 class LLMProvider:
-    _image_cache = diskcache.Cache("cache/image_llm_cache")
+    # Bounded by diskcache itself: cull_limit=0 keeps eviction off the request
+    # path, the janitor thread expires and culls entries in the background
+    _image_cache = diskcache.Cache(
+        IMAGE_CACHE_DIR,
+        size_limit=IMAGE_CACHE_SIZE_LIMIT,
+        eviction_policy=IMAGE_CACHE_EVICTION_POLICY,
+        cull_limit=0,
+    )
 
-    def __init__(self, provider="g4f", model=None, cache_len=100, timeout=20, **kwargs):
+    def __init__(self, provider="g4f", model=None, timeout=20, **kwargs):
 
         self.provider = provider.lower()
         self.model = model
         self.kwargs = kwargs
-        self.llm = self._init_llm()
-        self._cache_len = cache_len
+        # Pooled HTTP client shared by every request made through this provider,
+        # so keep-alive connections and TLS sessions survive between calls
+        self._http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            )
+        )
+        self._async_http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            )
+        )
         self.timeout = LLM_TIMEOUT or timeout  # Timeout in seconds
+        _start_image_cache_janitor(LLMProvider._image_cache)
+        self.llm = self._init_llm()
+        self._vision_llm = None
 
     def _init_llm(self):
         if self.provider == "g4f":
@@ -39,7 +208,7 @@ class LLMProvider:
             if ChatOpenAI is None:
                 raise ImportError("langchain_openai is not installed.")
             selected_model = self.model or "gpt-3.5-turbo"
-            return ChatOpenAI(model=selected_model, **self.kwargs)
+            return self._create_openai_llm(selected_model)
         elif self.provider == "deepseek":
             if DeepSeekLLM is None:
                 raise ImportError("langchain_deepseek is not installed.")
@@ -48,6 +217,26 @@ class LLMProvider:
         else:
             raise ValueError(f"Unsupported provider: {self.provider}")
 
+    def _create_openai_llm(self, model):
+        """Create a ChatOpenAI client bound to this provider's pooled HTTP client"""
+        kwargs = dict(self.kwargs)
+        # Let the HTTP client enforce the timeout so a hung request releases its socket
+        kwargs.setdefault("timeout", self.timeout)
+        kwargs.setdefault("max_retries", LLM_MAX_RETRIES)
+        kwargs.setdefault("http_client", self._http_client)
+        kwargs.setdefault("http_async_client", self._async_http_client)
+        return ChatOpenAI(model=model, **kwargs)
+
+    def _get_vision_llm(self):
+        """Return the vision-capable chat model, creating it once per provider"""
+        if self._vision_llm is None:
+            if self.model:
+                # The main model already serves vision requests
+                self._vision_llm = self.llm
+            else:
+                self._vision_llm = self._create_openai_llm("gpt-4o")
+        return self._vision_llm
+
     @staticmethod
     def extract_json(response_str):
         """
@@ -100,6 +289,68 @@ class LLMProvider:
         # If all attempts fail, return None
         return None
 
+    def _build_result(self, prompt, response, json_response):
+        """Convert a raw LLM response into the result dictionary returned by ask methods"""
+        if isinstance(response, str):
+            content = response
+        else:
+            content = getattr(response, "content", None) or str(response)
+
+        tokens = None
+        if hasattr(response, "response_metadata"):
+            token_info = response.response_metadata.get("token_usage", {})
+            tokens = token_info.get('total_tokens', None)
+        if tokens is None:
+            tokens = (len(prompt) + len(content)) // 4
+
+        if json_response:
+            return {
+                'response': self.extract_json(content),
+                'raw_response': content,
+                'tokens': tokens
+            }
+        return {
+            'response': content,
+            'tokens': tokens
+        }
+
+    @staticmethod
+    def _error_result(error):
+        """Result dictionary returned when an LLM request fails or times out"""
+        return {
+            'response': None,
+            'error': error,
+            'tokens': 0
+        }
+
+    def _run_in_executor(self, invoke, payload, prompt, json_response, request_timeout, label):
+        """
+        Run a blocking LLM call on the shared executor and wait up to request_timeout.
+
+        On timeout the call is abandoned rather than waited for; the HTTP client's
+        own timeout closes the socket shortly after.
+        """
+        try:
+            future = _llm_executor.submit(invoke, payload)
+        except LLMExecutorSaturated as e:
+            print(f"{label} request rejected: {str(e)}")
+            return self._error_result(str(e))
+
+        try:
+            # Wait for the result with a timeout
+            start_time = time.time()
+            response = future.result(timeout=request_timeout)
+            elapsed_time = time.time() - start_time
+            print(f"{label} response received in {elapsed_time:.2f} seconds")
+            return self._build_result(prompt, response, json_response)
+        except concurrent.futures.TimeoutError:
+            print(f"{label} request timed out after {request_timeout} seconds")
+            _llm_executor.abandon(future)
+            return self._error_result('Request timed out')
+        except Exception as e:
+            print(f"Error in {label} request: {str(e)}")
+            return self._error_result(str(e))
+
     def ask(self, prompt: str, json_response: bool = False, timeout: int = None) -> dict:
         """
         Ask a question to the LLM and get a response.
@@ -115,60 +366,86 @@ class LLMProvider:
         # Use the provided timeout or fall back to the instance timeout
         request_timeout = timeout or self.timeout
         
-        # Use ThreadPoolExecutor to run the LLM request with a timeout
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Submit the task
-            future = executor.submit(self._execute_llm_request, prompt)
-            
-            try:
-                # Wait for the result with a timeout
-                start_time = time.time()
-                response = future.result(timeout=request_timeout)
-                elapsed_time = time.time() - start_time
-                print(f"LLM response received in {elapsed_time:.2f} seconds")
-                
-                if isinstance(response, str):
-                    content = response
-                else:
-                    content = getattr(response, "content", None) or str(response)
-                
-                if hasattr(response, "response_metadata"):
-                    token_info = response.response_metadata.get("token_usage", {})
-                    tokens = token_info.get('total_tokens', None)
-                else:
-                    tokens = (len(prompt) + len(content)) // 4
-                
-                if json_response:
-                    parsed_json = self.extract_json(content)
-                    return {
-                        'response': parsed_json,
-                        'raw_response': content,
-                        'tokens': tokens
-                    }
-                else:
-                    return {
-                        'response': content,
-                        'tokens': tokens
-                    }
-            
-            except concurrent.futures.TimeoutError:
-                print(f"LLM request timed out after {request_timeout} seconds")
-                # Cancel the future if possible
-                future.cancel()
-                # Return None to indicate timeout
-                return {
-                    'response': None,
-                    'error': 'Request timed out',
-                    'tokens': 0
-                }
-            except Exception as e:
-                print(f"Error in LLM request: {str(e)}")
-                return {
-                    'response': None,
-                    'error': str(e),
-                    'tokens': 0
-                }
-    
+        return self._run_in_executor(self._execute_llm_request, prompt, prompt,
+                                     json_response, request_timeout, "LLM")
+
+    async def ask_async(self, prompt: str, json_response: bool = False, timeout: int = None) -> dict:
+        """
+        Async version of ask() built on the chat model's ainvoke.
+
+        The request runs on the event loop instead of a worker thread, and on
+        timeout the pending HTTP request is cancelled.
+        """
+        request_timeout = timeout or self.timeout
+        try:
+            start_time = time.time()
+            response = await asyncio.wait_for(self.llm.ainvoke(prompt), timeout=request_timeout)
+            elapsed_time = time.time() - start_time
+            print(f"LLM response received in {elapsed_time:.2f} seconds")
+            return self._build_result(prompt, response, json_response)
+        except asyncio.TimeoutError:
+            print(f"LLM request timed out after {request_timeout} seconds")
+            return self._error_result('Request timed out')
+        except Exception as e:
+            print(f"Error in LLM request: {str(e)}")
+            return self._error_result(str(e))
+
+    async def astream(self, prompt: str, timeout: int = None):
+        """
+        Stream a response with the chat model's astream.
+
+        Yields {"type": "token", "content": ...} for each piece of text as it is
+        generated, then one final event: {"type": "done", "response", "tokens",
+        "ttft", "elapsed"} with times in seconds, or {"type": "error", "error"}.
+
+        The timeout bounds the wait for each chunk, the first one included, rather
+        than the whole response, so long answers keep streaming. Closing the
+        generator early cancels the pending HTTP request.
+        """
+        request_timeout = timeout or self.timeout
+        # OpenAI only reports token usage on a stream when asked to
+        stream_kwargs = {"stream_usage": True} if ChatOpenAI is not None and isinstance(self.llm, ChatOpenAI) else {}
+        start_time = time.time()
+        ttft = None
+        parts = []
+        tokens = None
+        stream = self.llm.astream(prompt, **stream_kwargs).__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=request_timeout)
+                except StopAsyncIteration:
+                    break
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    tokens = (tokens or 0) + usage.get("total_tokens", 0)
+                content = chunk if isinstance(chunk, str) else getattr(chunk, "content", "")
+                if not content or not isinstance(content, str):
+                    continue
+                if ttft is None:
+                    ttft = time.time() - start_time
+                    print(f"LLM stream first token after {ttft:.2f} seconds")
+                parts.append(content)
+                yield {"type": "token", "content": content}
+        except asyncio.TimeoutError:
+            print(f"LLM stream timed out after {request_timeout} seconds without a chunk")
+            yield {"type": "error", "error": "Request timed out"}
+            return
+        except Exception as e:
+            print(f"Error in LLM stream: {str(e)}")
+            yield {"type": "error", "error": str(e)}
+            return
+        finally:
+            if hasattr(stream, "aclose"):
+                await stream.aclose()
+
+        response = "".join(parts)
+        if tokens is None:
+            tokens = (len(prompt) + len(response)) // 4
+        elapsed_time = time.time() - start_time
+        print(f"LLM stream finished in {elapsed_time:.2f} seconds")
+        yield {"type": "done", "response": response, "tokens": tokens, "ttft": ttft, "elapsed": elapsed_time}
+
     def _execute_llm_request(self, prompt):
         """Execute the actual LLM request - separated for timeout handling"""
         return self.llm.invoke(prompt)
@@ -207,37 +484,70 @@ class LLMProvider:
         # If no code blocks, try to extract JSON directly
         return None
 
-    def ask_with_image(self, prompt: str, image_path: str, mime_type: str = "image/jpeg", 
-                   json_response: bool = False, cache: bool = True, timeout: int = None) -> dict:
+    def _image_cache_namespace(self, prompt, json_response):
+        """Cache namespace for a (model, response mode, prompt) combination"""
+        prompt_digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).hexdigest()
+        mode = "json" if json_response else "text"
+        return f"{self.model or 'gpt-4o'}:{mode}:{prompt_digest}"
+
+    def _lookup_image_cache(self, image_bytes, prompt, json_response):
         """
-        Use a vision-capable OpenAI model via LangChain to process a prompt and image.
-        Uses diskcache to cache results by image_path, keeping only the last self._cache_len elements.
-        
-        Args:
-            timeout: Timeout in seconds (overrides the instance timeout)
+        Look up a cached vision result by image content.
+
+        Tries the exact content hash first, then (if enabled) a perceptual hash
+        so near-duplicate photos of the same dish also hit.
+
+        Returns:
+            Tuple of (cached result or None, cache key, perceptual hash or None)
         """
-        # Use the provided timeout or fall back to the instance timeout
-        request_timeout = timeout or self.timeout
-        
-        # Clean up cache if over limit
-        while len(self._image_cache) > self._cache_len:
-            self._image_cache.popitem(last=False)
+        namespace = self._image_cache_namespace(prompt, json_response)
+        key = f"{namespace}:{image_content_hash(image_bytes)}"
+
+        cached = self._image_cache.get(key)
+        if cached is not None:
+            _count_image_cache_event("hits")
+            return cached, key, None
+
+        phash = perceptual_hash(image_bytes)
+        if phash is not None:
+            for known_hash, known_key in self._image_cache.get(f"phash:{namespace}", []):
+                if hamming_distance(phash, known_hash) <= IMAGE_CACHE_PHASH_MAX_DISTANCE:
+                    cached = self._image_cache.get(known_key)
+                    if cached is not None:
+                        print("Image cache hit on a near-duplicate image")
+                        _count_image_cache_event("near_duplicate_hits")
+                        return cached, key, phash
+        _count_image_cache_event("misses")
+        return None, key, phash
 
-        if cache and image_path in self._image_cache:
-            return self._image_cache[image_path]
+    @staticmethod
+    def _is_cacheable(result):
+        """Only successful, parsed results are cached; a failed or malformed reply is retried next time"""
+        return "error" not in result and result.get("response") is not None
+
+    def _store_image_result(self, key, phash, result):
+        """Cache a vision result under its content key and index its perceptual hash"""
+        self._image_cache.set(key, result, expire=IMAGE_CACHE_TTL)
+        if phash is None:
+            return
+        index_key = f"phash:{key.rsplit(':', 1)[0]}"
+        with self._image_cache.transact():
+            index = self._image_cache.get(index_key, [])
+            index.append((phash, key))
+            self._image_cache.set(index_key, index[-IMAGE_CACHE_PHASH_INDEX_SIZE:], expire=IMAGE_CACHE_TTL)
 
+    def _build_image_messages(self, prompt, image_bytes, mime_type):
+        """Build an OpenAI vision message for the prompt and the image bytes"""
         if self.provider != "openai":
             raise NotImplementedError("ask_with_image is only implemented for OpenAI provider.")
 
         if ChatOpenAI is None:
             raise ImportError("langchain_openai is not installed.")
 
-        # Read and encode the image
-        with open(image_path, "rb") as img_file:
-            image_base64 = base64.b64encode(img_file.read()).decode("utf-8")
+        image_base64 = base64.b64encode(image_bytes).decode("utf-8")
 
         # Prepare the message in OpenAI's vision format
-        messages = [
+        return [
             {
                 "role": "user",
                 "content": [
@@ -252,58 +562,112 @@ class LLMProvider:
             }
         ]
 
-        llm = ChatOpenAI(model=self.model or "gpt-4o", **self.kwargs)
+    @staticmethod
+    def _read_image(image_path):
+        with open(image_path, "rb") as img_file:
+            return img_file.read()
+
+    def ask_with_image(self, prompt: str, image_path: str = None, mime_type: str = "image/jpeg", 
+                   json_response: bool = False, cache: bool = True, timeout: int = None,
+                   image_bytes: bytes = None) -> dict:
+        """
+        Use a vision-capable OpenAI model via LangChain to process a prompt and image.
+        Uses diskcache to cache results by image content, prompt and model; the cache
+        is size-bounded and entries expire after IMAGE_CACHE_TTL seconds.
         
-        # Use ThreadPoolExecutor to run the LLM request with a timeout
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Submit the task
-            future = executor.submit(llm.invoke, messages)
-            
-            try:
-                # Wait for the result with a timeout
-                start_time = time.time()
-                response = future.result(timeout=request_timeout)
-                elapsed_time = time.time() - start_time
-                print(f"LLM image response received in {elapsed_time:.2f} seconds")
-                
-                content = getattr(response, "content", None) or str(response)
-                tokens = (len(prompt) + len(content)) // 4
-
-                if json_response:
-                    result = {
-                        "response": self.extract_json(content),
-                        "raw_response": content,
-                        "tokens": tokens
-                    }
-                else:
-                    result = {
-                        "response": content,
-                        "tokens": tokens
-                    }
+        Args:
+            image_path: Path of the image to analyze (ignored if image_bytes is given)
+            timeout: Timeout in seconds (overrides the instance timeout)
+            image_bytes: Image content already in memory, avoids reading from disk
+        """
+        # Use the provided timeout or fall back to the instance timeout
+        request_timeout = timeout or self.timeout
 
-                if cache:
-                    self._image_cache[image_path] = result
+        if image_bytes is None:
+            image_bytes = self._read_image(image_path)
+        if cache:
+            cached, key, phash = self._lookup_image_cache(image_bytes, prompt, json_response)
+            if cached is not None:
+                return cached
+
+        # Shrink and re-encode only on a cache miss, keys use the original bytes
+        image_bytes, mime_type = prepare_image_for_vision(image_bytes, self.model or "gpt-4o")
+        messages = self._build_image_messages(prompt, image_bytes, mime_type)
+        llm = self._get_vision_llm()
+
+        result = self._run_in_executor(llm.invoke, messages, prompt,
+                                       json_response, request_timeout, "LLM image")
+        if cache and self._is_cacheable(result):
+            self._store_image_result(key, phash, result)
+
+        return result
+
+    async def ask_with_image_async(self, prompt: str, image_path: str = None, mime_type: str = "image/jpeg",
+                                   json_response: bool = False, cache: bool = True, timeout: int = None,
+                                   image_bytes: bytes = None) -> dict:
+        """
+        Async version of ask_with_image() built on the vision model's ainvoke.
+        """
+        request_timeout = timeout or self.timeout
+
+        if image_bytes is None:
+            image_bytes = await asyncio.to_thread(self._read_image, image_path)
+        if cache:
+            # Hashing and the cache lookup touch disk, keep them off the event loop
+            cached, key, phash = await asyncio.to_thread(
+                self._lookup_image_cache, image_bytes, prompt, json_response
+            )
+            if cached is not None:
+                return cached
+
+        # Shrink and re-encode only on a cache miss, keys use the original bytes
+        image_bytes, mime_type = await asyncio.to_thread(
+            prepare_image_for_vision, image_bytes, self.model or "gpt-4o"
+        )
+        messages = self._build_image_messages(prompt, image_bytes, mime_type)
+        llm = self._get_vision_llm()
+
+        try:
+            start_time = time.time()
+            response = await asyncio.wait_for(llm.ainvoke(messages), timeout=request_timeout)
+            elapsed_time = time.time() - start_time
+            print(f"LLM image response received in {elapsed_time:.2f} seconds")
+
+            result = self._build_result(prompt, response, json_response)
+            if cache and self._is_cacheable(result):
+                await asyncio.to_thread(self._store_image_result, key, phash, result)
+
+            return result
+        except asyncio.TimeoutError:
+            print(f"LLM image request timed out after {request_timeout} seconds")
+            return self._error_result('Request timed out')
+        except Exception as e:
+            print(f"Error in LLM image request: {str(e)}")
+            return self._error_result(str(e))
+
+
+_provider_registry = {}
+_provider_registry_lock = threading.Lock()
+
+
+def get_llm_provider(provider="g4f", model=None, **kwargs) -> LLMProvider:
+    """
+    Get the shared LLMProvider for a (provider, model, kwargs) combination.
+
+    Providers are built once per process and reused by every request, so the
+    underlying chat clients and their pooled HTTP connections are not rebuilt
+    on each call.
+    """
+    key = (provider.lower(), model, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+    llm = _provider_registry.get(key)
+    if llm is None:
+        with _provider_registry_lock:
+            llm = _provider_registry.get(key)
+            if llm is None:
+                llm = LLMProvider(provider=provider, model=model, **kwargs)
+                _provider_registry[key] = llm
+    return llm
 
-                return result
-            
-            except concurrent.futures.TimeoutError:
-                print(f"LLM image request timed out after {request_timeout} seconds")
-                # Cancel the future if possible
-                future.cancel()
-                # Return None to indicate timeout
-                return {
-                    'response': None,
-                    'error': 'Request timed out',
-                    'tokens': 0
-                }
-            except Exception as e:
-                print(f"Error in LLM image request: {str(e)}")
-                return {
-                    'response': None,
-                    'error': str(e),
-                    'tokens': 0
-                }
-    
 
 def main():
     prompt = "Hello, who are you?"
@@ -0,0 +1,174 @@
+import asyncio
+import time
+from datetime import timedelta
+from prompts import get_mealplan_prompt, get_mealplan_day_prompt
+from settings import MEALPLAN_GENERATION_MODE, MEALPLAN_DAY_MAX_RETRIES
+
+MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
+REQUIRED_MACROS = ("calories", "protein", "carbs", "fats")
+
+
+def day_key(day_number):
+    """Key of a day in a meal plan, "day1" for the first day"""
+    return f"day{day_number}"
+
+
+def _to_number(value, field):
+    if isinstance(value, bool):
+        raise ValueError(f"{field} is not a number")
+    try:
+        return float(value) if isinstance(value, str) else value + 0
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} is not a number")
+
+
+def validate_dish(dish):
+    """Check a generated dish, raising ValueError if a required field is missing or malformed"""
+    if not isinstance(dish, dict):
+        raise ValueError("dish is not a JSON object")
+    if not isinstance(dish.get("dish_name"), str) or not dish["dish_name"].strip():
+        raise ValueError("dish has no dish_name")
+
+    macros = dish.get("macronutrients")
+    if not isinstance(macros, dict):
+        raise ValueError(f"{dish['dish_name']} has no macronutrients")
+    if "fats" not in macros and "fat" in macros:
+        macros["fats"] = macros["fat"]
+    for macro in REQUIRED_MACROS:
+        macros[macro] = _to_number(macros.get(macro), f"{dish['dish_name']} {macro}")
+
+    if not isinstance(dish.get("ingredients"), list):
+        raise ValueError(f"{dish['dish_name']} has no ingredients list")
+    return dish
+
+
+def validate_day_plan(day_plan):
+    """
+    Check one generated day, {meal_type: [dish, ...]}.
+
+    Unknown meal types are dropped. A day wrapped as {"day1": {...}} is unwrapped.
+
+    Returns:
+        The day with only valid meal types
+
+    Raises:
+        ValueError if the day is not a JSON object, has no dishes or has a malformed dish
+    """
+    if isinstance(day_plan, dict) and len(day_plan) == 1:
+        (key, value), = day_plan.items()
+        if key.startswith("day") and isinstance(value, dict):
+            day_plan = value
+    if not isinstance(day_plan, dict):
+        raise ValueError("day is not a JSON object")
+
+    validated = {}
+    for meal_type, dishes in day_plan.items():
+        if meal_type not in MEAL_TYPES:
+            continue
+        if not isinstance(dishes, list):
+            raise ValueError(f"{meal_type} is not a list of dishes")
+        validated[meal_type] = [validate_dish(dish) for dish in dishes]
+
+    if not any(validated.values()):
+        raise ValueError("day has no dishes")
+    return validated
+
+
+async def generate_day(llm, user_profile, start_date, day_number, num_days):
+    """
+    Generate and validate one day of a plan.
+
+    Returns:
+        Tuple of (day_number, validated day or None, error or None)
+    """
+    planned_date = start_date + timedelta(days=day_number - 1)
+    prompt = get_mealplan_day_prompt().format(
+        user_profile=user_profile,
+        day_number=day_number,
+        num_days=num_days,
+        weekday=planned_date.strftime("%A")
+    )
+    result = await llm.ask_async(prompt, json_response=True)
+    if result.get("error"):
+        return day_number, None, result["error"]
+    try:
+        return day_number, validate_day_plan(result.get("response")), None
+    except ValueError as e:
+        return day_number, None, str(e)
+
+
+async def generate_days(llm, user_profile, start_date, num_days, day_numbers, max_retries=MEALPLAN_DAY_MAX_RETRIES):
+    """
+    Generate the given days of a plan concurrently, one LLM call per day.
+
+    Each day is validated on its own and only the days that failed are generated
+    again, up to max_retries more times, so a round takes as long as its slowest day.
+
+    Returns:
+        Tuple of ({day_key: day} for the days that succeeded, {day_number: last error} for the others)
+    """
+    days, errors = {}, {}
+    pending = list(day_numbers)
+    for attempt in range(1 + max_retries):
+        if not pending:
+            break
+        start_time = time.time()
+        results = await asyncio.gather(*[
+            generate_day(llm, user_profile, start_date, day_number, num_days) for day_number in pending
+        ])
+        pending = []
+        for day_number, day, error in results:
+            if day is not None:
+                days[day_key(day_number)] = day
+                errors.pop(day_number, None)
+            else:
+                print(f"[meal-plan] Day {day_number} failed (attempt {attempt + 1}): {error}")
+                errors[day_number] = error
+                pending.append(day_number)
+        print(f"[meal-plan] Generated {len(results) - len(pending)}/{len(results)} days "
+              f"in {time.time() - start_time:.2f} seconds")
+    return days, errors
+
+
+async def generate_mealplan(llm, user_profile, start_date, num_days, mode=MEALPLAN_GENERATION_MODE,
+                            max_retries=MEALPLAN_DAY_MAX_RETRIES, day_numbers=None):
+    """
+    Generate a meal plan of num_days days from start_date.
+
+    mode "per_day" generates every day with its own concurrent call. mode "single"
+    asks for the whole plan in one call; days missing from or malformed in its
+    response are then generated one by one like in "per_day". Pass day_numbers
+    to generate only those days of the plan, always one call per day.
+
+    Returns:
+        Dict of "day1".."dayN" -> {meal_type: [dish, ...]}, holding only valid days
+
+    Raises:
+        ValueError if no day could be generated
+    """
+    days, missing = {}, list(day_numbers or range(1, num_days + 1))
+    if mode == "single" and len(missing) == num_days:
+        prompt = get_mealplan_prompt(user_profile, num_days).format(
+            user_profile=user_profile,
+            num_days=num_days
+        )
+        # json_response parses with extract_json, which also handles code fences and stray text
+        mealplan_json = (await llm.ask_async(prompt, json_response=True)).get("response")
+        if not isinstance(mealplan_json, dict):
+            mealplan_json = {}
+        missing = []
+        for day_number in range(1, num_days + 1):
+            try:
+                days[day_key(day_number)] = validate_day_plan(mealplan_json.get(day_key(day_number)))
+            except ValueError as e:
+                print(f"[meal-plan] Day {day_number} of the plan is invalid, generating it again: {e}")
+                missing.append(day_number)
+
+    generated, errors = await generate_days(llm, user_profile, start_date, num_days, missing, max_retries)
+    days.update(generated)
+    if not days:
+        raise ValueError(f"Meal plan generation failed: {errors}")
+    if errors:
+        print(f"[meal-plan] Plan from {start_date} is missing days {sorted(errors)}")
+    return {day_key(day_number): days[day_key(day_number)]
+            for day_number in range(1, num_days + 1) if day_key(day_number) in days}
@@ -0,0 +1,338 @@
+import asyncio
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from settings import (MEALPLAN_JOB_WORKERS, MEALPLAN_JOB_DB_PATH, MEALPLAN_JOB_RETENTION, MEALPLAN_JOB_LEASE,
+                      MEALPLAN_JOB_FAILURE_COOLDOWN, SQLITE_BUSY_TIMEOUT)
+
+# Jobs in these states hold the single-flight slot of their user and date range
+ACTIVE_STATUSES = ("queued", "running")
+JOB_FIELDS = ["id", "user_id", "start_date", "end_date", "num_days", "status", "error", "created_at", "updated_at"]
+
+
+def job_key(job):
+    """Single-flight key of a job: its user and date range"""
+    return (job["user_id"], job["start_date"], job["num_days"])
+
+
+class MealPlanJobQueue:
+    """
+    Background queue for meal-plan generation.
+
+    A job generates one user's plan for num_days days from start_date. While a job
+    for a user and date range is queued or running, submitting the same range returns
+    that job instead of queueing another (single-flight), so concurrent requests never
+    generate and insert the same plan twice. A failed job is returned in the same way
+    for failure_cooldown seconds, so pollers see its error instead of every request
+    paying for another generation that is likely to fail too. Jobs run on asyncio
+    worker tasks in the server's event loop.
+
+    With a db_path, jobs are also stored in SQLite, so server processes sharing the
+    file share the single-flight check and can all report a job's status. Each process
+    holds a lease on its unfinished jobs and renews it while running; jobs released by
+    stop() or left behind by a crashed process are taken over by the next queue that
+    starts or accepts a job. SQLite calls run in worker threads, off the event loop.
+    """
+
+    def __init__(self, run_job, num_workers=MEALPLAN_JOB_WORKERS, db_path=MEALPLAN_JOB_DB_PATH,
+                 retention=MEALPLAN_JOB_RETENTION, lease=MEALPLAN_JOB_LEASE,
+                 failure_cooldown=MEALPLAN_JOB_FAILURE_COOLDOWN):
+        """
+        Args:
+            run_job: Coroutine function (user_id, start_date, num_days) generating and storing a plan
+            num_workers: Jobs run at once
+            db_path: SQLite file to persist jobs in, or None to keep them in memory only
+            retention: Seconds finished jobs are kept
+            lease: Seconds a persisted job stays owned by a process that stopped renewing it
+            failure_cooldown: Seconds a failed job is returned instead of queueing its range again
+        """
+        self._run_job = run_job
+        self.num_workers = num_workers
+        self.retention = retention
+        self.lease = lease
+        self.failure_cooldown = failure_cooldown
+        self.owner = uuid.uuid4().hex
+        self._jobs = {}  # job_id -> job
+        self._active = {}  # job_key -> job_id of its queued or running job
+        self._failed = {}  # job_key -> job_id of its last failed job
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+        self._stats = {"submitted": 0, "deduplicated": 0, "resumed": 0, "done": 0, "failed": 0,
+                       "cooled_down": 0}
+        self._conn = self._open_db(db_path) if db_path else None
+        self._db_lock = threading.Lock()  # The connection is shared by the threads running SQLite calls
+
+    def _open_db(self, db_path):
+        conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS meal_plan_jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    start_date TEXT NOT NULL,
+                    end_date TEXT NOT NULL,
+                    num_days INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    owner TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # At most one queued or running job per user and date range, whichever process submits it
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_meal_plan_jobs_active "
+                "ON meal_plan_jobs(user_id, start_date, num_days) WHERE status IN ('queued', 'running')"
+            )
+        return conn
+
+    async def start(self):
+        """
+        Start the workers on the running event loop and queue unfinished jobs.
+        Does nothing if they already run on this loop; called by submit() as well.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.num_workers)]
+        if self._conn is not None:
+            self._tasks.append(loop.create_task(self._renew_leases()))
+
+        # Jobs of ours a previous event loop did not finish, then unowned persisted jobs
+        for job in self._jobs.values():
+            if job["status"] in ACTIVE_STATUSES:
+                await self._update(job, status="queued")
+                self._queue.put_nowait(job["id"])
+        await self._take_over_jobs()
+
+    async def stop(self):
+        """Cancel the workers and release unfinished jobs to the next queue that starts"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop = None
+        if self._conn is not None:
+            await asyncio.to_thread(self._release_jobs)
+            for job in [job for job in self._jobs.values() if job["status"] in ACTIVE_STATUSES]:
+                self._active.pop(job_key(job), None)
+                del self._jobs[job["id"]]
+
+    async def submit(self, user_id, start_date, num_days):
+        """
+        Queue a plan for num_days days from start_date (YYYY-MM-DD), unless one is already
+        queued or running for the same user and range, or failed within the cooldown.
+
+        Returns:
+            Tuple of (job, created), where created is False if an existing job was returned
+        """
+        await self.start()
+        await self._prune()
+        await self._take_over_jobs()
+        key = (user_id, start_date, num_days)
+        job_id = self._active.get(key)
+        if job_id is not None:
+            self._stats["deduplicated"] += 1
+            return self._public(self._jobs[job_id]), False
+        failed = self._jobs.get(self._failed.get(key))
+        if failed is not None and failed["updated_at"] >= time.time() - self.failure_cooldown:
+            self._stats["cooled_down"] += 1
+            return self._public(failed), False
+
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "start_date": start_date,
+            "end_date": (date.fromisoformat(start_date) + timedelta(days=num_days - 1)).isoformat(),
+            "num_days": num_days,
+            "status": "queued",
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        if self._conn is not None:
+            row = await asyncio.to_thread(self._insert_job, job)
+            if row is not None:
+                # Another process holds this range, or failed it within the cooldown
+                self._stats["cooled_down" if row["status"] == "failed" else "deduplicated"] += 1
+                return self._public(row), False
+
+        self._failed.pop(key, None)
+        self._enqueue(job)
+        self._stats["submitted"] += 1
+        return self._public(job), True
+
+    def get(self, job_id):
+        """Get a job by id, or None if it is unknown or was pruned"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return self._public(job)
+        if self._conn is not None:
+            with self._db_lock:
+                row = self._conn.execute("SELECT * FROM meal_plan_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None:
+                return self._public(row)
+        return None
+
+    def stats(self):
+        statuses = [job["status"] for job in self._jobs.values()]
+        return {
+            **self._stats,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "workers": self.num_workers if self._loop is not None else 0,
+        }
+
+    def _public(self, job):
+        return {field: job[field] for field in JOB_FIELDS}
+
+    def _enqueue(self, job):
+        self._jobs[job["id"]] = job
+        self._active[job_key(job)] = job["id"]
+        self._queue.put_nowait(job["id"])
+
+    def _insert_job(self, job):
+        """
+        Persist a new job, unless its range is held by an unfinished job or failed within
+        the cooldown. Runs in a worker thread.
+
+        Returns:
+            The row of the job holding the range, or None if the job was inserted
+        """
+        key = job_key(job)
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT * FROM meal_plan_jobs WHERE user_id = ? AND start_date = ? AND num_days = ? "
+                "AND status = 'failed' AND updated_at >= ? ORDER BY updated_at DESC LIMIT 1",
+                (*key, time.time() - self.failure_cooldown)
+            ).fetchone()
+            if row is not None:
+                return row
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        f"INSERT INTO meal_plan_jobs ({', '.join(JOB_FIELDS)}, owner) "
+                        f"VALUES ({', '.join(['?'] * len(JOB_FIELDS))}, ?)",
+                        [job[field] for field in JOB_FIELDS] + [self.owner]
+                    )
+                return None
+            except sqlite3.IntegrityError:
+                # Another process holds this range
+                row = self._conn.execute(
+                    "SELECT * FROM meal_plan_jobs WHERE user_id = ? AND start_date = ? AND num_days = ? "
+                    "AND status IN ('queued', 'running')",
+                    key
+                ).fetchone()
+                if row is not None:
+                    return row
+                raise
+
+    def _claim_jobs(self):
+        """Claim persisted jobs that were released or whose owner's lease expired. Runs in a worker thread."""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT * FROM meal_plan_jobs WHERE status IN ('queued', 'running') "
+                "AND (owner IS NULL OR (owner != ? AND updated_at < ?)) ORDER BY created_at",
+                (self.owner, time.time() - self.lease)
+            ).fetchall()
+            claimed_rows = []
+            for row in rows:
+                # Compare-and-set on the previous owner, so only one process takes each job
+                with self._conn:
+                    claimed = self._conn.execute(
+                        "UPDATE meal_plan_jobs SET owner = ?, status = 'queued', updated_at = ? "
+                        "WHERE id = ? AND owner IS ? AND updated_at = ?",
+                        (self.owner, time.time(), row["id"], row["owner"], row["updated_at"])
+                    ).rowcount
+                if claimed:
+                    claimed_rows.append(row)
+            return claimed_rows
+
+    async def _take_over_jobs(self):
+        """Queue persisted jobs that were released or whose owner's lease expired"""
+        if self._conn is None:
+            return
+        for row in await asyncio.to_thread(self._claim_jobs):
+            print(f"[meal-plan-jobs] Resuming unfinished job {row['id']} for user {row['user_id']}")
+            self._stats["resumed"] += 1
+            self._enqueue({**self._public(row), "status": "queued"})
+
+    def _execute(self, sql, params):
+        """Run one write statement in its own transaction. Runs in a worker thread."""
+        with self._db_lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def _release_jobs(self):
+        self._execute(
+            "UPDATE meal_plan_jobs SET status = 'queued', owner = NULL "
+            "WHERE owner = ? AND status IN ('queued', 'running')",
+            (self.owner,)
+        )
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE meal_plan_jobs SET updated_at = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                (time.time(), self.owner)
+            )
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                self._queue.task_done()
+                continue
+            try:
+                await self._update(job, status="running")
+                print(f"[meal-plan-jobs] Generating plan for user {job['user_id']} "
+                      f"from {job['start_date']} to {job['end_date']}")
+                await self._run_job(job["user_id"], job["start_date"], job["num_days"])
+                await self._update(job, status="done")
+                self._stats["done"] += 1
+            except asyncio.CancelledError:
+                # Shutting down; the job stays unfinished and is queued again on the next start
+                raise
+            except Exception as e:
+                print(f"[meal-plan-jobs] Job {job_id} failed: {e}")
+                await self._update(job, status="failed", error=str(e))
+                self._failed[job_key(job)] = job_id
+                self._stats["failed"] += 1
+            finally:
+                if job["status"] not in ACTIVE_STATUSES:
+                    self._active.pop(job_key(job), None)
+                self._queue.task_done()
+
+    async def _update(self, job, **fields):
+        job.update(fields, updated_at=time.time())
+        if self._conn is not None:
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE meal_plan_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                (job["status"], job["error"], job["updated_at"], job["id"], self.owner)
+            )
+
+    async def _prune(self):
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job["status"] not in ACTIVE_STATUSES and job["updated_at"] < cutoff]:
+            del self._jobs[job_id]
+        for key in [key for key, job_id in self._failed.items() if job_id not in self._jobs]:
+            del self._failed[key]
+        if self._conn is not None:
+            await asyncio.to_thread(
+                self._execute,
+                "DELETE FROM meal_plan_jobs WHERE status NOT IN ('queued', 'running') AND updated_at < ?",
+                (cutoff,)
+            )
@@ -139,6 +139,94 @@ Instructions:
     )
 
 
+def get_mealplan_day_prompt():
+    """
+    Returns a prompt for generating a single day of a meal plan as a JSON object.
+    Used to generate the days of a plan concurrently, one LLM call per day.
+
+    Example output:
+    {
+      "breakfast": [
+        {
+          "dish_name": "Greek Yogurt with Berries",
+          "macronutrients": {"calories": 220, "protein": 18, "carbs": 25, "fats": 5, "fibers": 3, "saturated_fats": 2},
+          "ingredients": [{"name": "greek yogurt", "portion_count": 1, "grams": 150}],
+          "health_score": 8,
+          "health_explanation": "High in protein and contains antioxidants from berries",
+          "health_benefits": ["Good source of protein for muscle maintenance"]
+        }
+      ],
+      "lunch": [...],
+      "dinner": [...]
+    }
+    """
+    return PromptTemplate.from_template(
+"""
+You are a nutrition expert. Generate the meals for day {day_number} ({weekday}) of a {num_days}-day meal plan for the user below.
+
+User Profile:
+{user_profile}
+
+Instructions:
+- Carefully analyze the user's profile and goals before generating the meals. Reflect on their needs and optimize the day to best respect their profile and objectives.
+- The meals must align with the user's goals, dietary preferences, allergies, dislikes, geographic location, and physical stats (weight, height, etc).
+- **Pay special attention to the user's daily target calories and macronutrients (protein, carbs, fats). The total for the day should be as close as possible to these targets. Do not underestimate or overestimate these values.**
+- The other days of the plan are generated separately. Keep the plan varied by choosing dishes that suit day {day_number} ({weekday}) in particular, rather than the most typical dish for each meal.
+- Not all meals must be present. For example, if the user is losing weight, snacks or even lunch/dinner may be omitted as appropriate.
+- For each meal (breakfast, lunch, dinner, snack), provide zero or more dishes as needed.
+- For each dish, include:
+    - "dish_name": the name of the food
+    - "macronutrients": an object with keys "calories", "protein", "carbs", "fats", "fibers", "saturated_fats" (all numbers, per dish, unit is grams except calories)
+    - "ingredients": a list of objects, each with "name", "portion_count", and "grams"
+    - "health_score": a number from 1-10 (where 10 is extremely healthy)
+    - "health_explanation": brief explanation for the health score
+    - "health_benefits": a list of 3-5 key health benefits of the dish
+- If the user is an athlete or has an active lifestyle, and their dietary goal permits, you may include more dishes per meal to meet their higher energy and nutrient needs.
+- Output a JSON object with the following structure:
+
+{{
+  "breakfast": [
+    {{
+      "dish_name": "food breakfast 1",
+      "macronutrients": {{
+        "calories": C,
+        "protein": P,
+        "carbs": CB,
+        "fats": F,
+        "fibers": FB,
+        "saturated_fats": SF
+      }},
+      "ingredients": [
+        {{"name": "...", "portion_count": ..., "grams": ...}},
+        ...
+      ],
+      "health_score": S,
+      "health_explanation": "Brief explanation of the health score",
+      "health_benefits": [
+        "Benefit 1",
+        "Benefit 2",
+        "Benefit 3"
+      ]
+    }},
+    ...
+  ],
+  "lunch": [
+    ...
+  ],
+  "dinner": [
+    ...
+  ],
+  "snack": [
+    ...
+  ]
+}}
+
+- Only include meals that make sense for the user's profile and goals (e.g., skip snacks if not needed).
+- Do not include any explanation or formatting, only output the JSON object.
+"""
+    )
+
+
 def get_chatbot_prompt():
     """
     Returns a prompt for a nutrition expert chatbot.
@@ -153,6 +241,9 @@ You are a helpful and friendly nutrition expert chatbot.
 User Profile:
 {full_profile}
 
+Summary of Earlier Conversation:
+{conversation_summary}
+
 Chat History:
 {chat_history}
 
@@ -164,6 +255,28 @@ Provide a concise, supportive, and informative response, addressing the user's q
     )
 
 
+def get_chat_summary_prompt():
+    """
+    Returns a prompt for extending the rolling summary of a chatbot conversation.
+
+    Example output:
+    "Alice wants to lose weight and asked for high-protein breakfasts; the bot suggested Greek yogurt and eggs. She dislikes oatmeal."
+    """
+    return PromptTemplate.from_template(
+        """
+You are summarizing a conversation between a user and a nutrition expert chatbot.
+
+Summary so far:
+{previous_summary}
+
+New messages:
+{new_messages}
+
+Update the summary with the new messages. Keep the user's goals, preferences, restrictions and questions, and the advice already given. Write plain prose in at most {max_words} words and return only the summary.
+"""
+    )
+
+
 def get_macro_breakdown_prompt():
     """
     Returns a prompt for estimating the macronutrient breakdown of a food.
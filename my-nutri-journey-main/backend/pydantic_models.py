@@ -26,6 +26,10 @@ class ChatRequest(BaseModel):
     user_id: int
     message: str
     chat_history: Optional[List[dict]] = []
+    conversation_id: Optional[str] = None
+
+class ConversationCreateRequest(BaseModel):
+    user_id: int
 
 class RecommendedMealsRequest(BaseModel):
     user_id: int
@@ -37,4 +41,7 @@ class MealLogRequest(BaseModel):
     meal_json: dict
     health_score: Optional[float] = None
     uploaded_at: str  # ISO string
-    consumed_date: Optional[str] = None  # Add consumed_date field (YYYY-MM-DD)
\ No newline at end of file
+    consumed_date: Optional[str] = None  # Add consumed_date field (YYYY-MM-DD)
+
+class MealLogBatchRequest(BaseModel):
+    meals: List[MealLogRequest]
@@ -0,0 +1,95 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from settings import RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL
+
+
+def make_etag(body):
+    """Strong ETag of a serialized response body"""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header value matches the given ETag"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of serialized JSON responses, keyed by (user_id, key).
+
+    Every user has a version that invalidate() bumps when their data changes.
+    Entries remember the version they were computed under and are ignored once
+    it is stale, so a response computed while a write happens is never served
+    after that write. Entries also expire after a TTL, which bounds staleness
+    when several worker processes each hold their own cache.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (user_id, key) -> (version, expires_at, etag, body)
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def version(self, user_id):
+        """Current data version of a user, to pass to set()"""
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def get(self, user_id, key):
+        """
+        Get a cached response.
+
+        Returns:
+            Tuple of (etag, body), or None if missing, expired or invalidated
+        """
+        cache_key = (user_id, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                version, expires_at, etag, body = entry
+                if version == self._versions.get(user_id, 0) and expires_at > time.monotonic():
+                    self._entries.move_to_end(cache_key)
+                    self._stats["hits"] += 1
+                    return etag, body
+                del self._entries[cache_key]
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, user_id, key, body, version):
+        """
+        Store a serialized response computed under `version` (from version()).
+
+        Returns:
+            Tuple of (etag, body). Nothing is stored if the user's data changed
+            while the response was being computed.
+        """
+        etag = make_etag(body)
+        with self._lock:
+            if version == self._versions.get(user_id, 0):
+                self._entries[(user_id, key)] = (version, time.monotonic() + self.ttl, etag, body)
+                self._entries.move_to_end((user_id, key))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return etag, body
+
+    def invalidate(self, user_id):
+        """Drop all cached responses of a user"""
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._stats["invalidations"] += 1
+            for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == user_id]:
+                del self._entries[cache_key]
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+response_cache = ResponseCache()
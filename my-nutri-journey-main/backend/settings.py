@@ -6,6 +6,31 @@ load_dotenv()
 OPENAI_MODEL = "gpt-4o"  # Main LLM model for production
 OPENAI_MODEL_2 = "gpt-3.5-turbo"  # Alternative LLM model for production
 LLM_TIMEOUT = 20  # Timeout for LLM requests in seconds
+LLM_MAX_CONNECTIONS = 20  # Max pooled HTTP connections per LLM provider
+LLM_MAX_KEEPALIVE_CONNECTIONS = 10  # Idle connections kept alive per LLM provider
+LLM_MAX_RETRIES = 1  # Retries the HTTP client makes before giving up on an LLM request
+LLM_EXECUTOR_MAX_WORKERS = 16  # Threads shared by all blocking LLM calls
+LLM_EXECUTOR_MAX_QUEUE = 32  # Blocking LLM calls allowed to wait for a free thread
+LLM_EXECUTOR_ADMISSION_TIMEOUT = 1  # Seconds to wait for a queue slot before rejecting a call
+
+# Image analysis cache (keyed by image content, prompt and model)
+IMAGE_CACHE_DIR = "cache/image_llm_cache"  # diskcache directory for vision results
+IMAGE_CACHE_SIZE_LIMIT = 64 * 1024 * 1024  # Max size of the image cache in bytes
+IMAGE_CACHE_EVICTION_POLICY = "least-recently-used"  # diskcache policy ("least-recently-stored" avoids writes on reads)
+IMAGE_CACHE_TTL = 30 * 24 * 3600  # Seconds before a cached analysis expires
+IMAGE_CACHE_CULL_INTERVAL = 300  # Seconds between background expire/cull passes
+IMAGE_CACHE_PERCEPTUAL_HASH = False  # Also match near-duplicate photos (requires Pillow); may confuse similar plates
+IMAGE_CACHE_PHASH_MAX_DISTANCE = 4  # Max differing bits (out of 64) to treat two photos as the same
+IMAGE_CACHE_PHASH_INDEX_SIZE = 500  # Perceptual hashes remembered per model/prompt
+
+# Image preprocessing before vision calls, per model ("default" is used for unlisted models).
+# Images are shrunk to fit max_long_side x max_short_side, EXIF is stripped and they are
+# re-encoded in the given format. 2048/768 matches the resolution gpt-4o uses in high detail.
+VISION_IMAGE_PRESETS = {
+    "default": {"max_long_side": 2048, "max_short_side": 768, "format": "JPEG", "quality": 85},
+    "gpt-4o": {"max_long_side": 2048, "max_short_side": 768, "format": "JPEG", "quality": 85},
+    "gpt-4o-mini": {"max_long_side": 2048, "max_short_side": 768, "format": "JPEG", "quality": 80},
+}
 
 TEST_OPENAI_MODEL = "gpt-4o"  # LLM model for testing or development
 
@@ -16,22 +41,45 @@ TEST_LLM_PROVIDER = "openai"  # LLM provider for testing
 # OpenAI API key
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")  # API key for OpenAI, loaded from environment
 
-UPLOADED_MEALS_DIR = "data/uploaded_meals"  # Directory for storing uploaded meal images/files
-TEMP_UPLOAD_DIR = "data/temp_upload"  # Directory for temporary uploads
 #FOOD_DB_PATH = "data/food_db.csv"  # Path to the food database CSV
 
-os.makedirs(TEMP_UPLOAD_DIR, exist_ok=True)  # Ensure temp upload directory exists
-
-#USER_DB_PATH = "data/users.db"  # Path to the user database
-#MEAL_DB_PATH = "data/meals.db"  # Path to the meals database
-#RECOMMENDED_MEALS_DB_PATH = "data/recommended_meals.db"  # Path to the recommended meals database
+SQLITE_DB_PATH = "data/nutri_journey.db"  # Path to the SQLite database holding all tables
+# Legacy one-file-per-table layout, migrated into SQLITE_DB_PATH on startup
+USER_DB_PATH = "data/users.db"
+MEAL_DB_PATH = "data/meals.db"
+RECOMMENDED_MEALS_DB_PATH = "data/recommended_meals.db"
+SQLITE_CACHED_STATEMENTS = 256  # Prepared statements kept per SQLite connection
+SQLITE_CACHE_SIZE_KB = 16 * 1024  # SQLite page cache per connection
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # Bytes of each database file SQLite may memory-map
+SQLITE_BUSY_TIMEOUT = 5  # Seconds to wait for a lock held by another writer
 NUM_RECOMMENDATION_DAYS = 3  # Number of days to generate meal recommendations for
+MEALPLAN_GENERATION_MODE = "per_day"  # "per_day" (one concurrent LLM call per day) or "single" (one call for all days)
+MEALPLAN_DAY_MAX_RETRIES = 2  # Extra attempts for a generated day that fails or is malformed
+MEALPLAN_JOB_WORKERS = 2  # Meal plans generated at once by the background job queue
+MEALPLAN_JOB_DB_PATH = "data/meal_plan_jobs.db"  # SQLite file persisting meal-plan jobs, None for in-memory only
+MEALPLAN_JOB_RETENTION = 24 * 3600  # Seconds a finished meal-plan job stays available to pollers
+MEALPLAN_JOB_LEASE = 60  # Seconds without a heartbeat before another process takes over a persisted job
+MEALPLAN_JOB_FAILURE_COOLDOWN = 10 * 60  # Seconds a failed meal-plan job is returned instead of generating its range again
+MEALPLAN_PREFETCH_DAYS = 1  # Generate the next plan once the current one has this many days left after today
+BATCH_ANALYSIS_CONCURRENCY = 4  # Vision calls run at once by the batch meal-image endpoint
+BATCH_ANALYSIS_MAX_FILES = 20  # Max images accepted per batch analysis request
+MEAL_LOG_BATCH_MAX_SIZE = 1000  # Max meals accepted per /api/log-meals request
+ANALYTICS_DAY_PAGE_SIZE = 20  # Meals per page of /api/analytics/day
+RESPONSE_CACHE_MAX_ENTRIES = 1000  # Cached analytics/meal-list responses kept in memory
+RESPONSE_CACHE_TTL = 300  # Seconds before a cached response is recomputed
+CHAT_HISTORY_RECENT_TURNS = 4  # Latest chat turns (user message and reply) kept verbatim in the prompt
+CHAT_HISTORY_TOKEN_BUDGET = 1500  # Max tokens of verbatim chat history in the prompt
+CHAT_SUMMARY_BATCH_TURNS = 2  # Older turns folded into the rolling summary at once
+CHAT_SUMMARY_MAX_TOKENS = 300  # Max tokens of a conversation's rolling summary
+CHAT_SUMMARY_CACHE_MAX_ENTRIES = 1000  # Conversation summaries kept in memory
+CONVERSATION_CACHE_MAX_ENTRIES = 1000  # Stored conversations whose messages are kept in memory
 
 SUPABASE_URL = "https://dydwkwjpuubiyyboiqcy.supabase.co"
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 BUCKET_NAME = "dish-images"
 
 ACTIVE_DB_SERVICE='supabase'  # Active database service, can be 'sqlite' or 'supabase'
+SUPABASE_PAGE_SIZE = 1000  # Rows fetched per request when paging through Supabase results
 
 
 
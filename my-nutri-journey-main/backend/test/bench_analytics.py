@@ -0,0 +1,193 @@
+import sys
+import os
+import time
+import random
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import analytics
+from test_analytics import daily_frame_from_meals
+
+RUNS = 3
+FOODS = ["Rice", "Chicken breast", "Broccoli", "Egg", "Oats", "Banana", "Salmon", "Tofu",
+         "Spinach", "Olive oil", "Avocado", "Bread", "Cheese", "Tomato", "Lentils"]
+
+
+def generate_meals(num_meals, num_days, seed=0):
+    """Synthetic meals for one user spread over the last num_days days"""
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    meals = []
+    for i in range(num_meals):
+        day = today - timedelta(days=rng.randrange(num_days))
+        ingredients = [{"name": food} for food in rng.sample(FOODS, 4)] + [rng.choice(FOODS)]
+        meal = {
+            "id": i,
+            "user_id": 1,
+            "meal_type": rng.choice(["breakfast", "lunch", "dinner", "snack"]),
+            "meal_json": {
+                "dish_name": f"Meal {i}",
+                "ingredients": ingredients,
+                "macronutrients": {
+                    "calories": rng.randint(100, 900),
+                    "protein": rng.randint(0, 60),
+                    "carbs": rng.randint(0, 120),
+                    "fats": rng.randint(0, 50),
+                },
+                "health_score": rng.choice([0, rng.randint(1, 10)]),
+            },
+            "uploaded_at": f"{day.isoformat()}T12:00:00",
+        }
+        if rng.random() < 0.8:
+            meal["consumed_date"] = day.isoformat()
+        meals.append(meal)
+    return meals
+
+
+def legacy_analytics(meals, start_date, today, date_format):
+    """The per-meal loops get_analytics used before the vectorized engine"""
+    def get_meal_calories(meal):
+        return meal.get("meal_json", {}).get("macronutrients", {}).get("calories", 0)
+
+    def get_meal_protein(meal):
+        return meal.get("meal_json", {}).get("macronutrients", {}).get("protein", 0)
+
+    def get_meal_carbs(meal):
+        return meal.get("meal_json", {}).get("macronutrients", {}).get("carbs", 0)
+
+    def get_meal_fats(meal):
+        macros = meal.get("meal_json", {}).get("macronutrients", {})
+        return macros.get("fats", macros.get("fat", 0))
+
+    def get_meal_health_score(meal):
+        return meal.get("meal_json", {}).get("health_score", 0)
+
+    meals_by_date = {}
+    for meal in meals:
+        meal_date = None
+        if meal.get("consumed_date"):
+            meal_date = datetime.strptime(meal["consumed_date"], "%Y-%m-%d").date()
+        if not meal_date and meal.get("uploaded_at"):
+            meal_date = datetime.fromisoformat(meal["uploaded_at"].replace("Z", "")).date()
+        if not meal_date or meal_date < start_date or meal_date > today:
+            continue
+        meals_by_date.setdefault(meal_date.strftime("%Y-%m-%d"), []).append(meal)
+
+    daily_stats = []
+    current_date = start_date
+    while current_date <= today:
+        date_str = current_date.strftime("%Y-%m-%d")
+        day_meals = meals_by_date.get(date_str, [])
+        health_scores = [get_meal_health_score(meal) for meal in day_meals if get_meal_health_score(meal) > 0]
+        daily_stats.append({
+            "date": date_str,
+            "display_date": current_date.strftime(date_format),
+            "calories": sum(get_meal_calories(meal) for meal in day_meals),
+            "protein": sum(get_meal_protein(meal) for meal in day_meals),
+            "carbs": sum(get_meal_carbs(meal) for meal in day_meals),
+            "fats": sum(get_meal_fats(meal) for meal in day_meals),
+            "health_score": sum(health_scores) / len(health_scores) if health_scores else 0,
+            "meals": day_meals,
+        })
+        current_date += timedelta(days=1)
+
+    all_meals = [meal for meals_list in meals_by_date.values() for meal in meals_list]
+    total_meals = len(all_meals)
+    avg_calories = sum(get_meal_calories(meal) for meal in all_meals) / total_meals
+    avg_protein = sum(get_meal_protein(meal) for meal in all_meals) / total_meals
+    avg_carbs = sum(get_meal_carbs(meal) for meal in all_meals) / total_meals
+    avg_fats = sum(get_meal_fats(meal) for meal in all_meals) / total_meals
+    all_health_scores = [get_meal_health_score(meal) for meal in all_meals if get_meal_health_score(meal) > 0]
+    avg_health_score = sum(all_health_scores) / len(all_health_scores) if all_health_scores else 0
+
+    all_foods = []
+    for meal in all_meals:
+        for ingredient in meal.get("meal_json", {}).get("ingredients", []):
+            food_name = ingredient.get("name") if isinstance(ingredient, dict) else ingredient
+            if food_name:
+                all_foods.append(food_name.lower())
+
+    return {
+        "summary": {
+            "days_tracked": len(meals_by_date),
+            "avg_calories": round(avg_calories),
+            "avg_health_score": round(avg_health_score, 1),
+            "total_meals": total_meals,
+            "avg_protein": round(avg_protein),
+            "avg_carbs": round(avg_carbs),
+            "avg_fats": round(avg_fats),
+        },
+        "daily_stats": daily_stats,
+        "frequent_foods": [{"name": name.title(), "count": count}
+                           for name, count in Counter(all_foods).most_common(10)],
+    }
+
+
+def rollup_rows(meals, start_date, today):
+    """The daily_nutrition_rollups rows get_daily_rollups returns for the range"""
+    in_range = analytics.meal_dates(meals).between(start_date.isoformat(), today.isoformat())
+    daily = daily_frame_from_meals([meal for meal, keep in zip(meals, in_range) if keep])
+    return [{"date": day.strftime("%Y-%m-%d"), **row} for day, row in zip(daily.index, daily.to_dict("records"))]
+
+
+def vectorized_analytics(meals, rollups, start_date, today, date_format):
+    """The same response computed the way compute_analytics does, from the rollups and the meals"""
+    daily = analytics.daily_frame_from_rollups(rollups)
+    meals_by_date = analytics.group_meals_by_date(meals, start_date, today)
+    averages = analytics.average_macros(daily)
+    return {
+        "summary": analytics.summarize(daily),
+        "daily_stats": analytics.build_daily_stats(daily, start_date, today, date_format, meals_by_date),
+        "macro_distribution": analytics.macro_distribution(averages["protein"], averages["carbs"], averages["fats"]),
+        "frequent_foods": analytics.top_foods([meal for day in meals_by_date.values() for meal in day]),
+    }
+
+
+def best_time(func, *args):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    """
+    Benchmark get_analytics aggregation for a single user with 10k to 100k meals.
+
+    Compares the legacy per-meal loops with compute_analytics' path over the
+    'quarter' window and checks that both produce the same response. The
+    rollups the database maintains are built up front, outside the timings.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 100000])
+    parser.add_argument("--days", type=int, default=365, help="days of history the meals are spread over")
+    args = parser.parse_args()
+
+    today = datetime.now().date()
+    start_date = today - timedelta(days=89)
+
+    print(f"{'meals':>10}{'legacy ms':>12}{'vector ms':>12}{'speedup':>10}")
+    for size in args.sizes:
+        meals = generate_meals(size, args.days)
+        legacy_time, legacy = best_time(legacy_analytics, meals, start_date, today, "%b %d")
+        rollups = rollup_rows(meals, start_date, today)
+        vector_time, vector = best_time(vectorized_analytics, meals, rollups, start_date, today, "%b %d")
+
+        assert legacy["summary"] == vector["summary"], (legacy["summary"], vector["summary"])
+        assert legacy["frequent_foods"] == vector["frequent_foods"]
+        for legacy_day, vector_day in zip(legacy["daily_stats"], vector["daily_stats"]):
+            assert legacy_day["date"] == vector_day["date"]
+            assert legacy_day["calories"] == vector_day["calories"]
+            assert abs(legacy_day["health_score"] - vector_day["health_score"]) < 1e-9
+            assert legacy_day["meals"] == vector_day["meals"]
+
+        print(f"{size:>10}{1000 * legacy_time:>12.1f}{1000 * vector_time:>12.1f}"
+              f"{legacy_time / vector_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import sys
+import os
+import time
+import base64
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from image_processing import prepare_image_for_vision, detect_image_mime
+from settings import TEST_OPENAI_MODEL, TEST_LLM_PROVIDER, OPENAI_KEY
+
+RUNS = 5
+
+
+def time_vision_call(llm, prompt, image_bytes, mime_type):
+    """Time one uncached vision call with the given payload"""
+    messages = llm._build_image_messages(prompt, image_bytes, mime_type)
+    start = time.perf_counter()
+    llm._get_vision_llm().invoke(messages)
+    return time.perf_counter() - start
+
+
+def main():
+    """
+    Benchmark vision preprocessing over test/dishes.
+
+    Prints original vs. processed size, base64 payload saved and preprocessing
+    time per image. With --llm it also times an uncached vision call with the
+    original and the processed payload (needs OPENAI_API_KEY).
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", action="store_true", help="also time real vision calls")
+    args = parser.parse_args()
+
+    images_dir = os.path.join(os.path.dirname(__file__), "dishes")
+    image_files = sorted(
+        f for f in os.listdir(images_dir)
+        if f.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
+    )
+
+    if not image_files:
+        print("No images found in test/dishes.")
+        return
+
+    llm = None
+    prompt = None
+    if args.llm:
+        from llm_provider import get_llm_provider
+        from prompts import get_image_food_identification_prompt
+        llm = get_llm_provider(provider=TEST_LLM_PROVIDER, model=TEST_OPENAI_MODEL, openai_api_key=OPENAI_KEY)
+        prompt = get_image_food_identification_prompt().format()
+
+    total_original = 0
+    total_processed = 0
+    print(f"{'image':<30}{'original':>12}{'processed':>12}{'b64 saved':>12}{'prep ms':>10}")
+    for fname in image_files:
+        with open(os.path.join(images_dir, fname), "rb") as f:
+            original = f.read()
+
+        timings = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            processed, mime_type = prepare_image_for_vision(original, TEST_OPENAI_MODEL)
+            timings.append(time.perf_counter() - start)
+
+        original_b64 = len(base64.b64encode(original))
+        processed_b64 = len(base64.b64encode(processed))
+        total_original += original_b64
+        total_processed += processed_b64
+        saved = 100 * (1 - processed_b64 / original_b64)
+        print(f"{fname:<30}{len(original):>12}{len(processed):>12}{saved:>11.1f}%"
+              f"{1000 * min(timings):>10.1f}")
+
+        if llm is not None:
+            original_time = time_vision_call(llm, prompt, original, detect_image_mime(original))
+            processed_time = time_vision_call(llm, prompt, processed, mime_type)
+            print(f"{'':<30}vision call: original {original_time:.2f}s, processed {processed_time:.2f}s")
+
+    saved = 100 * (1 - total_processed / total_original)
+    print(f"\nTotal base64 payload: {total_original} -> {total_processed} bytes ({saved:.1f}% saved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import sys
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from db_service import SQLiteService
+
+
+class ConnectPerCallSQLiteService(SQLiteService):
+    """The previous design: a fresh connection with default settings on every call"""
+
+    def _get_connection(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create_user(self, user_data):
+        # Insert, then re-read the row on a second connection
+        user = super().create_user(user_data)
+        return self.get_user(user["id"])
+
+    def update_user(self, user_id, user_data):
+        super().update_user(user_id, user_data)
+        return self.get_user(user_id)
+
+
+def make_user(i):
+    return {
+        "name": f"Bench User {i}",
+        "email": f"bench_{i}@example.com",
+        "password_hash": "hashed_password",
+        "birthdate": "1990-01-01",
+        "weight": 70,
+        "height": 170,
+        "allergies": ["Peanuts"],
+        "dislikes": [],
+        "favoriteFoods": ["Pasta"],
+    }
+
+
+def make_meal(user_id, i):
+    day = f"2024-01-{i % 28 + 1:02d}"
+    return {
+        "user_id": user_id,
+        "meal_type": "lunch",
+        "meal_json": {
+            "name": f"Meal {i}",
+            "ingredients": [{"name": "Rice"}, {"name": "Chicken"}],
+            "macronutrients": {"calories": 500, "protein": 30, "carbs": 60, "fats": 15},
+            "health_score": 7,
+        },
+        "consumed_date": day,
+        "uploaded_at": f"{day}T12:00:00",
+    }
+
+
+def run_workload(service, n):
+    """Time each CRUD method over n calls, returning {method: seconds}"""
+    timings = {}
+
+    def timed(name, func):
+        start = time.perf_counter()
+        result = func()
+        timings[name] = time.perf_counter() - start
+        return result
+
+    users = timed("create_user", lambda: [service.create_user(make_user(i)) for i in range(n)])
+    user_ids = [user["id"] for user in users]
+    timed("get_user", lambda: [service.get_user(user_id) for user_id in user_ids])
+    timed("update_user", lambda: [service.update_user(user_id, {"weight": 71}) for user_id in user_ids])
+    timed("get_user_by_email", lambda: [service.get_user_by_email(f"bench_{i}@example.com") for i in range(n)])
+    meals = timed("insert_meal", lambda: [service.insert_meal(make_meal(user_ids[i % 10], i)) for i in range(n)])
+    timed("get_meals_by_date", lambda: [service.get_meals_by_date(user_ids[i % 10], f"2024-01-{i % 28 + 1:02d}")
+                                        for i in range(n)])
+    timed("get_meals_for_day", lambda: [service.get_meals_for_day(user_ids[i % 10], f"2024-01-{i % 28 + 1:02d}")
+                                        for i in range(n)])
+    timed("get_meals_by_timeframe", lambda: [service.get_meals_by_timeframe(user_ids[i % 10], "2024-01-20")
+                                             for i in range(n)])
+    timed("delete_meal", lambda: [service.delete_meal(meal["id"]) for meal in meals])
+    bulk_meals = timed("insert_meals_bulk", lambda: service.insert_meals_bulk(
+        [make_meal(user_ids[i % 10], i) for i in range(n)]))
+    timed("delete_meal (bulk rows)", lambda: [service.delete_meal(meal["id"]) for meal in bulk_meals])
+    return timings
+
+
+def main():
+    """
+    Benchmark SQLiteService CRUD methods with persistent per-thread connections
+    (WAL, synchronous=NORMAL, statement cache) against connect-per-call.
+    Each service gets its own fresh database files in a temporary directory.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=500, help="calls per method")
+    args = parser.parse_args()
+
+    results = {}
+    for label, service_class in [("connect/call", ConnectPerCallSQLiteService), ("persistent", SQLiteService)]:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            service = service_class(db_path=os.path.join(tmp_dir, "nutri_journey.db"), legacy_db_paths={})
+            results[label] = run_workload(service, args.n)
+            service.close()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"{'method':<26}{'connect/call us':>16}{'persistent us':>16}{'speedup':>10}")
+    for method in results["persistent"]:
+        old = 1e6 * results["connect/call"][method] / args.n
+        new = 1e6 * results["persistent"][method] / args.n
+        print(f"{method:<26}{old:>16.1f}{new:>16.1f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
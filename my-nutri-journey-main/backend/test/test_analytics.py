@@ -0,0 +1,122 @@
+import sys
+import os
+import unittest
+from datetime import date
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import analytics
+
+
+def make_meal(consumed_date=None, uploaded_at=None, calories=0, protein=0, carbs=0, fats=0,
+              health_score=0, ingredients=None):
+    meal = {
+        "meal_json": {
+            "macronutrients": {"calories": calories, "protein": protein, "carbs": carbs, "fats": fats},
+            "health_score": health_score,
+            "ingredients": ingredients or [],
+        }
+    }
+    if consumed_date:
+        meal["consumed_date"] = consumed_date
+    if uploaded_at:
+        meal["uploaded_at"] = uploaded_at
+    return meal
+
+
+def daily_frame_from_meals(meals):
+    """Aggregate meals into one row of DAILY_COLUMNS per date, as the rollups table holds them"""
+    meal_jsons = [meal.get("meal_json") or {} for meal in meals]
+    macros = [meal_json.get("macronutrients") or {} for meal_json in meal_jsons]
+    frame = pd.DataFrame({
+        "date": analytics.meal_dates(meals),
+        "meal_count": 1,
+        **{column: pd.to_numeric(pd.Series([macro.get(column) for macro in macros], dtype="object"),
+                                 errors="coerce").fillna(0.0)
+           for column in analytics.MACRO_COLUMNS},
+    })
+    health_scores = pd.Series([meal_json.get("health_score") or 0 for meal_json in meal_jsons], dtype="float64")
+    frame["health_score_sum"] = health_scores
+    frame["health_score_count"] = (health_scores > 0).astype("int64")
+    return frame.groupby("date")[analytics.DAILY_COLUMNS].sum()
+
+
+class TestAnalytics(unittest.TestCase):
+    """Test the columnar analytics helpers used by /api/analytics"""
+
+    def setUp(self):
+        self.meals = [
+            make_meal("2024-03-01", calories=500, protein=30, carbs=50, fats=20, health_score=8),
+            make_meal(uploaded_at="2024-03-01T19:30:00", calories=300, protein=10, carbs=40, fats=10),
+            make_meal("2024-03-03", calories=600, protein=40, carbs=60, fats=25, health_score=6),
+            make_meal("2024-02-20", calories=999),  # Outside the range
+            make_meal(),  # No date at all
+        ]
+        self.start, self.end = date(2024, 3, 1), date(2024, 3, 3)
+
+    def test_meal_dates_fall_back_to_uploaded_at(self):
+        dates = analytics.meal_dates(self.meals + [make_meal("not a date")])
+        self.assertEqual(str(dates[1].date()), "2024-03-01")
+        self.assertTrue(dates.isna().iloc[4])
+        self.assertTrue(dates.isna().iloc[5])
+
+    def test_group_meals_by_date_skips_out_of_range(self):
+        meals_by_date = analytics.group_meals_by_date(self.meals, self.start, self.end)
+        self.assertEqual(sorted(meals_by_date), ["2024-03-01", "2024-03-03"])
+        self.assertEqual(meals_by_date["2024-03-01"], self.meals[:2])
+
+    def test_daily_stats_and_summary(self):
+        daily = daily_frame_from_meals(self.meals[:3])
+
+        daily_stats = analytics.build_daily_stats(daily, self.start, self.end, "%a")
+        self.assertEqual([day["date"] for day in daily_stats], ["2024-03-01", "2024-03-02", "2024-03-03"])
+        self.assertEqual(daily_stats[0]["calories"], 800)
+        self.assertEqual(daily_stats[0]["health_score"], 8)
+        self.assertEqual(daily_stats[1]["calories"], 0)
+        self.assertEqual(daily_stats[1]["display_date"], "Sat")
+
+        summary = analytics.summarize(daily)
+        self.assertEqual(summary["days_tracked"], 2)
+        self.assertEqual(summary["total_meals"], 3)
+        self.assertEqual(summary["avg_calories"], round(1400 / 3))
+        self.assertEqual(summary["avg_health_score"], 7.0)
+
+    def test_rollups_and_meals_give_the_same_daily_frame(self):
+        rollups = [
+            {"date": "2024-03-01", "meal_count": 2, "calories": 800, "protein": 40, "carbs": 90, "fats": 30,
+             "health_score_sum": 8, "health_score_count": 1},
+            {"date": "2024-03-03", "meal_count": 1, "calories": 600, "protein": 40, "carbs": 60, "fats": 25,
+             "health_score_sum": 6, "health_score_count": 1},
+        ]
+        from_meals = analytics.build_daily_stats(daily_frame_from_meals(self.meals[:3]), self.start, self.end, "%a")
+        from_rollups = analytics.build_daily_stats(analytics.daily_frame_from_rollups(rollups),
+                                                   self.start, self.end, "%a")
+        self.assertEqual(from_meals, from_rollups)
+        self.assertEqual(analytics.summarize(analytics.daily_frame_from_rollups([]))["total_meals"], 0)
+
+    def test_macro_distribution_adds_up_to_100(self):
+        distribution = analytics.macro_distribution(30, 50, 20)
+        self.assertEqual([item["name"] for item in distribution], ["Protein", "Carbs", "Fats"])
+        self.assertEqual(sum(item["value"] for item in distribution), 100)
+        self.assertEqual([item["value"] for item in analytics.macro_distribution(0, 0, 0)], [33, 34, 33])
+
+    def test_top_foods(self):
+        meals = [
+            make_meal(ingredients=[{"name": "Rice"}, {"food": "chicken"}, "Egg"]),
+            make_meal(ingredients=[{"name": "", "matched_food": "Egg"}, "rice", {"name": None}, 42]),
+            make_meal(ingredients=[{"name": "Chicken"}]),
+        ]
+        self.assertEqual(analytics.top_foods(meals), [
+            {"name": "Rice", "count": 2},
+            {"name": "Chicken", "count": 2},
+            {"name": "Egg", "count": 2},
+        ])
+        self.assertEqual(analytics.top_foods(meals, limit=1), [{"name": "Rice", "count": 2}])
+        self.assertEqual(analytics.top_foods([]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
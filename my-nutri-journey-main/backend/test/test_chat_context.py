@@ -0,0 +1,122 @@
+import sys
+import os
+import unittest
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_context import ChatContextManager, ConversationCache, count_tokens
+
+
+class FakeLLM:
+    """Answers summary prompts like LLMProvider.ask_async, recording each prompt"""
+
+    def __init__(self, error=None):
+        self.prompts = []
+        self.error = error
+
+    async def ask_async(self, prompt, json_response=False, timeout=None):
+        self.prompts.append(prompt)
+        if self.error:
+            return {"response": None, "error": self.error, "tokens": 0}
+        return {"response": f"Summary #{len(self.prompts)} of the earlier conversation.", "tokens": 10}
+
+
+def make_turns(num_turns, words=20):
+    messages = []
+    for i in range(num_turns):
+        messages.append({"type": "user", "message": f"Question {i}: " + "protein " * words})
+        messages.append({"type": "bot", "message": f"Answer {i}: " + "eat more beans " * words})
+    return messages
+
+
+class TestChatContextManager(unittest.IsolatedAsyncioTestCase):
+    """Test the token-bounded chat history and its rolling summaries"""
+
+    def setUp(self):
+        self.context = ChatContextManager("gpt-3.5-turbo", recent_turns=2, token_budget=400,
+                                          summary_batch_turns=2, summary_max_tokens=100)
+
+    async def test_short_conversation_is_kept_verbatim(self):
+        llm = FakeLLM()
+        summary, history = await self.context.build(llm, (1, "c1"), make_turns(2))
+        self.assertEqual(summary, "")
+        self.assertTrue(history.startswith("User: Question 0"))
+        self.assertEqual(llm.prompts, [])
+
+    async def test_prompt_size_stays_flat(self):
+        llm = FakeLLM()
+        sizes = []
+        for num_turns in range(1, 41):
+            summary, history = await self.context.build(llm, (1, "c1"), make_turns(num_turns))
+            sizes.append(count_tokens(summary + history, "gpt-3.5-turbo"))
+
+        self.assertLessEqual(max(sizes), 400 + 100)
+        self.assertIn("Answer 39", history)
+        self.assertNotIn("Question 30", history)
+        self.assertTrue(summary.startswith("Summary"))
+        # Older turns are folded in batches, each call extending the cached summary
+        self.assertLess(len(llm.prompts), 25)
+        self.assertIn(f"Summary #{len(llm.prompts) - 1}", llm.prompts[-1])
+        self.assertEqual(self.context.stats()["summaries"], len(llm.prompts))
+
+    async def test_summary_is_rebuilt_when_history_changes(self):
+        llm = FakeLLM()
+        await self.context.build(llm, (1, "c1"), make_turns(8))
+        calls = len(llm.prompts)
+
+        edited = make_turns(8)
+        edited[0]["message"] = "A different first question"
+        await self.context.build(llm, (1, "c1"), edited)
+        self.assertEqual(len(llm.prompts), calls + 1)
+        self.assertIn("A different first question", llm.prompts[-1])
+
+        # Other conversations have their own summary
+        await self.context.build(llm, (1, "c2"), make_turns(8))
+        self.assertEqual(self.context.stats()["entries"], 2)
+
+    async def test_failed_summary_keeps_budget(self):
+        llm = FakeLLM(error="Request timed out")
+        summary, history = await self.context.build(llm, (1, "c1"), make_turns(10))
+        self.assertEqual(summary, "")
+        self.assertLessEqual(count_tokens(history, "gpt-3.5-turbo"), 400)
+        self.assertEqual(self.context.stats()["summary_failures"], 1)
+        self.assertEqual(self.context.stats()["entries"], 0)
+
+    async def test_append_only_summary_skips_digest(self):
+        llm = FakeLLM()
+        messages = make_turns(8)
+        await self.context.build(llm, ("conversation", "c1"), messages, append_only=True)
+        calls = len(llm.prompts)
+
+        # Stored conversations never change, so the cached summary is reused as is
+        messages[0]["message"] = "Never happens in a stored conversation"
+        await self.context.build(llm, ("conversation", "c1"), messages, append_only=True)
+        self.assertEqual(len(llm.prompts), calls)
+
+
+class TestConversationCache(unittest.TestCase):
+    """Test the cache of stored conversations' messages"""
+
+    def test_extend_only_adds_newer_messages(self):
+        cache = ConversationCache(max_entries=2)
+        conversation = {"id": "c1", "user_id": 1}
+        self.assertIsNone(cache.get("c1"))
+
+        cache.extend(conversation, [{"id": 1, "message": "a"}, {"id": 2, "message": "b"}])
+        messages = cache.extend(conversation, [{"id": 2, "message": "b"}, {"id": 5, "message": "c"}])
+        self.assertEqual([message["id"] for message in messages], [1, 2, 5])
+
+        cached_conversation, cached = cache.get("c1")
+        self.assertEqual(cached_conversation, conversation)
+        cached.append({"id": 6})  # A copy, the cache is unchanged
+        self.assertEqual(len(cache.get("c1")[1]), 3)
+
+        cache.extend({"id": "c2", "user_id": 1}, [])
+        cache.extend({"id": "c3", "user_id": 1}, [])
+        self.assertIsNone(cache.get("c1"))
+        self.assertEqual(cache.stats()["entries"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,10 @@ import json
 from datetime import datetime, timedelta
 import uuid
 import warnings
+import threading
+import sqlite3
+import shutil
+import tempfile
 
 # Add parent directory to path so we can import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -278,6 +282,177 @@ class BaseDBServiceTest:
         far_past = "2000-01-01"
         all_meals = self.db_service.get_meals_by_timeframe(user_id, far_past)
         self.assertEqual(len(all_meals), 3)
+        
+        # The ingredients-only variant returns the same meals with a reduced meal_json
+        ingredient_meals = self.db_service.get_meal_ingredients_by_timeframe(user_id, seven_days_ago)
+        self.assertEqual(len(ingredient_meals), 2)
+        for meal in ingredient_meals:
+            self.assertEqual(meal["meal_json"], {"ingredients": [{"name": "Test Ingredient"}]})
+    
+    def test_daily_rollups(self):
+        """Test that daily nutrition rollups follow meal inserts and deletes"""
+        # First create a user
+        test_email = generate_test_email()
+        user_data = {
+            "name": "Rollup Test User",
+            "email": test_email,
+            "password_hash": "hashed_password",
+            "birthdate": "1990-01-01",
+            "weight": 70,
+            "height": 170,
+            "allergies": [],
+            "dislikes": [],
+            "favoriteFoods": []
+        }
+        
+        created_user = self.db_service.create_user(user_data)
+        user_id = created_user["id"]
+        self.test_user_ids.append(user_id)
+        
+        today = datetime.now().date()
+        yesterday = today - timedelta(days=1)
+        meals = [
+            (today, {"calories": 500, "protein": 30, "carbs": 50, "fats": 20}, 8),
+            (today, {"calories": 300, "protein": 10, "carbs": 40, "fat": 10}, 0),
+            (yesterday, {"calories": 600, "protein": 40, "carbs": 60, "fats": 25}, 6),
+        ]
+        meal_ids = []
+        for consumed_date, macros, health_score in meals:
+            created_meal = self.db_service.insert_meal({
+                "user_id": user_id,
+                "meal_type": "lunch",
+                "meal_json": {"name": "Rollup Meal", "macronutrients": macros, "health_score": health_score},
+                "consumed_date": consumed_date.isoformat(),
+                "uploaded_at": datetime.now().isoformat()
+            })
+            meal_ids.append(created_meal["id"])
+            self.test_meal_ids.append(created_meal["id"])
+        
+        rollups = self.db_service.get_daily_rollups(user_id, yesterday.isoformat(), today.isoformat())
+        self.assertEqual([row["date"] for row in rollups], [yesterday.isoformat(), today.isoformat()])
+        self.assertEqual(self.db_service.get_earliest_meal_date(user_id), yesterday.isoformat())
+        today_rollup = rollups[1]
+        self.assertEqual(today_rollup["meal_count"], 2)
+        self.assertEqual(today_rollup["calories"], 800)
+        self.assertEqual(today_rollup["fats"], 30)
+        # Only meals with a health score count towards its average
+        self.assertEqual(today_rollup["health_score_sum"], 8)
+        self.assertEqual(today_rollup["health_score_count"], 1)
+        
+        # Deleting a meal takes it out of its day, an empty day disappears
+        self.db_service.delete_meal(meal_ids[0])
+        self.db_service.delete_meal(meal_ids[2])
+        rollups = self.db_service.get_daily_rollups(user_id, yesterday.isoformat(), today.isoformat())
+        self.assertEqual(len(rollups), 1)
+        self.assertEqual(rollups[0]["meal_count"], 1)
+        self.assertEqual(rollups[0]["calories"], 300)
+        self.assertEqual(rollups[0]["health_score_count"], 0)
+        
+        # The earliest meal date follows the remaining meals
+        self.assertEqual(self.db_service.get_earliest_meal_date(user_id), today.isoformat())
+        self.assertIsNone(self.db_service.get_earliest_meal_date(-1))
+    
+    def test_insert_meals_bulk(self):
+        """Test inserting many meals at once, with ids in order and rollups updated"""
+        # First create a user
+        test_email = generate_test_email()
+        user_data = {
+            "name": "Bulk Test User",
+            "email": test_email,
+            "password_hash": "hashed_password",
+            "birthdate": "1990-01-01",
+            "weight": 70,
+            "height": 170,
+            "allergies": [],
+            "dislikes": [],
+            "favoriteFoods": []
+        }
+        
+        created_user = self.db_service.create_user(user_data)
+        user_id = created_user["id"]
+        self.test_user_ids.append(user_id)
+        
+        today = datetime.now().date()
+        yesterday = today - timedelta(days=1)
+        meals_data = [
+            {
+                "user_id": user_id,
+                "meal_type": "snack",
+                "meal_json": {"name": f"Bulk Meal {i}", "macronutrients": {"calories": 100 * (i + 1)},
+                              "health_score": 5},
+                "consumed_date": (today if i % 2 == 0 else yesterday).isoformat(),
+                "uploaded_at": datetime.now().isoformat()
+            }
+            for i in range(5)
+        ]
+        
+        inserted = self.db_service.insert_meals_bulk(meals_data)
+        self.test_meal_ids.extend(meal["id"] for meal in inserted)
+        self.assertEqual([meal["meal_json"]["name"] for meal in inserted],
+                         [f"Bulk Meal {i}" for i in range(5)])
+        self.assertEqual(len({meal["id"] for meal in inserted}), 5)
+        self.assertEqual(self.db_service.get_meal_by_id(inserted[3]["id"])["meal_json"]["name"], "Bulk Meal 3")
+        self.assertEqual(self.db_service.insert_meals_bulk([]), [])
+        
+        # Meals 0, 2 and 4 were today, 1 and 3 yesterday
+        rollups = self.db_service.get_daily_rollups(user_id, yesterday.isoformat(), today.isoformat())
+        self.assertEqual([row["meal_count"] for row in rollups], [2, 3])
+        self.assertEqual([row["calories"] for row in rollups], [600, 900])
+        self.assertEqual(rollups[1]["health_score_count"], 3)
+        
+        self.assertEqual(len(self.db_service.get_meals_for_day(user_id, today.isoformat())), 3)
+    
+    def test_get_meals_for_day(self):
+        """Test that a day's meals are matched on consumed_date, which defaults to the upload day"""
+        # First create a user
+        test_email = generate_test_email()
+        user_data = {
+            "name": "Day Test User",
+            "email": test_email,
+            "password_hash": "hashed_password",
+            "birthdate": "1990-01-01",
+            "weight": 70,
+            "height": 170,
+            "allergies": [],
+            "dislikes": [],
+            "favoriteFoods": []
+        }
+        
+        created_user = self.db_service.create_user(user_data)
+        user_id = created_user["id"]
+        self.test_user_ids.append(user_id)
+        
+        today = datetime.now().date()
+        yesterday = today - timedelta(days=1)
+        meals = [
+            ("Late Log", yesterday.isoformat(), f"{today.isoformat()}T08:00:00"),
+            ("No Date", None, f"{today.isoformat()}T12:00:00"),
+            ("Dinner", today.isoformat(), f"{today.isoformat()}T19:00:00"),
+        ]
+        for name, consumed_date, uploaded_at in meals:
+            meal_data = {
+                "user_id": user_id,
+                "meal_type": "lunch",
+                "meal_json": {"name": name, "macronutrients": {"calories": 100}},
+                "uploaded_at": uploaded_at
+            }
+            if consumed_date:
+                meal_data["consumed_date"] = consumed_date
+            created_meal = self.db_service.insert_meal(meal_data)
+            self.test_meal_ids.append(created_meal["id"])
+        
+        # Oldest upload first; a meal consumed yesterday but logged today belongs to yesterday
+        today_meals = self.db_service.get_meals_for_day(user_id, today.isoformat())
+        self.assertEqual([meal["meal_json"]["name"] for meal in today_meals], ["No Date", "Dinner"])
+        self.assertEqual(str(today_meals[0]["consumed_date"])[:10], today.isoformat())
+
+        # Pages are read with limit and offset in the same order
+        page = self.db_service.get_meals_for_day(user_id, today.isoformat(), limit=1, offset=1)
+        self.assertEqual([meal["meal_json"]["name"] for meal in page], ["Dinner"])
+        self.assertEqual(self.db_service.get_meals_for_day(user_id, today.isoformat(), limit=5, offset=2), [])
+
+        yesterday_meals = self.db_service.get_meals_for_day(user_id, yesterday.isoformat())
+        self.assertEqual([meal["meal_json"]["name"] for meal in yesterday_meals], ["Late Log"])
     
     def test_recommended_meals(self):
         """Test inserting and retrieving recommended meals"""
@@ -374,6 +549,46 @@ class BaseDBServiceTest:
         tomorrow_recommendations = self.db_service.get_recommended_meals_by_date(user_id, tomorrow)
         self.assertEqual(len(tomorrow_recommendations), 1)
         self.assertEqual(tomorrow_recommendations[0]["dish_name"], "Protein Smoothie")
+        
+        # The plan runs until tomorrow
+        self.assertEqual(self.db_service.get_last_planned_date(user_id), tomorrow)
+        self.assertIsNone(self.db_service.get_last_planned_date(-1))
+
+    def test_conversations(self):
+        """Test appending to a conversation and reading its messages incrementally"""
+        created_user = self.db_service.create_user({
+            "name": "Conversation Test User",
+            "email": generate_test_email(),
+            "password_hash": "hashed_password",
+            "allergies": [],
+            "dislikes": [],
+            "favoriteFoods": []
+        })
+        user_id = created_user["id"]
+        self.test_user_ids.append(user_id)
+        
+        conversation = self.db_service.create_conversation(user_id)
+        self.assertEqual(self.db_service.get_conversation(conversation["id"])["user_id"], user_id)
+        self.assertEqual(self.db_service.get_conversation_messages(conversation["id"]), [])
+        
+        first = self.db_service.append_conversation_messages(conversation["id"], [
+            {"type": "user", "message": "How much protein do I need?"},
+            {"type": "bot", "message": "About 1.6 g per kg of body weight."}
+        ])
+        second = self.db_service.append_conversation_messages(conversation["id"], [
+            {"type": "user", "message": "And fiber?"}
+        ])
+        self.assertLess(first[0]["id"], first[1]["id"])
+        self.assertLess(first[1]["id"], second[0]["id"])
+        
+        messages = self.db_service.get_conversation_messages(conversation["id"])
+        self.assertEqual([message["message"] for message in messages],
+                         ["How much protein do I need?", "About 1.6 g per kg of body weight.", "And fiber?"])
+        self.assertEqual([message["type"] for message in messages], ["user", "bot", "user"])
+        
+        # Only the messages appended after a known one
+        newer = self.db_service.get_conversation_messages(conversation["id"], after_id=first[1]["id"])
+        self.assertEqual([message["id"] for message in newer], [second[0]["id"]])
 
 
 class TestSQLiteService(unittest.TestCase, BaseDBServiceTest):
@@ -390,6 +605,15 @@ class TestSQLiteService(unittest.TestCase, BaseDBServiceTest):
             try:
                 with self.db_service.get_user_db() as conn:
                     conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+                with self.db_service.get_meal_db() as conn:
+                    conn.execute("DELETE FROM daily_nutrition_rollups WHERE user_id = ?", (user_id,))
+                    conn.execute("DELETE FROM recommended_meals WHERE user_id = ?", (user_id,))
+                    conn.execute(
+                        "DELETE FROM conversation_messages WHERE conversation_id IN "
+                        "(SELECT id FROM conversations WHERE user_id = ?)",
+                        (user_id,)
+                    )
+                    conn.execute("DELETE FROM conversations WHERE user_id = ?", (user_id,))
             except Exception as e:
                 print(f"Error cleaning up test user {user_id}: {e}")
         
@@ -400,6 +624,142 @@ class TestSQLiteService(unittest.TestCase, BaseDBServiceTest):
                     conn.execute("DELETE FROM meals WHERE id = ?", (meal_id,))
             except Exception as e:
                 print(f"Error cleaning up test meal {meal_id}: {e}")
+        
+        self.db_service.close()
+    
+    def test_connections_are_reused_per_thread(self):
+        """Test that each thread keeps one configured connection"""
+        conn = self.db_service.get_meal_db()
+        self.assertIs(conn, self.db_service.get_meal_db())
+        self.assertIs(conn, self.db_service.get_user_db())  # All tables live in one file
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+        
+        other_thread_conn = []
+        thread = threading.Thread(target=lambda: other_thread_conn.append(self.db_service.get_meal_db()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(conn, other_thread_conn[0])
+
+    def test_insert_rows_returns_each_rows_id(self):
+        """Test that bulk inserts read back every row's id, even when the ids are not consecutive"""
+        with self.db_service.get_meal_db() as conn:
+            # AUTOINCREMENT continues from sqlite_sequence, which stays ahead of MAX(id) after deletes
+            explicit_id = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1000 FROM sqlite_sequence WHERE name = 'meals'"
+            ).fetchone()[0]
+            rows = [
+                {"user_id": -1, "meal_type": "lunch", "meal_json": "{}"},
+                {"id": explicit_id, "user_id": -1, "meal_type": "dinner", "meal_json": "{}"},
+            ]
+            ids = self.db_service._insert_rows(conn, "meals", rows)
+        self.test_meal_ids.extend(ids)
+
+        self.assertEqual(ids[1], explicit_id)
+        self.assertLess(ids[0], explicit_id)
+        self.assertEqual(self.db_service.get_meal_by_id(ids[0])["meal_type"], "lunch")
+
+    def query_plans(self, func):
+        """Run func and return the EXPLAIN QUERY PLAN details of each SELECT it executed"""
+        conn = self.db_service.get_meal_db()
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            func()
+        finally:
+            conn.set_trace_callback(None)
+        plans = []
+        for statement in statements:
+            if statement.lstrip().upper().startswith("SELECT"):
+                rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+                plans.append(" | ".join(row["detail"] for row in rows))
+        return plans
+    
+    def test_meal_queries_use_composite_indexes(self):
+        """Test that per-user date queries are index searches, not table scans"""
+        plans = self.query_plans(lambda: self.db_service.get_meals_by_date(1, "2024-03-01"))
+        self.assertEqual(len(plans), 1)
+        self.assertIn("USING INDEX idx_meals_user_consumed_date (user_id=? AND consumed_date=?)", plans[0])
+        self.assertNotIn("TEMP B-TREE", plans[0])  # ORDER BY uploaded_at comes from the index
+        
+        # consumed_date IS NULL is an equality on the index, the day is a range on uploaded_at
+        plans = self.query_plans(lambda: self.db_service.get_meals_by_upload_date(1, "2024-03-01"))
+        self.assertIn("SEARCH meals USING INDEX", plans[0])
+        self.assertIn("uploaded_at>? AND uploaded_at<?", plans[0])
+        
+        # Both branches of the day fallback are searches of the consumed_date index, merged in order
+        plans = self.query_plans(lambda: self.db_service.get_meals_for_day(1, "2024-03-01"))
+        self.assertEqual(len(plans), 1)
+        self.assertIn("MERGE (UNION ALL)", plans[0])
+        self.assertNotIn("TEMP B-TREE", plans[0])
+        self.assertIn("idx_meals_user_consumed_date (user_id=? AND consumed_date=?)", plans[0])
+        self.assertIn("idx_meals_user_consumed_date (user_id=? AND consumed_date=? AND uploaded_at>? AND uploaded_at<?)",
+                      plans[0])
+        
+        plans = self.query_plans(lambda: self.db_service.get_meals_by_timeframe(1, "2024-03-01"))
+        self.assertIn("MULTI-INDEX OR", plans[0])
+        self.assertIn("idx_meals_user_consumed_date (user_id=? AND consumed_date>?)", plans[0])
+        self.assertIn("idx_meals_user_uploaded_at (user_id=? AND uploaded_at>?)", plans[0])
+        
+        plans = self.query_plans(lambda: self.db_service.get_recommended_meals_by_date(1, "2024-03-01"))
+        self.assertIn("USING INDEX idx_recommended_meals_user_planned_date (user_id=? AND planned_date=?)", plans[0])
+        
+        plans = self.query_plans(lambda: self.db_service.get_last_planned_date(1))
+        self.assertIn("SEARCH recommended_meals USING COVERING INDEX idx_recommended_meals_user_planned_date", plans[0])
+        
+        plans = self.query_plans(lambda: self.db_service.get_conversation_messages("c", after_id=10))
+        self.assertIn("idx_conversation_messages_conversation_id (conversation_id=? AND id>?)", plans[0])
+        self.assertNotIn("TEMP B-TREE", plans[0])
+        
+        for plan in plans:
+            self.assertNotIn("SCAN meals", plan)
+    
+    def test_backfill_consumed_dates(self):
+        """Test that meals stored without consumed_date are found by day, then backfilled"""
+        with self.db_service.get_meal_db() as conn:
+            for name, uploaded_at in [("Old Meal", "2024-03-01T12:00:00"), ("Next Day", "2024-03-02T00:00:00")]:
+                cursor = conn.execute(
+                    "INSERT INTO meals (user_id, meal_type, meal_json, uploaded_at) VALUES (?, ?, ?, ?)",
+                    (-1, "lunch", json.dumps({"name": name}), uploaded_at)
+                )
+                self.test_meal_ids.append(cursor.lastrowid)
+        
+        meals = self.db_service.get_meals_for_day(-1, "2024-03-01")
+        self.assertEqual([meal["meal_json"]["name"] for meal in meals], ["Old Meal"])
+        self.assertIsNone(meals[0]["consumed_date"])
+        
+        self.assertEqual(self.db_service.backfill_consumed_dates(), 2)
+        self.assertEqual(self.db_service.backfill_consumed_dates(), 0)
+        meals = self.db_service.get_meals_for_day(-1, "2024-03-01")
+        self.assertEqual(meals[0]["consumed_date"], "2024-03-01")
+    
+    def test_migrates_legacy_database_files(self):
+        """Test that the one-file-per-table layout is copied into the single database"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, True)
+        legacy_paths = {table: os.path.join(tmp_dir, f"{table}.db") for table in SQLiteService.LEGACY_TABLES}
+        
+        with sqlite3.connect(legacy_paths["users"]) as conn:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT, allergies TEXT, "
+                         "dislikes TEXT, favoriteFoods TEXT)")
+            conn.execute("INSERT INTO users VALUES (7, 'Legacy', 'legacy@example.com', '[]', '[]', '[]')")
+        with sqlite3.connect(legacy_paths["meals"]) as conn:
+            conn.execute("CREATE TABLE meals (id INTEGER PRIMARY KEY, user_id INTEGER, meal_type TEXT, "
+                         "consumed_date TEXT, meal_json TEXT, uploaded_at TEXT)")
+            conn.execute("INSERT INTO meals VALUES (1, 7, 'lunch', '2024-03-01', ?, '2024-03-01T12:00:00')",
+                         (json.dumps({"macronutrients": {"calories": 450}}),))
+            conn.execute("INSERT INTO meals VALUES (2, 7, 'dinner', NULL, ?, '2024-03-01T19:00:00')",
+                         (json.dumps({"macronutrients": {"calories": 550}}),))
+        
+        service = SQLiteService(db_path=os.path.join(tmp_dir, "nutri_journey.db"), legacy_db_paths=legacy_paths)
+        self.addCleanup(service.close)
+        
+        self.assertEqual(service.get_user(7)["name"], "Legacy")
+        # Migrated meals without a consumed_date are backfilled
+        self.assertEqual(len(service.get_meals_by_date(7, "2024-03-01")), 2)
+        self.assertEqual(service.get_daily_rollups(7, "2024-03-01", "2024-03-01")[0]["calories"], 1000)
+        self.assertFalse(os.path.exists(legacy_paths["meals"]))
+        self.assertTrue(os.path.exists(legacy_paths["meals"] + ".migrated"))
 
 
 class TestSupabaseService(unittest.TestCase, BaseDBServiceTest):
@@ -419,6 +779,7 @@ class TestSupabaseService(unittest.TestCase, BaseDBServiceTest):
         for user_id in self.test_user_ids:
             try:
                 self.db_service.get_user_db().delete().eq("id", user_id).execute()
+                self.db_service.get_rollup_db().delete().eq("user_id", user_id).execute()
             except Exception as e:
                 print(f"Error cleaning up test user {user_id}: {e}")
         
@@ -0,0 +1,48 @@
+import sys
+import os
+import io
+import unittest
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_processing import Image, detect_image_mime, prepare_image_for_vision
+
+DISHES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dishes")
+
+
+def read_dish(name):
+    with open(os.path.join(DISHES_DIR, name), "rb") as f:
+        return f.read()
+
+
+class TestDetectImageMime(unittest.TestCase):
+
+    def test_detects_real_format(self):
+        self.assertEqual(detect_image_mime(read_dish("cheeseburger.jpeg")), "image/jpeg")
+        self.assertEqual(detect_image_mime(read_dish("tuna_salad.webp")), "image/webp")
+        self.assertEqual(detect_image_mime(b"not an image"), "image/jpeg")
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class TestPrepareImageForVision(unittest.TestCase):
+
+    def test_large_photo_is_downscaled_and_stripped(self):
+        original = read_dish("watermelon_and_rice.jpg")
+        processed, mime_type = prepare_image_for_vision(original, "gpt-4o")
+        self.assertEqual(mime_type, "image/jpeg")
+        self.assertLess(len(processed), len(original) // 4)
+        with Image.open(io.BytesIO(processed)) as img:
+            self.assertLessEqual(max(img.size), 2048)
+            self.assertLessEqual(min(img.size), 768)
+            self.assertNotIn("exif", img.info)
+
+    def test_small_image_keeps_smaller_original(self):
+        original = read_dish("tuna_salad.webp")
+        processed, mime_type = prepare_image_for_vision(original, "gpt-4o")
+        self.assertLessEqual(len(processed), len(original))
+        self.assertEqual(detect_image_mime(processed), mime_type)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,285 @@
+import sys
+import os
+import unittest
+import asyncio
+import threading
+import time
+import shutil
+import tempfile
+import itertools
+import diskcache
+from unittest import mock
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_provider import (LLMProvider, LLMExecutor, LLMExecutorSaturated, get_llm_provider,
+                          get_image_cache_stats)
+from image_processing import Image, perceptual_hash, hamming_distance
+from settings import IMAGE_CACHE_SIZE_LIMIT, IMAGE_CACHE_EVICTION_POLICY, IMAGE_CACHE_PHASH_MAX_DISTANCE
+
+DISHES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dishes")
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+        self.response_metadata = {"token_usage": {"total_tokens": 42}}
+
+
+class FakeChatModel:
+    """Chat model stand-in that answers after a fixed delay"""
+
+    def __init__(self, content, delay=0):
+        self.content = content
+        self.delay = delay
+
+    def invoke(self, prompt):
+        self.calls = getattr(self, "calls", 0) + 1
+        return FakeMessage(self.content)
+
+    async def ainvoke(self, prompt):
+        self.calls = getattr(self, "calls", 0) + 1
+        await asyncio.sleep(self.delay)
+        return FakeMessage(self.content)
+
+    async def astream(self, prompt):
+        for i, piece in enumerate(self.content.split(" ")):
+            await asyncio.sleep(self.delay)
+            yield FakeChunk(piece if i == 0 else " " + piece)
+        yield FakeChunk("", usage_metadata={"total_tokens": 42})
+
+
+class FakeChunk:
+    def __init__(self, content, usage_metadata=None):
+        self.content = content
+        self.usage_metadata = usage_metadata
+
+
+class TestProviderRegistry(unittest.TestCase):
+    """Test that providers are shared per (provider, model, kwargs)"""
+
+    def test_same_configuration_returns_same_instance(self):
+        first = get_llm_provider(provider="openai", model="gpt-4o", openai_api_key="sk-test")
+        second = get_llm_provider(provider="OpenAI", model="gpt-4o", openai_api_key="sk-test")
+        self.assertIsInstance(first, LLMProvider)
+        self.assertIs(first, second)
+
+    def test_different_configuration_returns_new_instance(self):
+        base = get_llm_provider(provider="openai", model="gpt-4o", openai_api_key="sk-test")
+        other_model = get_llm_provider(provider="openai", model="gpt-3.5-turbo", openai_api_key="sk-test")
+        other_key = get_llm_provider(provider="openai", model="gpt-4o", openai_api_key="sk-other")
+        self.assertIsNot(base, other_model)
+        self.assertIsNot(base, other_key)
+
+    def test_vision_llm_reuses_pooled_client(self):
+        provider = get_llm_provider(provider="openai", model="gpt-4o", openai_api_key="sk-test")
+        self.assertIs(provider._get_vision_llm(), provider.llm)
+        self.assertIs(provider._get_vision_llm(), provider._get_vision_llm())
+
+
+class TestAskAsync(unittest.TestCase):
+    """Test the asyncio request path"""
+
+    def setUp(self):
+        self.provider = LLMProvider(provider="openai", model="gpt-4o", openai_api_key="sk-test")
+
+    def test_ask_async_returns_response(self):
+        self.provider.llm = FakeChatModel('```json\n{"dish_name": "Salad"}\n```')
+        result = asyncio.run(self.provider.ask_async("prompt", json_response=True))
+        self.assertEqual(result["response"], {"dish_name": "Salad"})
+        self.assertEqual(result["tokens"], 42)
+
+    def test_ask_async_times_out(self):
+        self.provider.llm = FakeChatModel("too late", delay=1)
+        result = asyncio.run(self.provider.ask_async("prompt", timeout=0.05))
+        self.assertIsNone(result["response"])
+        self.assertEqual(result["error"], "Request timed out")
+
+
+class TestAStream(unittest.TestCase):
+    """Test streaming responses"""
+
+    def setUp(self):
+        self.provider = LLMProvider(provider="openai", model="gpt-4o", openai_api_key="sk-test")
+
+    def collect(self, timeout=None):
+        async def run():
+            return [event async for event in self.provider.astream("prompt", timeout=timeout)]
+        return asyncio.run(run())
+
+    def test_streams_tokens_then_done(self):
+        self.provider.llm = FakeChatModel("Eat more greens")
+        events = self.collect()
+        self.assertEqual([e["content"] for e in events[:-1]], ["Eat", " more", " greens"])
+        done = events[-1]
+        self.assertEqual(done["type"], "done")
+        self.assertEqual(done["response"], "Eat more greens")
+        self.assertEqual(done["tokens"], 42)
+        self.assertLessEqual(done["ttft"], done["elapsed"])
+
+    def test_timeout_applies_per_chunk(self):
+        # Four 0.03s chunks outlast the 0.05s timeout, but none of them waits that long
+        self.provider.llm = FakeChatModel("one two three", delay=0.03)
+        self.assertEqual(self.collect(timeout=0.05)[-1]["type"], "done")
+
+        self.provider.llm = FakeChatModel("too late", delay=1)
+        events = self.collect(timeout=0.05)
+        self.assertEqual(events, [{"type": "error", "error": "Request timed out"}])
+
+
+class TestLLMExecutor(unittest.TestCase):
+    """Test admission control and abandonment tracking of the shared executor"""
+
+    def test_rejects_when_saturated(self):
+        executor = LLMExecutor(max_workers=1, max_queue=0, admission_timeout=0.01)
+        release = threading.Event()
+        future = executor.submit(release.wait)
+        with self.assertRaises(LLMExecutorSaturated):
+            executor.submit(release.wait)
+        self.assertEqual(executor.stats()["rejected"], 1)
+        release.set()
+        future.result(timeout=1)
+
+    def test_tracks_abandoned_calls(self):
+        executor = LLMExecutor(max_workers=1, max_queue=1, admission_timeout=0.01)
+        release = threading.Event()
+        running = executor.submit(release.wait)
+        queued = executor.submit(release.wait)
+
+        # A queued call is simply dropped, a running one is tracked as abandoned
+        executor.abandon(queued)
+        executor.abandon(running)
+        stats = executor.stats()
+        self.assertEqual(stats["abandoned"], 1)
+        self.assertEqual(stats["in_flight"], 1)
+
+        release.set()
+        running.result(timeout=1)
+        time.sleep(0.05)
+        stats = executor.stats()
+        self.assertEqual(stats["abandoned"], 0)
+        self.assertEqual(stats["abandoned_total"], 1)
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_sync_ask_times_out_without_blocking(self):
+        provider = LLMProvider(provider="openai", model="gpt-4o", openai_api_key="sk-test")
+        release = threading.Event()
+        provider._execute_llm_request = lambda prompt: release.wait()
+        start = time.time()
+        result = provider.ask("prompt", timeout=0.05)
+        release.set()
+        self.assertEqual(result["error"], "Request timed out")
+        self.assertLess(time.time() - start, 1)
+
+
+class TestImageCache(unittest.TestCase):
+    """Test that vision results are cached by image content, not by path"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.provider = LLMProvider(provider="openai", model="gpt-4o", openai_api_key="sk-test")
+        self.provider._image_cache = diskcache.Cache(os.path.join(self.tmp_dir, "cache"))
+        self.fake_llm = FakeChatModel('{"dish_name": "Cheeseburger"}')
+        self.provider._vision_llm = self.fake_llm
+
+    def tearDown(self):
+        self.provider._image_cache.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def copy_dish(self, name, target_name):
+        target = os.path.join(self.tmp_dir, target_name)
+        shutil.copy(os.path.join(DISHES_DIR, name), target)
+        return target
+
+    def test_same_bytes_under_new_path_hits_cache(self):
+        first = self.copy_dish("cheeseburger.jpeg", "meal_1_aaaa.jpeg")
+        second = self.copy_dish("cheeseburger.jpeg", "meal_2_bbbb.jpeg")
+        result = self.provider.ask_with_image("prompt", first, json_response=True)
+        cached = self.provider.ask_with_image("prompt", second, json_response=True)
+        self.assertEqual(result, cached)
+        self.assertEqual(self.fake_llm.calls, 1)
+
+    def test_unparseable_reply_is_not_cached(self):
+        self.fake_llm.content = "Sorry, I can't tell what this is"
+        image = self.copy_dish("cheeseburger.jpeg", "meal_1_aaaa.jpeg")
+        result = self.provider.ask_with_image("prompt", image, json_response=True)
+        self.assertIsNone(result["response"])
+
+        # The next upload of the photo reaches the model again, in both paths
+        self.fake_llm.content = '{"dish_name": "Cheeseburger"}'
+        result = asyncio.run(self.provider.ask_with_image_async("prompt", image, json_response=True))
+        self.assertEqual(result["response"], {"dish_name": "Cheeseburger"})
+        self.assertEqual(self.fake_llm.calls, 2)
+
+        self.fake_llm.content = "not json"
+        self.provider._image_cache.clear()
+        asyncio.run(self.provider.ask_with_image_async("prompt", image, json_response=True))
+        self.provider.ask_with_image("prompt", image, json_response=True)
+        self.assertEqual(self.fake_llm.calls, 4)
+
+    def test_in_memory_bytes_share_cache_with_files(self):
+        path = self.copy_dish("korean_beef_rice_bowl.jpeg", "meal.jpeg")
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+        self.provider.ask_with_image("prompt", path, json_response=True)
+        cached = asyncio.run(self.provider.ask_with_image_async("prompt", image_bytes=image_bytes,
+                                                                json_response=True))
+        self.assertEqual(cached["response"], {"dish_name": "Cheeseburger"})
+        self.assertEqual(self.fake_llm.calls, 1)
+
+    def test_hit_and_miss_counters(self):
+        path = self.copy_dish("pasta_carbonara.jpeg", "meal.jpeg")
+        before = get_image_cache_stats()
+        self.provider.ask_with_image("counter prompt", path, json_response=True)
+        self.provider.ask_with_image("counter prompt", path, json_response=True)
+        after = get_image_cache_stats()
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertEqual(after["hits"] - before["hits"], 1)
+
+    def test_shared_cache_is_bounded_by_diskcache(self):
+        cache = LLMProvider._image_cache
+        self.assertEqual(cache.size_limit, IMAGE_CACHE_SIZE_LIMIT)
+        self.assertEqual(cache.eviction_policy, IMAGE_CACHE_EVICTION_POLICY)
+        self.assertEqual(cache.cull_limit, 0)
+
+    def test_different_prompt_misses_cache(self):
+        path = self.copy_dish("cheeseburger.jpeg", "meal.jpeg")
+        self.provider.ask_with_image("prompt", path, json_response=True)
+        self.provider.ask_with_image("another prompt", path, json_response=True)
+        self.assertEqual(self.fake_llm.calls, 2)
+
+    @unittest.skipIf(Image is None, "Pillow is not installed")
+    @mock.patch("image_processing.IMAGE_CACHE_PERCEPTUAL_HASH", True)
+    def test_near_duplicate_hits_cache(self):
+        original = self.copy_dish("cheeseburger.jpeg", "meal.jpeg")
+        recompressed = os.path.join(self.tmp_dir, "meal_small.jpeg")
+        with Image.open(original) as img:
+            img.resize((img.width // 2, img.height // 2)).save(recompressed, "JPEG", quality=60)
+
+        self.provider.ask_with_image("prompt", original, json_response=True)
+        self.provider.ask_with_image("prompt", recompressed, json_response=True)
+        self.assertEqual(self.fake_llm.calls, 1)
+
+        other_dish = self.copy_dish("tuna_salad.webp", "other.webp")
+        self.provider.ask_with_image("prompt", other_dish, json_response=True)
+        self.assertEqual(self.fake_llm.calls, 2)
+
+    @unittest.skipIf(Image is None, "Pillow is not installed")
+    @mock.patch("image_processing.IMAGE_CACHE_PERCEPTUAL_HASH", True)
+    def test_different_dishes_do_not_collide(self):
+        hashes = {}
+        for name in os.listdir(DISHES_DIR):
+            with open(os.path.join(DISHES_DIR, name), "rb") as f:
+                hashes[name] = perceptual_hash(f.read())
+        for first, second in itertools.combinations(hashes, 2):
+            self.assertGreater(hamming_distance(hashes[first], hashes[second]), IMAGE_CACHE_PHASH_MAX_DISTANCE,
+                               f"{first} and {second} would share a cache entry")
+
+    def test_perceptual_matching_is_off_by_default(self):
+        with open(os.path.join(DISHES_DIR, "cheeseburger.jpeg"), "rb") as f:
+            self.assertIsNone(perceptual_hash(f.read()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import sys
+import os
+import re
+import json
+import time
+import asyncio
+import unittest
+from datetime import date
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from meal_plan_generation import validate_day_plan, generate_mealplan
+
+
+def make_day(name="Oatmeal", calories=350):
+    return {
+        "breakfast": [{
+            "dish_name": name,
+            "macronutrients": {"calories": calories, "protein": 10, "carbs": 60, "fats": 5},
+            "ingredients": [{"name": "oats", "portion_count": 1, "grams": 50}],
+            "health_score": 8
+        }]
+    }
+
+
+class FakeLLM:
+    """
+    Answers meal-plan prompts like LLMProvider.ask_async(json_response=True).
+
+    day_responses maps a day number to the responses of its successive calls;
+    None stands for an unparseable response. The whole-plan prompt gets plan_response.
+    """
+
+    def __init__(self, day_responses=None, plan_response=None, delay=0.05):
+        self.day_responses = {day: list(responses) for day, responses in (day_responses or {}).items()}
+        self.plan_response = plan_response
+        self.delay = delay
+        self.calls = []
+
+    async def ask_async(self, prompt, json_response=False, timeout=None):
+        await asyncio.sleep(self.delay)
+        match = re.search(r"meals for day (\d+) ", prompt)
+        if match is None:
+            self.calls.append("plan")
+            return {"response": self.plan_response, "raw_response": json.dumps(self.plan_response)}
+        day_number = int(match.group(1))
+        self.calls.append(day_number)
+        responses = self.day_responses.get(day_number) or [make_day(f"Day {day_number} dish")]
+        response = responses.pop(0) if len(responses) > 1 else responses[0]
+        return {"response": response, "raw_response": json.dumps(response)}
+
+
+class TestMealPlanGeneration(unittest.IsolatedAsyncioTestCase):
+    """Test per-day meal-plan generation, validation and retries"""
+
+    def test_validate_day_plan(self):
+        day = validate_day_plan({"day1": {**make_day(), "elevenses": [{}]}})
+        self.assertEqual(list(day), ["breakfast"])
+
+        day = make_day()
+        del day["breakfast"][0]["macronutrients"]["fats"]
+        day["breakfast"][0]["macronutrients"]["fat"] = "5"
+        self.assertEqual(validate_day_plan(day)["breakfast"][0]["macronutrients"]["fats"], 5.0)
+
+        for invalid in [None, [], {"breakfast": []}, {"lunch": "soup"}, {"lunch": [{"dish_name": "Soup"}]},
+                        {"lunch": [{**make_day()["breakfast"][0], "ingredients": None}]}]:
+            with self.assertRaises(ValueError):
+                validate_day_plan(invalid)
+
+    async def test_days_are_generated_concurrently(self):
+        llm = FakeLLM(delay=0.2)
+        start_time = time.perf_counter()
+        plan = await generate_mealplan(llm, "profile", date(2024, 3, 1), 5, mode="per_day")
+        elapsed = time.perf_counter() - start_time
+
+        self.assertEqual(list(plan), ["day1", "day2", "day3", "day4", "day5"])
+        self.assertEqual(plan["day3"]["breakfast"][0]["dish_name"], "Day 3 dish")
+        self.assertLess(elapsed, 0.6)  # One round of 0.2s calls, not five
+
+    async def test_only_failed_days_are_retried(self):
+        llm = FakeLLM({2: [None, {"breakfast": "oops"}, make_day("Fixed")]})
+        plan = await generate_mealplan(llm, "profile", date(2024, 3, 1), 3, mode="per_day", max_retries=2)
+
+        self.assertEqual(sorted(llm.calls), [1, 2, 2, 2, 3])
+        self.assertEqual(plan["day2"]["breakfast"][0]["dish_name"], "Fixed")
+
+    async def test_days_that_keep_failing_are_left_out(self):
+        llm = FakeLLM({2: [None]})
+        plan = await generate_mealplan(llm, "profile", date(2024, 3, 1), 3, mode="per_day", max_retries=1)
+        self.assertEqual(list(plan), ["day1", "day3"])
+
+        with self.assertRaises(ValueError):
+            await generate_mealplan(FakeLLM({1: [None]}), "profile", date(2024, 3, 1), 1, mode="per_day")
+
+    async def test_single_mode_repairs_invalid_days(self):
+        llm = FakeLLM(plan_response={"day1": make_day("From plan"), "day2": {"lunch": [{"dish_name": "Broken"}]}})
+        plan = await generate_mealplan(llm, "profile", date(2024, 3, 1), 3, mode="single")
+
+        self.assertEqual(llm.calls[0], "plan")
+        self.assertEqual(sorted(llm.calls[1:]), [2, 3])
+        self.assertEqual(plan["day1"]["breakfast"][0]["dish_name"], "From plan")
+        self.assertEqual(plan["day2"]["breakfast"][0]["dish_name"], "Day 2 dish")
+
+    async def test_only_requested_days_are_generated(self):
+        llm = FakeLLM()
+        plan = await generate_mealplan(llm, "profile", date(2024, 3, 1), 3, mode="single", day_numbers=[2])
+
+        self.assertEqual(llm.calls, [2])
+        self.assertEqual(list(plan), ["day2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
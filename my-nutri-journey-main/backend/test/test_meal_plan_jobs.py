@@ -0,0 +1,132 @@
+import sys
+import os
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from meal_plan_jobs import MealPlanJobQueue
+
+
+class FakeGenerator:
+    """Stands in for the meal-plan generation, blocking until released"""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.release = asyncio.Event()
+        self.error = error
+
+    async def __call__(self, user_id, start_date, num_days):
+        self.calls.append((user_id, start_date, num_days))
+        await self.release.wait()
+        if self.error:
+            raise self.error
+
+
+async def wait_for_status(queue, job_id, statuses=("done", "failed")):
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} is still {queue.get(job_id)['status']}")
+
+
+class TestMealPlanJobQueue(unittest.IsolatedAsyncioTestCase):
+    """Test the background meal-plan job queue"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+        self.db_path = os.path.join(self.tmp_dir, "jobs.db")
+
+    async def test_single_flight_per_user_and_range(self):
+        generator = FakeGenerator()
+        queue = MealPlanJobQueue(generator, db_path=None)
+        self.addAsyncCleanup(queue.stop)
+
+        job, created = await queue.submit(1, "2024-03-01", 3)
+        self.assertTrue(created)
+        self.assertEqual(job["end_date"], "2024-03-03")
+        duplicate, created = await queue.submit(1, "2024-03-01", 3)
+        self.assertFalse(created)
+        self.assertEqual(duplicate["id"], job["id"])
+
+        # Other users and ranges get their own jobs
+        self.assertTrue((await queue.submit(2, "2024-03-01", 3))[1])
+        self.assertTrue((await queue.submit(1, "2024-03-04", 3))[1])
+
+        generator.release.set()
+        self.assertEqual((await wait_for_status(queue, job["id"]))["status"], "done")
+        self.assertEqual(generator.calls.count((1, "2024-03-01", 3)), 1)
+
+        # Once finished, the range can be generated again
+        self.assertTrue((await queue.submit(1, "2024-03-01", 3))[1])
+        self.assertEqual(queue.stats()["deduplicated"], 1)
+
+    async def test_failed_job_reports_error(self):
+        generator = FakeGenerator(error=ValueError("User profile is incomplete"))
+        generator.release.set()
+        queue = MealPlanJobQueue(generator, db_path=None)
+        self.addAsyncCleanup(queue.stop)
+
+        job, _ = await queue.submit(1, "2024-03-01", 3)
+        job = await wait_for_status(queue, job["id"])
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["error"], "User profile is incomplete")
+        self.assertIsNone(queue.get("unknown"))
+
+        # Within the cooldown the failed job is returned instead of generating again
+        failed, created = await queue.submit(1, "2024-03-01", 3)
+        self.assertFalse(created)
+        self.assertEqual(failed["id"], job["id"])
+        self.assertEqual(len(generator.calls), 1)
+        self.assertEqual(queue.stats()["cooled_down"], 1)
+
+        queue.failure_cooldown = 0
+        self.assertTrue((await queue.submit(1, "2024-03-01", 3))[1])
+
+    async def test_persisted_failure_cooldown_is_shared(self):
+        generator = FakeGenerator(error=ValueError("LLM request failed"))
+        generator.release.set()
+        first = MealPlanJobQueue(generator, db_path=self.db_path)
+        self.addAsyncCleanup(first.stop)
+        job, _ = await first.submit(1, "2024-03-01", 3)
+        await wait_for_status(first, job["id"])
+
+        # Another process returns the failed job too
+        second = MealPlanJobQueue(FakeGenerator(), db_path=self.db_path)
+        self.addAsyncCleanup(second.stop)
+        failed, created = await second.submit(1, "2024-03-01", 3)
+        self.assertFalse(created)
+        self.assertEqual((failed["id"], failed["error"]), (job["id"], "LLM request failed"))
+
+    async def test_persisted_jobs_are_shared_and_resumed(self):
+        generator = FakeGenerator()
+        first = MealPlanJobQueue(generator, db_path=self.db_path)
+        job, _ = await first.submit(1, "2024-03-01", 3)
+        await asyncio.sleep(0.01)
+        self.assertEqual(first.get(job["id"])["status"], "running")
+
+        # Another process sees the job and joins it instead of starting a second one
+        second = MealPlanJobQueue(FakeGenerator(), db_path=self.db_path)
+        self.assertEqual(second.get(job["id"])["status"], "running")
+        self.assertEqual((await second.submit(1, "2024-03-01", 3))[0]["id"], job["id"])
+        await second.stop()
+
+        # After a restart the interrupted job runs again
+        await first.stop()
+        resumed_generator = FakeGenerator()
+        resumed_generator.release.set()
+        resumed = MealPlanJobQueue(resumed_generator, db_path=self.db_path)
+        self.addAsyncCleanup(resumed.stop)
+        await resumed.start()
+        self.assertEqual((await wait_for_status(resumed, job["id"]))["status"], "done")
+        self.assertEqual(resumed_generator.calls, [(1, "2024-03-01", 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()
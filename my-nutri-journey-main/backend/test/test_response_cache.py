@@ -0,0 +1,63 @@
+import sys
+import os
+import time
+import unittest
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import ResponseCache, make_etag, etag_matches
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test the per-user response cache behind /api/analytics and /api/meals"""
+
+    def setUp(self):
+        self.cache = ResponseCache(max_entries=3, ttl=60)
+
+    def test_set_and_get(self):
+        self.assertIsNone(self.cache.get(1, ("meals", "2024-03-01")))
+        etag, body = self.cache.set(1, ("meals", "2024-03-01"), b"[]", self.cache.version(1))
+        self.assertEqual(etag, make_etag(b"[]"))
+        self.assertEqual(self.cache.get(1, ("meals", "2024-03-01")), (etag, body))
+        self.assertIsNone(self.cache.get(2, ("meals", "2024-03-01")))
+
+    def test_invalidate_drops_only_that_user(self):
+        self.cache.set(1, "analytics", b"{}", self.cache.version(1))
+        self.cache.set(2, "analytics", b"{}", self.cache.version(2))
+        self.cache.invalidate(1)
+        self.assertIsNone(self.cache.get(1, "analytics"))
+        self.assertIsNotNone(self.cache.get(2, "analytics"))
+
+    def test_response_computed_during_a_write_is_not_stored(self):
+        version = self.cache.version(1)
+        self.cache.invalidate(1)  # A meal is logged while the response is computed
+        self.cache.set(1, "analytics", b"{}", version)
+        self.assertIsNone(self.cache.get(1, "analytics"))
+
+    def test_expired_entries_are_recomputed(self):
+        cache = ResponseCache(max_entries=3, ttl=0.01)
+        cache.set(1, "analytics", b"{}", cache.version(1))
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(1, "analytics"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for key in ["a", "b", "c"]:
+            self.cache.set(1, key, key.encode(), self.cache.version(1))
+        self.cache.get(1, "a")
+        self.cache.set(1, "d", b"d", self.cache.version(1))
+        self.assertIsNone(self.cache.get(1, "b"))
+        self.assertIsNotNone(self.cache.get(1, "a"))
+        self.assertEqual(self.cache.stats()["entries"], 3)
+
+    def test_etag_matches(self):
+        etag = make_etag(b"{}")
+        self.assertTrue(etag_matches(etag, etag))
+        self.assertTrue(etag_matches(f'"other", {etag}', etag))
+        self.assertTrue(etag_matches("*", etag))
+        self.assertFalse(etag_matches(None, etag))
+        self.assertFalse(etag_matches('"other"', etag))
+
+
+if __name__ == "__main__":
+    unittest.main()
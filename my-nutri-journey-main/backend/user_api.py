@@ -1,33 +1,56 @@
 from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from fastapi.encoders import jsonable_encoder
 from datetime import date, datetime, timedelta
+from contextlib import asynccontextmanager
+import asyncio
 import os
 import json
 import bcrypt
 from prompts import get_chatbot_prompt, get_macro_targets_prompt
-from llm_provider import LLMProvider
+from llm_provider import get_llm_provider, get_llm_executor_stats, get_image_cache_stats
 from settings import (OPENAI_MODEL, LLM_PROVIDER, OPENAI_KEY, OPENAI_MODEL_2,
-                     TEMP_UPLOAD_DIR, NUM_RECOMMENDATION_DAYS, BUCKET_NAME)
-import shutil
-from food_analysis import dish_analysis, compute_health_score
-import time
-from fastapi.staticfiles import StaticFiles
-from db_service import get_db_service
+                     NUM_RECOMMENDATION_DAYS, MEALPLAN_PREFETCH_DAYS, BUCKET_NAME, BATCH_ANALYSIS_CONCURRENCY,
+                     BATCH_ANALYSIS_MAX_FILES, MEAL_LOG_BATCH_MAX_SIZE, ANALYTICS_DAY_PAGE_SIZE)
+from food_analysis import dish_analysis_async, compute_health_score
+from image_processing import image_content_hash
 import time
 import uuid
-from collections import Counter
-from pydantic_models import UserProfile, ChatRequest, RecommendedMealsRequest, MealLogRequest
+from fastapi.staticfiles import StaticFiles
+from db_service import get_db_service, ANALYTICS_MEAL_COLUMNS
+import analytics
+from response_cache import response_cache, etag_matches
+from meal_plan_jobs import MealPlanJobQueue
+from meal_plan_generation import generate_mealplan, day_key
+from chat_context import ChatContextManager, ConversationCache
+from typing import List, Optional
+from pydantic_models import (UserProfile, ChatRequest, ConversationCreateRequest, RecommendedMealsRequest,
+                             MealLogRequest, MealLogBatchRequest)
 
 # Initialize database service
 db_service = get_db_service()
 
-app = FastAPI()
+# Token-bounded chat history with cached rolling summaries, per conversation
+chat_context = ChatContextManager(OPENAI_MODEL_2)
+# Messages of stored conversations, so each chatbot turn only reads the new ones
+conversation_cache = ConversationCache()
+
+@asynccontextmanager
+async def lifespan(app):
+    # Start the meal-plan workers, re-queueing jobs a restart interrupted
+    await mealplan_jobs.start()
+    yield
+    await mealplan_jobs.stop()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 def compute_age(birthdate_str):
@@ -101,7 +124,7 @@ def create_user(profile: UserProfile):
     user_profile_summary = generate_user_profile(user_dict)
     
     # Generate macro targets
-    llm = LLMProvider(provider=LLM_PROVIDER, model=OPENAI_MODEL_2, openai_api_key=OPENAI_KEY)
+    llm = get_llm_provider(provider=LLM_PROVIDER, model=OPENAI_MODEL_2, openai_api_key=OPENAI_KEY)
     macro_prompt = get_macro_targets_prompt().format(full_profile=user_profile_summary)
     macro_result = llm.ask(macro_prompt)
     macro_json = macro_result.get("response")
@@ -165,7 +188,7 @@ def update_user(user_id: int, profile: UserProfile):
     if existing_profile_summary != user_profile_summary:
         print("Profile changed, recalculating macros")
         # Generate macro targets
-        llm = LLMProvider(provider=LLM_PROVIDER, model=OPENAI_MODEL_2, openai_api_key=OPENAI_KEY)
+        llm = get_llm_provider(provider=LLM_PROVIDER, model=OPENAI_MODEL_2, openai_api_key=OPENAI_KEY)
         macro_prompt = get_macro_targets_prompt().format(full_profile=user_profile_summary)
         macro_result = llm.ask(macro_prompt)
         macro_json = macro_result.get("response")
@@ -273,11 +296,53 @@ def signup(data: dict):
     
     return {"success": True}
 
-@app.post("/api/chatbot")
-def chatbot_endpoint(req: ChatRequest):
+def uses_stored_conversation(req: ChatRequest) -> bool:
+    """Whether a chatbot request continues a stored conversation instead of sending its chat_history"""
+    return bool(req.conversation_id) and not req.chat_history
+
+async def load_conversation_messages(conversation_id: str, user_id: int):
+    """
+    Get a stored conversation's messages, oldest first, reading only the ones appended
+    since they were last cached. Raises 404 if the conversation is not the user's.
+    """
+    cached = conversation_cache.get(conversation_id)
+    if cached is not None:
+        conversation, messages = cached
+    else:
+        try:
+            conversation = await run_in_threadpool(db_service.get_conversation, conversation_id)
+        except Exception as e:
+            print(f"Error fetching conversation {conversation_id}: {e}")
+            conversation = None
+        messages = []
+    if conversation is None or conversation["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    after_id = messages[-1]["id"] if messages else 0
+    new_messages = await run_in_threadpool(db_service.get_conversation_messages, conversation_id, after_id)
+    return conversation_cache.extend(conversation, new_messages)
+
+async def store_chat_turn(req: ChatRequest, reply: str):
+    """Append the question and its reply to the request's stored conversation, if it has one"""
+    if not uses_stored_conversation(req) or not reply:
+        return
+    try:
+        await run_in_threadpool(db_service.append_conversation_messages, req.conversation_id, [
+            {"type": "user", "message": req.message},
+            {"type": "bot", "message": reply}
+        ])
+    except Exception as e:
+        # The reply is still returned; only the stored history misses this turn
+        print(f"Error storing chat turn of conversation {req.conversation_id}: {e}")
+
+async def build_chatbot_prompt(req: ChatRequest, llm):
+    """
+    Format the chatbot prompt from the user's profile, the conversation and the question.
+    Older messages come as a rolling summary, see ChatContextManager.
+    """
     # Get user from database service instead of direct SQLite connection
     try:
-        user = db_service.get_user(req.user_id)
+        user = await run_in_threadpool(db_service.get_user, req.user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
     except Exception as e:
@@ -286,23 +351,38 @@ def chatbot_endpoint(req: ChatRequest):
     # Get user profile from user object
     user_profile = user.get("userProfile", "")
     
-    # Format chat history as a string
-    chat_history_str = ""
-    for msg in req.chat_history or []:
-        role = "User" if msg.get("type") == "user" else "Bot"
-        chat_history_str += f"{role}: {msg.get('message')}\n"
+    # Recent messages verbatim, older ones summarized, within the token budget
+    if uses_stored_conversation(req):
+        messages = await load_conversation_messages(req.conversation_id, req.user_id)
+        summary, chat_history_str = await chat_context.build(
+            llm, ("conversation", req.conversation_id), messages, append_only=True
+        )
+    else:
+        summary, chat_history_str = await chat_context.build(
+            llm, (req.user_id, req.conversation_id), req.chat_history
+        )
     
     # Format the prompt using the template
     prompt_template = get_chatbot_prompt()
-    prompt = prompt_template.format(
+    return prompt_template.format(
         full_profile=user_profile,
+        conversation_summary=summary or "None",
         chat_history=chat_history_str,
         question=req.message
     )
-    
+
+@app.post("/api/chatbot")
+async def chatbot_endpoint(req: ChatRequest):
+    """
+    Answer a chatbot message. With a conversation_id from /api/conversations and no
+    chat_history, the history comes from the stored conversation and the new turn is
+    appended to it; otherwise the client sends the whole chat_history.
+    """
     # Use LLM provider to get response
-    llm = LLMProvider(provider=LLM_PROVIDER, model=OPENAI_MODEL_2, openai_api_key=OPENAI_KEY)
-    result = llm.ask(prompt)  # Returns dict with 'response' and 'tokens'
+    llm = get_llm_provider(provider=LLM_PROVIDER, model=OPENAI_MODEL_2, openai_api_key=OPENAI_KEY)
+    prompt = await build_chatbot_prompt(req, llm)
+    result = await llm.ask_async(prompt)  # Returns dict with 'response' and 'tokens'
+    await store_chat_turn(req, result.get("response"))
     
     # Log token usage
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -310,8 +390,81 @@ def chatbot_endpoint(req: ChatRequest):
     
     return {"response": result.get("response"), "tokens": result.get("tokens")}
 
-@app.post("/api/log-meal")
-def log_meal(data: MealLogRequest):
+@app.post("/api/conversations")
+async def create_conversation(req: ConversationCreateRequest):
+    """Start a stored chatbot conversation; pass its id as conversation_id to /api/chatbot"""
+    try:
+        await run_in_threadpool(db_service.get_user, req.user_id)
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"User not found: {str(e)}")
+    return await run_in_threadpool(db_service.create_conversation, req.user_id)
+
+@app.get("/api/conversations/{conversation_id}/messages")
+async def get_conversation_messages(conversation_id: str, user_id: int = Query(...), after_id: int = Query(0)):
+    """Messages of a stored conversation with an id above after_id, oldest first"""
+    messages = await load_conversation_messages(conversation_id, user_id)
+    return {
+        "conversation_id": conversation_id,
+        "messages": [message for message in messages if message["id"] > after_id]
+    }
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/chatbot/stream")
+async def chatbot_stream_endpoint(req: ChatRequest):
+    """
+    Streaming variant of /api/chatbot over Server-Sent Events.
+
+    "token" events carry {"content": ...}, the pieces of the answer as they are
+    generated. The stream ends with a "done" event carrying {"tokens", "ttft_ms"},
+    or with an "error" event carrying {"error"}.
+    """
+    llm = get_llm_provider(provider=LLM_PROVIDER, model=OPENAI_MODEL_2, openai_api_key=OPENAI_KEY)
+    prompt = await build_chatbot_prompt(req, llm)
+
+    async def stream_events():
+        streamed, tokens, ttft, status = [], None, None, "cancelled"
+        try:
+            async for event in llm.astream(prompt):
+                if event["type"] == "token":
+                    streamed.append(event["content"])
+                    yield sse_event("token", {"content": event["content"]})
+                elif event["type"] == "done":
+                    tokens, ttft, status = event["tokens"], event["ttft"], "done"
+                    await store_chat_turn(req, event["response"])
+                    ttft_ms = round(ttft * 1000) if ttft is not None else None
+                    yield sse_event("done", {"tokens": tokens, "ttft_ms": ttft_ms})
+                else:
+                    status = "error"
+                    yield sse_event("error", {"error": event["error"]})
+        finally:
+            # Log token usage however the stream ended, estimating it if the model did not report it
+            if tokens is None:
+                tokens = (len(prompt) + len("".join(streamed))) // 4
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            ttft_str = f"{ttft:.2f}s" if ttft is not None else "n/a"
+            print(f"[{now}] User {req.user_id} | Tokens used: {tokens} | First token: {ttft_str} | Stream {status}")
+
+    return StreamingResponse(stream_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/llm/stats")
+def llm_stats():
+    """
+    Runtime counters for the LLM layer.
+    """
+    return {
+        "executor": get_llm_executor_stats(),
+        "image_cache": get_image_cache_stats(),
+        "meal_plan_jobs": mealplan_jobs.stats(),
+        "chat_context": chat_context.stats(),
+        "conversation_cache": conversation_cache.stats()
+    }
+
+def build_meal_record(data: MealLogRequest):
+    """Validate a logged meal and turn it into a meals row"""
     if not (data.user_id and data.meal_type and data.meal_json and data.uploaded_at):
         raise HTTPException(status_code=400, detail="Missing required fields")
     
@@ -325,93 +478,129 @@ def log_meal(data: MealLogRequest):
         # Extract date part from uploaded_at
         consumed_date = data.uploaded_at.split("T")[0]
     
-    meal_data = {
+    return {
         "user_id": data.user_id,
         "meal_type": data.meal_type,
         "meal_json": data.meal_json,
         "uploaded_at": data.uploaded_at,
         "consumed_date": consumed_date  # Add consumed_date to database
     }
+
+@app.post("/api/log-meal")
+def log_meal(data: MealLogRequest):
+    meal_data = build_meal_record(data)
     
     db_service.insert_meal(meal_data)
+    response_cache.invalidate(data.user_id)
     
     return {"success": True}
 
-@app.post("/api/analyze-meal-image")
-async def analyze_meal_image(
-    file: UploadFile = File(...),
-    user_id: int = Form(None),
-):
-    # Generate a unique filename to avoid collisions
-    timestamp = int(time.time())
-    unique_id = uuid.uuid4().hex[:8]
-    
-    # Save uploaded file to a temporary path first
-    temp_ext = os.path.splitext(file.filename)[-1] or ".jpg"
-    temp_path = os.path.join(TEMP_UPLOAD_DIR, f"meal_{timestamp}_{unique_id}{temp_ext}")
-    
-    # Save the file locally for analysis
-    with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Analyze the image using your existing function
-    result = dish_analysis(temp_path)
-    if result is None:
-        # Clean up the temp file if it exists
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        # Return an error response that the frontend can handle
-        return JSONResponse(
-            status_code=422,
-            content={
-                "success": False,
-                "error": "No dish recognized",
-                "message": "The system couldn't recognize any food in this image. Please try another image or enter meal details manually."
-            }
-        )
+@app.post("/api/log-meals")
+def log_meals(data: MealLogBatchRequest):
+    """
+    Log many meals in one request, e.g. when an offline client syncs or data is imported.
+    The meals are written with a single bulk insert; if any meal is invalid nothing is logged.
+    """
+    if not data.meals:
+        raise HTTPException(status_code=400, detail="No meals provided")
+    if len(data.meals) > MEAL_LOG_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MEAL_LOG_BATCH_MAX_SIZE} meals per request")
     
-    # Remove ingredients with error or not found
-    filtered_ingredients = [
-        ing for ing in result.get("ingredients", [])
-        if not ing.get("error")
-    ]
-    result["ingredients"] = filtered_ingredients
-
-    # Use analyzed dish name for saving, all lowercase
-    dish_name = result.get("dish_name", "meal").replace(" ", "_").lower()
+    meals_data = []
+    for index, meal in enumerate(data.meals):
+        try:
+            meals_data.append(build_meal_record(meal))
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"Meal {index}: {e.detail}")
     
-    # Create a Supabase-friendly filename
-    save_name = f"meals/{user_id}/log_{dish_name}_{timestamp}_{unique_id}{temp_ext}"
+    inserted = db_service.insert_meals_bulk(meals_data)
+    for user_id in {meal["user_id"] for meal in meals_data}:
+        response_cache.invalidate(user_id)
     
-    # Upload to Supabase Storage
+    return {"success": True, "count": len(inserted), "ids": [meal["id"] for meal in inserted]}
+
+def upload_meal_image(path, image_bytes, content_type):
+    """
+    Upload a meal image to storage.
+    Returns the public URL, or None if storage is unavailable or the upload failed.
+    """
     try:
-        # Read the file content
-        with open(temp_path, "rb") as f:
-            file_content = f.read()
-        
-        # Use the database service to determine which storage method to use
-        if hasattr(db_service, "supabase"):
-            # Using Supabase
-            print(f"Uploading image to Supabase bucket: {BUCKET_NAME}/{save_name}")
-            # Get storage reference
-            storage = db_service.supabase.storage.from_(BUCKET_NAME)
-            # Upload file
-            response = storage.upload(
-                path=save_name,
-                file=file_content,
-                file_options={"content-type": f"image/{temp_ext.lstrip('.')}"}
-            )
-            
-            # Generate the public URL
-            image_url = storage.get_public_url(save_name)
-            result["img_path"] = image_url
-            print(f"Image uploaded to Supabase: {image_url}")
+        print(f"Uploading image to storage: {BUCKET_NAME}/{path}")
+        image_url = db_service.upload_image(path, image_bytes, content_type)
+        if image_url:
+            print(f"Image uploaded: {image_url}")
+        return image_url
     except Exception as e:
         print(f"Error uploading image: {e}")
+        return None
+
+def delete_meal_image(path):
+    """Delete a meal image from storage, logging instead of raising on failure"""
+    try:
+        if db_service.delete_image(path):
+            print(f"Deleted unused image: {BUCKET_NAME}/{path}")
+    except Exception as e:
+        print(f"Error deleting image {path}: {e}")
+
+async def discard_meal_image_upload(upload_task, image_key):
+    """
+    Wait for the upload of an image whose analysis failed, then delete it.
+    Cancelling the task would not stop the upload already running in the threadpool.
+    """
+    image_url = await asyncio.shield(upload_task)
+    if image_url:
+        # The key is unique to this request, so no meal can reference the object
+        await run_in_threadpool(delete_meal_image, image_key)
+
+async def analyze_image_bytes(image_bytes, filename, content_type, user_id):
+    """
+    Analyze one meal image already read into memory and upload it to storage.
+
+    Returns:
+        Tuple of (HTTP status code, response content)
+    """
+    file_ext = os.path.splitext(filename or "")[-1] or ".jpg"
+    content_type = content_type or f"image/{file_ext.lstrip('.')}"
+    if not content_type.startswith("image/"):
+        content_type = "image/jpeg"
+
+    # Upload while the LLM analyzes the image, so the storage path does not wait for
+    # the dish name. The key is unique per request, never shared with another meal
+    image_key = f"meals/{user_id}/meal_{int(time.time())}_{uuid.uuid4().hex[:8]}{file_ext}"
+    upload_task = asyncio.create_task(
+        run_in_threadpool(upload_meal_image, image_key, image_bytes, content_type)
+    )
+
+    upload_consumed = False
+    try:
+        # Analyze the image using your existing function
+        result = await dish_analysis_async(image_bytes=image_bytes, mime_type=content_type)
+        if result is None:
+            # Return an error response that the frontend can handle
+            return 422, {
+                "success": False,
+                "error": "No dish recognized",
+                "message": "The system couldn't recognize any food in this image. Please try another image or enter meal details manually."
+            }
+        
+        # Remove ingredients with error or not found
+        filtered_ingredients = [
+            ing for ing in result.get("ingredients", [])
+            if not ing.get("error")
+        ]
+        result["ingredients"] = filtered_ingredients
+
+        # Attach the uploaded image; the dish name is kept alongside it in meal_json
+        # Shielded, so a cancelled request does not cancel the upload before it can be cleaned up
+        image_url = await asyncio.shield(upload_task)
+        upload_consumed = True
+        if image_url:
+            result["img_path"] = image_url
+            result["image_key"] = image_key
     finally:
-        # Clean up the temp file if it still exists
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        # Unrecognized images, errors and cancellations leave no object in storage
+        if not upload_consumed:
+            await discard_meal_image_upload(upload_task, image_key)
 
     # Create a structured meal_json similar to recommended meals
     meal_json = {
@@ -439,73 +628,161 @@ async def analyze_meal_image(
     
     print(f"Meal analyzed with health score: {meal_json['health_score']}")
 
-    return JSONResponse(content=result)
+    return 200, result
 
-@app.get("/api/meals")
-def get_meals(user_id: int = Query(...), date: str = Query(...)):
+@app.post("/api/analyze-meal-image")
+async def analyze_meal_image(
+    file: UploadFile = File(...),
+    user_id: int = Form(None),
+):
+    # Read the upload once; the same bytes are hashed, encoded for the LLM and uploaded
+    image_bytes = await file.read()
+    status_code, content = await analyze_image_bytes(image_bytes, file.filename, file.content_type, user_id)
+    return JSONResponse(status_code=status_code, content=content)
+
+@app.post("/api/analyze-meal-images")
+async def analyze_meal_images(
+    files: List[UploadFile] = File(...),
+    user_id: int = Form(None),
+):
     """
-    Get all meals for a user on a specific date (YYYY-MM-DD).
+    Analyze several meal images in one request.
+
+    Identical images are analyzed once. Analyses run concurrently (at most
+    BATCH_ANALYSIS_CONCURRENCY at a time) and results are streamed back as
+    NDJSON, one line per uploaded file, in the order they finish:
+    {"index": ..., "filename": ..., "status": ..., "result": {...}}
     """
-    # First try to get meals by consumed_date
-    meals_data = db_service.get_meals_by_date(user_id, date)
-    
-    # Also get meals where consumed_date is missing but uploaded_at matches the date
-    # This requires modifying the database service to handle this case
-    if hasattr(db_service, "get_meals_by_upload_date"):
-        # If your service has a specialized method
-        additional_meals = db_service.get_meals_by_upload_date(user_id, date)
-        meals_data.extend(additional_meals)
-    else:
-        # General fallback approach
-        all_meals = db_service.get_all_meals_for_user(user_id)
-        for meal in all_meals:
-            # If meal has no consumed_date but uploaded_at matches the requested date
-            if (not meal.get("consumed_date") and 
-                meal.get("uploaded_at") and 
-                meal.get("uploaded_at").startswith(date)):
-                meals_data.append(meal)
+    if len(files) > BATCH_ANALYSIS_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_ANALYSIS_MAX_FILES} images per batch")
+
+    # Deduplicate by content so repeated photos cost a single analysis
+    uploads = {}
+    for index, file in enumerate(files):
+        image_bytes = await file.read()
+        content_hash = image_content_hash(image_bytes)
+        if content_hash not in uploads:
+            uploads[content_hash] = {"image_bytes": image_bytes, "file": file, "targets": []}
+        uploads[content_hash]["targets"].append((index, file.filename))
+
+    semaphore = asyncio.Semaphore(BATCH_ANALYSIS_CONCURRENCY)
+
+    async def analyze(content_hash, upload):
+        async with semaphore:
+            try:
+                status_code, content = await analyze_image_bytes(
+                    upload["image_bytes"], upload["file"].filename, upload["file"].content_type, user_id
+                )
+            except Exception as e:
+                print(f"Error analyzing image {upload['file'].filename}: {e}")
+                status_code, content = 500, {"success": False, "error": str(e)}
+        return content_hash, status_code, content
+
+    async def stream_results():
+        tasks = [asyncio.create_task(analyze(h, upload)) for h, upload in uploads.items()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                content_hash, status_code, content = await finished
+                for index, filename in uploads[content_hash]["targets"]:
+                    line = {"index": index, "filename": filename, "status": status_code, "result": content}
+                    yield json.dumps(line) + "\n"
+        finally:
+            # Stop remaining analyses if the client goes away
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+def cached_json_response(request: Request, user_id: int, key, compute):
+    """
+    Serve a per-user JSON response from response_cache with a strong ETag.
+
+    compute() only runs on a cache miss. A request whose If-None-Match matches
+    gets an empty 304 Not Modified.
+    """
+    cached = response_cache.get(user_id, key)
+    if cached is None:
+        version = response_cache.version(user_id)
+        body = json.dumps(jsonable_encoder(compute()), separators=(",", ":")).encode("utf-8")
+        cached = response_cache.set(user_id, key, body, version)
+    etag, body = cached
+    
+    # no-cache lets browsers keep the body but revalidate it with If-None-Match
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def load_meals_for_day(user_id: int, date: str, limit: Optional[int] = None, offset: int = 0):
+    """
+    Get the meals for a user on a specific date (YYYY-MM-DD), all of them or limit
+    meals from offset, with consumed_date and health_score filled in.
+    """
+    # Meals consumed that day, plus meals without a consumed_date uploaded that day
+    meals_data = db_service.get_meals_for_day(user_id, date, limit=limit, offset=offset)
     
     meals = []
     for meal in meals_data:
         meal_dict = dict(meal)
+        meal_json = meal_dict.get("meal_json") or {}
         
-        # Set consumed_date to uploaded_at date if missing
+        # Set consumed_date to uploaded_at date if missing (meals logged before the backfill)
         if not meal_dict.get("consumed_date") and meal_dict.get("uploaded_at"):
-            meal_dict["consumed_date"] = meal_dict["uploaded_at"].split("T")[0]
+            meal_dict["consumed_date"] = str(meal_dict["uploaded_at"])[:10]
         
-        # Include health score
-        if "health_score" in meal_dict and meal_dict["health_score"]:
+        # Include health score, preferring the one stored when the meal was logged
+        if meal_dict.get("health_score"):
             pass  # Keep the existing health score
-        elif "macronutrients" in meal_dict.get("meal_json", {}):
-            meal_dict["health_score"] = compute_health_score(meal_dict["meal_json"])
+        elif meal_json.get("health_score"):
+            meal_dict["health_score"] = meal_json["health_score"]
+        elif "macronutrients" in meal_json:
+            meal_dict["health_score"] = compute_health_score(meal_json)
             
         meals.append(meal_dict)
         
     return meals
 
+@app.get("/api/meals")
+def get_meals(request: Request, user_id: int = Query(...), date: str = Query(...)):
+    """
+    Get all meals for a user on a specific date (YYYY-MM-DD).
+    """
+    return cached_json_response(request, user_id, ("meals", date), lambda: load_meals_for_day(user_id, date))
+
+@app.get("/api/analytics/day")
+def get_analytics_day(request: Request, user_id: int = Query(...), date: str = Query(...),
+                      limit: int = Query(ANALYTICS_DAY_PAGE_SIZE, ge=1, le=100), offset: int = Query(0, ge=0)):
+    """
+    Get one page of a day's meals, for analytics fetched with include_meals=false.
+    next_offset is None on the last page.
+    """
+    def compute():
+        # One meal past the page tells whether another page follows
+        meals = load_meals_for_day(user_id, date, limit=limit + 1, offset=offset)
+        return {
+            "date": date,
+            "meals": meals[:limit],
+            "next_offset": offset + limit if len(meals) > limit else None
+        }
+    
+    return cached_json_response(request, user_id, ("analytics_day", date, limit, offset), compute)
+
 @app.get("/api/analytics")
-def get_analytics(user_id: int = Query(...), timeframe: str = Query("week")):
+def get_analytics(request: Request, user_id: int = Query(...), timeframe: str = Query("week"),
+                  include_meals: bool = Query(True)):
     """
     Get analytics data for a user based on the specified timeframe.
     Timeframes: 'week', 'month', 'quarter', 'overall'
+    With include_meals=false, daily_stats carry aggregates only and a day's meals
+    are fetched on demand from /api/analytics/day.
     """
-    # Helper functions for extracting meal data
-    def get_meal_calories(meal):
-        return meal.get("meal_json", {}).get("macronutrients", {}).get("calories", 0)
-        
-    def get_meal_protein(meal):
-        return meal.get("meal_json", {}).get("macronutrients", {}).get("protein", 0)
-        
-    def get_meal_carbs(meal):
-        return meal.get("meal_json", {}).get("macronutrients", {}).get("carbs", 0)
-        
-    def get_meal_fats(meal):
-        macros = meal.get("meal_json", {}).get("macronutrients", {})
-        return macros.get("fats", macros.get("fat", 0))
-        
-    def get_meal_health_score(meal):
-        return meal.get("meal_json", {}).get("health_score", 0)
-    
+    # Ranges end today, so a cached response is only valid for the day it was computed
+    key = ("analytics", timeframe, include_meals, date.today().isoformat())
+    return cached_json_response(request, user_id, key,
+                                lambda: compute_analytics(user_id, timeframe, include_meals))
+
+def compute_analytics(user_id: int, timeframe: str, include_meals: bool):
+    """Build the /api/analytics response"""
     # Calculate date range based on timeframe
     today = datetime.now().date()
     
@@ -519,30 +796,14 @@ def get_analytics(user_id: int = Query(...), timeframe: str = Query("week")):
         start_date = today - timedelta(days=89)  # Last 90 days including today
         date_format = "%b %d"  # Month abbr + day
     elif timeframe == "overall":
-        # For overall, get all meals and find the earliest date
-        all_meals = db_service.get_meals_by_timeframe(user_id, "0001-01-01")
+        # For overall, start at the user's earliest meal
+        earliest_date = db_service.get_earliest_meal_date(user_id)
         
-        if all_meals:
-            earliest_dates = []
-            for meal in all_meals:
-                try:
-                    if meal.get("consumed_date"):
-                        earliest_dates.append(datetime.strptime(meal["consumed_date"], "%Y-%m-%d").date())
-                    elif meal.get("uploaded_at"):
-                        if "T" in meal["uploaded_at"]:
-                            earliest_dates.append(datetime.fromisoformat(meal["uploaded_at"].replace("Z", "")).date())
-                        else:
-                            earliest_dates.append(datetime.strptime(meal["uploaded_at"], "%Y-%m-%d").date())
-                except:
-                    continue
-            
-            if earliest_dates:
-                start_date = min(earliest_dates)
-                print(f"Found earliest meal date: {start_date}")
-            else:
-                start_date = today - timedelta(days=29)  # Default to 30 days if no valid dates
-        else:
-            start_date = today - timedelta(days=29)  # Default to 30 days if no meals
+        try:
+            start_date = date.fromisoformat(earliest_date)
+            print(f"Found earliest meal date: {start_date}")
+        except (TypeError, ValueError):
+            start_date = today - timedelta(days=29)  # Default to 30 days if no meals with a valid date
             
         date_format = "%b %d"  # Month abbr + day
     else:
@@ -551,189 +812,48 @@ def get_analytics(user_id: int = Query(...), timeframe: str = Query("week")):
     
     # Format for query
     start_date_str = start_date.strftime("%Y-%m-%d")
-    print(f"Analytics date range: {start_date_str} to {today.strftime('%Y-%m-%d')}")
+    today_str = today.strftime("%Y-%m-%d")
+    print(f"Analytics date range: {start_date_str} to {today_str}")
+    
+    # Per-day nutrition totals, one row per day with meals
+    daily = analytics.daily_frame_from_rollups(db_service.get_daily_rollups(user_id, start_date_str, today_str))
     
-    # Get all meals in the time range
-    meals = db_service.get_meals_by_timeframe(user_id, start_date_str)
+    if include_meals:
+        # Get all meals in the time range
+        meals = db_service.get_meals_by_timeframe(user_id, start_date_str, columns=ANALYTICS_MEAL_COLUMNS)
+    else:
+        # Frequent foods only need the ingredients
+        meals = db_service.get_meal_ingredients_by_timeframe(user_id, start_date_str)
     print(f"Retrieved {len(meals)} meals for user {user_id}")
     
-    # Group meals by date
-    meals_by_date = {}
-    for meal in meals:
-        # Extract date from various possible sources
-        meal_date = None
-        
-        # Try consumed_date first
-        if meal.get("consumed_date"):
-            try:
-                meal_date = datetime.strptime(meal["consumed_date"], "%Y-%m-%d").date()
-            except:
-                pass
-        
-        # Try uploaded_at if consumed_date not available or invalid
-        if not meal_date and meal.get("uploaded_at"):
-            try:
-                if "T" in meal["uploaded_at"]:
-                    meal_date = datetime.fromisoformat(meal["uploaded_at"].replace("Z", "")).date()
-                else:
-                    meal_date = datetime.strptime(meal["uploaded_at"], "%Y-%m-%d").date()
-            except:
-                pass
-        
-        # Skip meals with no valid date
-        if not meal_date:
-            continue
-            
-        meal_date_str = meal_date.strftime("%Y-%m-%d")
-        
-        # Skip meals outside our timeframe
-        if meal_date < start_date or meal_date > today:
-            continue
-        
-        if meal_date_str not in meals_by_date:
-            meals_by_date[meal_date_str] = []
-            
-        meals_by_date[meal_date_str].append(meal)
+    # Group meals by date, skipping meals outside our timeframe or without a valid date
+    meals_by_date = analytics.group_meals_by_date(meals, start_date, today)
+    in_range_meals = [meal for day_meals in meals_by_date.values() for meal in day_meals]
     
     # Generate daily stats for the chart - include ALL dates in the range
-    daily_stats = []
-    
-    # Create a date range to ensure all dates are included (even those without meals)
-    current_date = start_date
-    while current_date <= today:
-        date_str = current_date.strftime("%Y-%m-%d")
-        display_date = current_date.strftime(date_format)
-        
-        day_meals = meals_by_date.get(date_str, [])
-        
-        # Calculate daily totals
-        daily_calories = sum(get_meal_calories(meal) for meal in day_meals)
-        daily_protein = sum(get_meal_protein(meal) for meal in day_meals)
-        daily_carbs = sum(get_meal_carbs(meal) for meal in day_meals)
-        daily_fats = sum(get_meal_fats(meal) for meal in day_meals)
-        
-        # Calculate average health score if meals exist
-        health_scores = [get_meal_health_score(meal) for meal in day_meals if get_meal_health_score(meal) > 0]
-        avg_health_score = sum(health_scores) / len(health_scores) if health_scores else 0
-        
-        daily_stats.append({
-            "date": date_str,
-            "display_date": display_date,
-            "calories": daily_calories,
-            "protein": daily_protein,
-            "carbs": daily_carbs,
-            "fats": daily_fats,
-            "health_score": avg_health_score,
-            "meals": day_meals
-        })
-        
-        current_date += timedelta(days=1)
-    
-    # Calculate overall statistics
-    all_meal_dates = set(meals_by_date.keys())
-    days_tracked = len(all_meal_dates)
-    total_meals = sum(len(meals) for meals in meals_by_date.values())
-    
-    # Calculate averages for days that have meals
-    if total_meals > 0:
-        avg_calories = sum(get_meal_calories(meal) for meals_list in meals_by_date.values() for meal in meals_list) / total_meals
-        avg_protein = sum(get_meal_protein(meal) for meals_list in meals_by_date.values() for meal in meals_list) / total_meals
-        avg_carbs = sum(get_meal_carbs(meal) for meals_list in meals_by_date.values() for meal in meals_list) / total_meals
-        avg_fats = sum(get_meal_fats(meal) for meals_list in meals_by_date.values() for meal in meals_list) / total_meals
-        
-        # Health score average
-        all_health_scores = [get_meal_health_score(meal) for meals_list in meals_by_date.values() for meal in meals_list if get_meal_health_score(meal) > 0]
-        avg_health_score = sum(all_health_scores) / len(all_health_scores) if all_health_scores else 0
-    else:
-        avg_calories = 0
-        avg_protein = 0
-        avg_carbs = 0
-        avg_fats = 0
-        avg_health_score = 0
-    
-    # Calculate macro distribution
-    total_protein_cals = avg_protein * 4
-    total_carbs_cals = avg_carbs * 4
-    total_fats_cals = avg_fats * 9
-    total_macros_cals = total_protein_cals + total_carbs_cals + total_fats_cals
-    
-    # Avoid division by zero
-    if total_macros_cals > 0:
-        protein_pct = round((total_protein_cals / total_macros_cals) * 100)
-        carbs_pct = round((total_carbs_cals / total_macros_cals) * 100)
-        fats_pct = round((total_fats_cals / total_macros_cals) * 100)
-        
-        # Ensure percentages add up to 100%
-        total = protein_pct + carbs_pct + fats_pct
-        if total != 100:
-            # Adjust the largest value
-            if protein_pct >= carbs_pct and protein_pct >= fats_pct:
-                protein_pct += (100 - total)
-            elif carbs_pct >= protein_pct and carbs_pct >= fats_pct:
-                carbs_pct += (100 - total)
-            else:
-                fats_pct += (100 - total)
-    else:
-        protein_pct = 33
-        carbs_pct = 34
-        fats_pct = 33
-    
-    # Find most frequent foods
-    all_foods = []
-    for meal_list in meals_by_date.values():
-        for meal in meal_list:
-            for ingredient in meal.get("meal_json", {}).get("ingredients", []):
-                if isinstance(ingredient, dict):
-                    food_name = ingredient.get("name") or ingredient.get("food") or ingredient.get("matched_food")
-                elif isinstance(ingredient, str):
-                    food_name = ingredient
-                else:
-                    food_name = None
-                    
-                if food_name:
-                    all_foods.append(food_name.lower())
-    
-    food_counter = Counter(all_foods)
-    most_frequent = [{"name": name.title(), "count": count} for name, count in food_counter.most_common(10)]
+    daily_stats = analytics.build_daily_stats(daily, start_date, today, date_format,
+                                              meals_by_date if include_meals else None)
+    averages = analytics.average_macros(daily)
     
     # Generate response
     return {
-        "summary": {
-            "days_tracked": days_tracked,
-            "avg_calories": round(avg_calories),
-            "avg_health_score": round(avg_health_score, 1),
-            "total_meals": total_meals,
-            "avg_protein": round(avg_protein),
-            "avg_carbs": round(avg_carbs),
-            "avg_fats": round(avg_fats)
-        },
+        "summary": analytics.summarize(daily),
         "daily_stats": daily_stats,
-        "macro_distribution": [
-            {"name": "Protein", "value": protein_pct, "color": "#3B82F6"},
-            {"name": "Carbs", "value": carbs_pct, "color": "#F97316"},
-            {"name": "Fats", "value": fats_pct, "color": "#8B5CF6"}
-        ],
-        "frequent_foods": most_frequent
+        "macro_distribution": analytics.macro_distribution(averages["protein"], averages["carbs"], averages["fats"]),
+        "frequent_foods": analytics.top_foods(in_range_meals)
     }
 
-def generate_and_store_mealplan(user_id, user_profile, num_days=NUM_RECOMMENDATION_DAYS):
-    from prompts import get_mealplan_prompt
+async def generate_and_store_mealplan(user_id, user_profile, num_days=NUM_RECOMMENDATION_DAYS, start_date=None,
+                                      day_numbers=None):
+    llm = get_llm_provider(provider=LLM_PROVIDER, model=OPENAI_MODEL, openai_api_key=OPENAI_KEY)
+    start_date = start_date or datetime.now().date()
+    mealplan_json = await generate_mealplan(llm, user_profile, start_date, num_days, day_numbers=day_numbers)
 
-    llm = LLMProvider(provider=LLM_PROVIDER, model=OPENAI_MODEL, openai_api_key=OPENAI_KEY)
-    prompt = get_mealplan_prompt(user_profile, num_days).format(
-        user_profile=user_profile,
-        num_days=num_days
-    )
-    mealplan_json = llm.ask(prompt).get("response")
-    mealplan_json = json.loads(mealplan_json)  # Should return a dict as per prompt spec
-
-    today = datetime.now().date()
-    
     # Prepare meals for insertion
     meals_to_insert = []
     
     for day_idx in range(num_days):
-        planned_date = (today + timedelta(days=day_idx)).isoformat()
+        planned_date = (start_date + timedelta(days=day_idx)).isoformat()
         day_key = f"day{day_idx+1}"
         day_meals = mealplan_json.get(day_key, {})
         
@@ -756,36 +876,112 @@ def generate_and_store_mealplan(user_id, user_profile, num_days=NUM_RECOMMENDATI
                 meals_to_insert.append(meal_data)
     
     if meals_to_insert:
-        db_service.insert_recommended_meals(meals_to_insert)
+        await run_in_threadpool(db_service.insert_recommended_meals, meals_to_insert)
     
     return mealplan_json
 
 def get_recommended_meals_for_date(user_id, date):
     return db_service.get_recommended_meals_by_date(user_id, date)
 
+def has_valid_profile(user_profile):
+    return len(user_profile or "") > 10
+
+def get_unplanned_day_numbers(user_id, start_date, num_days):
+    """Numbers (1 for start_date) of the days of a range that have no recommended meals yet"""
+    return [
+        day_number for day_number in range(1, num_days + 1)
+        if not get_recommended_meals_for_date(user_id, (start_date + timedelta(days=day_number - 1)).isoformat())
+    ]
+
+async def run_mealplan_job(user_id, start_date, num_days):
+    """
+    Generate and store the days of a meal plan that are not planned yet, for a background job.
+    Fails if some of them could not be generated, after storing the others.
+    """
+    start_date = date.fromisoformat(start_date)
+    day_numbers = await run_in_threadpool(get_unplanned_day_numbers, user_id, start_date, num_days)
+    if not day_numbers:
+        print(f"[recommended-meals] User {user_id} already has a plan from {start_date}, skipping")
+        return
+    
+    user_data = await run_in_threadpool(db_service.get_user, user_id)
+    user_profile = user_data.get("userProfile", "")
+    if not has_valid_profile(user_profile):
+        raise ValueError("User profile is incomplete")
+    
+    mealplan_json = await generate_and_store_mealplan(user_id, user_profile, num_days=num_days,
+                                                      start_date=start_date, day_numbers=day_numbers)
+    missing = [day_number for day_number in day_numbers if day_key(day_number) not in mealplan_json]
+    if missing:
+        raise ValueError(f"Meal plan from {start_date} is missing days {missing}")
+    print(f"[recommended-meals] Generated meal plan days {day_numbers} for user {user_id} from {start_date}")
+
+mealplan_jobs = MealPlanJobQueue(run_mealplan_job)
+
+def job_response(job, status_code=202):
+    """Poll handle of a meal-plan job, with its error if it failed"""
+    return JSONResponse(status_code=status_code, content={
+        "job_id": job["id"],
+        "status": job["status"],
+        "error": job["error"],
+        "status_url": f"/api/meal-plan-jobs/{job['id']}"
+    })
+
+async def prefetch_mealplan(user_id, today):
+    """Queue the next plan once the current one has MEALPLAN_PREFETCH_DAYS or fewer days left"""
+    last_planned_date = await run_in_threadpool(db_service.get_last_planned_date, user_id)
+    if not last_planned_date:
+        return
+    last_planned_date = date.fromisoformat(str(last_planned_date)[:10])
+    if today <= last_planned_date <= today + timedelta(days=MEALPLAN_PREFETCH_DAYS):
+        await mealplan_jobs.submit(user_id, (last_planned_date + timedelta(days=1)).isoformat(), NUM_RECOMMENDATION_DAYS)
+
 @app.post("/api/recommended-meals")
-def generate_recommended_meals(req: RecommendedMealsRequest):
+async def generate_recommended_meals(req: RecommendedMealsRequest):
+    """
+    Get the recommended meals for a date.
+
+    If today has no plan yet, a new one is generated in the background and the
+    response is 202 with a job to poll at status_url; fetch the meals again once
+    it is done. Plans are prefetched before the current one runs out. A plan that
+    failed recently is answered with its failed job instead of being generated again.
+    """
     user_id = req.user_id
     date = req.date
     
     # Get recommended meals for the date
-    meals = get_recommended_meals_for_date(user_id, date)
+    meals = await run_in_threadpool(get_recommended_meals_for_date, user_id, date)
+    
+    today = datetime.now().date()
+    if meals:
+        if date == today.isoformat():
+            await prefetch_mealplan(user_id, today)
+        return meals
     
     # If no meals for today, generate new recommendations
-    today_str = datetime.now().date().isoformat()
-    if not meals and date == today_str:
+    if date == today.isoformat():
         # Get user profile
-        user_data = db_service.get_user(user_id)
-        user_profile = user_data.get("userProfile", "")
+        user_data = await run_in_threadpool(db_service.get_user, user_id)
         
-        if len(user_profile) > 10:  # Make sure we have a valid profile
+        if has_valid_profile(user_data.get("userProfile", "")):  # Make sure we have a valid profile
             print(f"[recommended-meals] User {user_id} requested recommendations for {date}")
-            generate_and_store_mealplan(user_id, user_profile, num_days=NUM_RECOMMENDATION_DAYS)
-            meals = get_recommended_meals_for_date(user_id, date)
-            print(f"[recommended-meals] Generated new meal plan for user {user_id} on {date}")
+            job, created = await mealplan_jobs.submit(user_id, date, NUM_RECOMMENDATION_DAYS)
+            if job["status"] == "failed":
+                print(f"[recommended-meals] Meal plan job {job['id']} for user {user_id} failed recently: {job['error']}")
+            elif not created:
+                print(f"[recommended-meals] Joined running meal plan job {job['id']} for user {user_id}")
+            return job_response(job)
             
     return meals
 
+@app.get("/api/meal-plan-jobs/{job_id}")
+def get_mealplan_job(job_id: str):
+    """Status of a meal-plan job: queued, running, done or failed (with error)"""
+    job = mealplan_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.delete("/api/meals/{meal_id}")
 def delete_meal(meal_id: int, user_id: int = Query(...)):
     """
@@ -804,6 +1000,7 @@ def delete_meal(meal_id: int, user_id: int = Query(...)):
             
         # Delete the meal from the database
         db_service.delete_meal(meal_id)
+        response_cache.invalidate(user_id)
         
         return {"success": True, "message": "Meal deleted successfully"}
     except HTTPException as e:
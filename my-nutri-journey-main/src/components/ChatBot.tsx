@@ -17,6 +17,9 @@ const ChatBot = ({ onBack, userId, userProfile }) => {
     }
   ]);
   const [inputMessage, setInputMessage] = useState('');
+  // Conversation stored by the backend, so only new messages are sent. Holds the promise of its id,
+  // created with the first message; an id of null falls back to sending chat_history
+  const conversationRef = useRef(null);
   const messagesEndRef = useRef(null);
 
   const scrollToBottom = () => {
@@ -27,6 +30,30 @@ const ChatBot = ({ onBack, userId, userProfile }) => {
     scrollToBottom();
   }, [messages]);
 
+  const createConversation = async () => {
+    try {
+      const res = await fetch(`${API_BASE_URL}/api/conversations`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ user_id: userId })
+      });
+      return res.ok ? (await res.json()).id : null;
+    } catch (e) {
+      // Keep sending the chat history with each message
+      return null;
+    }
+  };
+
+  // Chats that are opened but never used don't create a conversation
+  const getConversationId = () => {
+    if (!conversationRef.current) conversationRef.current = createConversation();
+    return conversationRef.current;
+  };
+
+  useEffect(() => {
+    conversationRef.current = null;
+  }, [userId]);
+
   const quickQuestions = [
     "What's a healthy breakfast for weight loss?",
     "How much protein should I eat daily?",
@@ -35,29 +62,65 @@ const ChatBot = ({ onBack, userId, userProfile }) => {
     "Best foods for muscle building?"
   ];
 
-  const getBotResponse = async (userMessage) => {
-    const body = {
-      user_id: userId,
-      message: userMessage,
-      chat_history: messages.map(m => ({
-        type: m.type,
-        message: m.message
-      }))
-    };
-    //console.log("Sending to /api/chatbot:", body); // <-- Print body for debug
+  // Streams the reply from /api/chatbot/stream (Server-Sent Events), calling onToken with the text so far
+  const getBotResponse = async (userMessage, onToken) => {
+    const conversationId = await getConversationId();
+    const body = conversationId
+      ? { user_id: userId, message: userMessage, conversation_id: conversationId }
+      : {
+          user_id: userId,
+          message: userMessage,
+          chat_history: messages.map(m => ({
+            type: m.type,
+            message: m.message
+          }))
+        };
+    //console.log("Sending to /api/chatbot/stream:", body); // <-- Print body for debug
+    let reply = '';
     try {
-      const res = await fetch(`${API_BASE_URL}/api/chatbot`, {
+      const res = await fetch(`${API_BASE_URL}/api/chatbot/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(body)
       });
-      const data = await res.json();
-      return data.response;
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const rawEvent of events) {
+          const lines = rawEvent.split('\n');
+          const event = lines.find(line => line.startsWith('event: '))?.slice(7);
+          const dataLine = lines.find(line => line.startsWith('data: '));
+          if (!dataLine) continue;
+          const data = JSON.parse(dataLine.slice(6));
+          if (event === 'token') {
+            reply += data.content;
+            onToken(reply);
+          } else if (event === 'error') {
+            throw new Error(data.error);
+          }
+        }
+      }
+      return reply;
     } catch (e) {
-      return "Sorry, I couldn't process your request. Please try again.";
+      return reply || "Sorry, I couldn't process your request. Please try again.";
     }
   };
 
+  // Adds the bot reply, or replaces it while it is still streaming in
+  const showBotReply = (id, message) => {
+    setMessages(prev => [
+      ...prev.filter(m => m.id !== id),
+      { id, type: 'bot', message, timestamp: new Date() }
+    ]);
+  };
+
   const handleSendMessage = async (e) => {
     e.preventDefault();
     if (!inputMessage.trim()) return;
@@ -73,14 +136,9 @@ const ChatBot = ({ onBack, userId, userProfile }) => {
     setInputMessage('');
 
     // Call backend for LLM response
-    const botReply = await getBotResponse(inputMessage);
-    const botResponse = {
-      id: messages.length + 2,
-      type: 'bot',
-      message: botReply,
-      timestamp: new Date()
-    };
-    setMessages(prev => [...prev, botResponse]);
+    const botId = messages.length + 2;
+    const botReply = await getBotResponse(inputMessage, reply => showBotReply(botId, reply));
+    showBotReply(botId, botReply);
   };
 
   const handleQuickQuestion = async (question) => {
@@ -93,14 +151,9 @@ const ChatBot = ({ onBack, userId, userProfile }) => {
 
     setMessages([...messages, userMessage]);
 
-    const botReply = await getBotResponse(question);
-    const botResponse = {
-      id: messages.length + 2,
-      type: 'bot',
-      message: botReply,
-      timestamp: new Date()
-    };
-    setMessages(prev => [...prev, botResponse]);
+    const botId = messages.length + 2;
+    const botReply = await getBotResponse(question, reply => showBotReply(botId, reply));
+    showBotReply(botId, botReply);
   };
 
   // Add reset handler
@@ -114,6 +167,7 @@ const ChatBot = ({ onBack, userId, userProfile }) => {
       }
     ]);
     setInputMessage('');
+    conversationRef.current = null;
   };
 
   return (
@@ -11,6 +11,7 @@ import RecommendedMeals from './RecommendedMeals';
 import { useNavigate } from 'react-router-dom';
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
+const RECOMMENDATION_POLL_INTERVAL_MS = 2000;
 
 const HomePage = ({ onMealClick, onViewChange }) => {
   const [selectedDate, setSelectedDate] = useState(new Date());
@@ -92,20 +93,42 @@ const HomePage = ({ onMealClick, onViewChange }) => {
   useEffect(() => {
     if (!userId || !selectedDate) return;
 
+    let cancelled = false;
+
+    // Fix: Format date directly without timezone conversion
+    const dateStr = format(selectedDate, 'yyyy-MM-dd');
+    const requestRecommendedMeals = () => fetch(`${API_BASE_URL}/api/recommended-meals`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ user_id: userId, date: dateStr }),
+    });
+
     const fetchRecommendedMeals = async () => {
       setLoadingRecommendations(true);
       
-      // Fix: Format date directly without timezone conversion
-      const dateStr = format(selectedDate, 'yyyy-MM-dd');
-      
       console.log(`Fetching recommended meals for date: ${dateStr}`);
       try {
-        const res = await fetch(`${API_BASE_URL}/api/recommended-meals`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({ user_id: userId, date: dateStr }),
-        });
-        if (res.ok) {
+        let res = await requestRecommendedMeals();
+
+        // 202: a new meal plan is being generated in the background, poll until it is done
+        if (res.status === 202) {
+          const job = await res.json();
+          let status = job.status;
+          while (!cancelled && (status === 'queued' || status === 'running')) {
+            await new Promise(resolve => setTimeout(resolve, RECOMMENDATION_POLL_INTERVAL_MS));
+            const jobRes = await fetch(`${API_BASE_URL}${job.status_url}`);
+            status = jobRes.ok ? (await jobRes.json()).status : 'failed';
+          }
+          if (cancelled) return;
+          if (status !== 'done') {
+            setRecommendedMeals([]);
+            return;
+          }
+          res = await requestRecommendedMeals();
+        }
+
+        if (cancelled) return;
+        if (res.ok && res.status !== 202) {
           const data = await res.json();
           console.log(`Received ${data.length} recommended meals for ${dateStr}`);
           setRecommendedMeals(data);
@@ -114,13 +137,14 @@ const HomePage = ({ onMealClick, onViewChange }) => {
         }
       } catch (error) {
         console.error("Error fetching recommended meals:", error);
-        setRecommendedMeals([]);
+        if (!cancelled) setRecommendedMeals([]);
       } finally {
-        setLoadingRecommendations(false);
+        if (!cancelled) setLoadingRecommendations(false);
       }
     };
 
     fetchRecommendedMeals();
+    return () => { cancelled = true; };
   }, [userId, selectedDate]);
 
   // Calculate daily nutrients from logged meals
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { ArrowLeft, TrendingUp, Calendar, Utensils, PieChart as PieChartIcon, Activity } from 'lucide-react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
@@ -57,6 +57,12 @@ const ProgressAnalytics = ({ onBack }) => {
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState(null);
   const [userId, setUserId] = useState(null);
+  // Meals of the day clicked in the calorie chart, fetched a page at a time
+  const [selectedDay, setSelectedDay] = useState(null);
+  const [dayMeals, setDayMeals] = useState([]);
+  const [dayNextOffset, setDayNextOffset] = useState(null);
+  const [isLoadingDayMeals, setIsLoadingDayMeals] = useState(false);
+  const selectedDateRef = useRef(null);
   const dateRangeDisplay = getDateRangeDisplay(timeframe);
 
   // Fetch user ID from localStorage
@@ -74,9 +80,11 @@ const ProgressAnalytics = ({ onBack }) => {
     const fetchAnalytics = async () => {
       setIsLoading(true);
       setError(null);
+      setSelectedDay(null);
+      selectedDateRef.current = null;
 
       try {
-        const response = await fetch(`${API_BASE_URL}/api/analytics?user_id=${userId}&timeframe=${timeframe}`);
+        const response = await fetch(`${API_BASE_URL}/api/analytics?user_id=${userId}&timeframe=${timeframe}&include_meals=false`);
         
         if (!response.ok) {
           throw new Error(`HTTP error! Status: ${response.status}`);
@@ -86,17 +94,10 @@ const ProgressAnalytics = ({ onBack }) => {
         
         // Fix days tracked calculation if needed
         if (data.daily_stats && data.daily_stats.length > 0) {
-          // Count unique dates that have data, regardless of meals array
+          // Count unique dates that have meals
           const uniqueDatesWithData = new Set(
             data.daily_stats
-              .filter(day => {
-                // Consider a day valid if it has meals OR it has calories/macros directly
-                return (day.meals && day.meals.length > 0) || 
-                       day.calories > 0 || 
-                       day.protein > 0 || 
-                       day.carbs > 0 || 
-                       day.fats > 0;
-              })
+              .filter(day => day.meal_count > 0)
               .map(day => day.date)
           );
           
@@ -117,48 +118,15 @@ const ProgressAnalytics = ({ onBack }) => {
                 day: 'numeric'
               });
               
-              // Extract data from meal_json field if it exists
-              let calories = 0, protein = 0, carbs = 0, fats = 0, health_score = 0;
-              
-              // If stat.meals exists and is an array of meals
-              if (stat.meals && Array.isArray(stat.meals)) {
-                // Calculate averages from all meals for the day
-                let mealCount = stat.meals.length;
-                let totalHealthScore = 0;
-                
-                stat.meals.forEach(meal => {
-                  const mealJson = meal.meal_json || {};
-                  const macros = mealJson.macronutrients || {};
-                  
-                  // Add up macros
-                  calories += macros.calories || 0;
-                  protein += macros.protein || macros.proteins || 0;  // Check both for compatibility
-                  carbs += macros.carbs || 0;
-                  fats += macros.fats || macros.fat || 0;
-                  
-                  // Add health score to total
-                  totalHealthScore += mealJson.health_score || 0;
-                });
-                
-                // Calculate average health score
-                health_score = mealCount > 0 ? totalHealthScore / mealCount : 0;
-              } else {
-                // Use the legacy data structure if meal_json is not available
-                calories = stat.calories || 0;
-                protein = stat.protein || 0;
-                carbs = stat.carbs || 0;
-                fats = stat.fats || 0;
-                health_score = stat.health_score || 0;
-              }
-              
+              // Daily totals come from the server; a day's meals are fetched on demand
               return {
                 ...stat,
                 display_date: formattedDate,
-                calories: calories,
-                protein: protein,  // Changed from "proteins" to "protein"
-                carbs: carbs,
-                fats: fats,
-                health_score: health_score
+                calories: stat.calories || 0,
+                protein: stat.protein || 0,
+                carbs: stat.carbs || 0,
+                fats: stat.fats || 0,
+                health_score: stat.health_score || 0
               };
             } catch (e) {
               console.error(`Error processing stat for date ${stat.date}:`, e);
@@ -208,8 +176,7 @@ const ProgressAnalytics = ({ onBack }) => {
             if (data.daily_stats.length > 0) {
               // Sort dates to find the oldest one with data
               const datesWithData = data.daily_stats
-                .filter(day => (day.meals && day.meals.length > 0) || 
-                        day.calories > 0 || day.protein > 0 || day.carbs > 0 || day.fats > 0)
+                .filter(day => day.meal_count > 0)
                 .map(day => new Date(day.date).getTime());
               
               if (datesWithData.length > 0) {
@@ -277,7 +244,7 @@ const ProgressAnalytics = ({ onBack }) => {
                   carbs: 0,
                   fats: 0,
                   health_score: 0,
-                  meals: []
+                  meal_count: 0
                 });
               }
             }
@@ -300,6 +267,36 @@ const ProgressAnalytics = ({ onBack }) => {
     fetchAnalytics();
   }, [userId, timeframe]);
 
+  // Fetch a page of a day's meals, appending it to the meals already shown for that day
+  const fetchDayMeals = async (date, offset) => {
+    setIsLoadingDayMeals(true);
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/analytics/day?user_id=${userId}&date=${date}&offset=${offset}`);
+      if (!response.ok) {
+        throw new Error(`HTTP error! Status: ${response.status}`);
+      }
+      const data = await response.json();
+      // Ignore pages of a day that is no longer selected
+      if (selectedDateRef.current !== date) return;
+      setDayMeals(previous => offset > 0 ? [...previous, ...data.meals] : data.meals);
+      setDayNextOffset(data.next_offset);
+    } catch (err) {
+      console.error(`Error fetching meals for ${date}:`, err);
+    } finally {
+      if (selectedDateRef.current === date) setIsLoadingDayMeals(false);
+    }
+  };
+
+  const handleDayClick = (chartState) => {
+    const day = chartState?.activePayload?.[0]?.payload;
+    if (!day || !day.meal_count) return;
+    selectedDateRef.current = day.date;
+    setSelectedDay(day);
+    setDayMeals([]);
+    setDayNextOffset(null);
+    fetchDayMeals(day.date, 0);
+  };
+
   // Helper function to get appropriate color for health score
   const getHealthScoreColor = (score) => {
     if (score >= 8.5) return 'bg-green-500';
@@ -454,7 +451,7 @@ const ProgressAnalytics = ({ onBack }) => {
         </CardHeader>
         <CardContent>
           <ResponsiveContainer width="100%" height={200}>
-            <LineChart data={daily_stats}>
+            <LineChart data={daily_stats} onClick={handleDayClick}>
               <CartesianGrid strokeDasharray="3 3" />
               <XAxis dataKey="display_date" />
               <YAxis />
@@ -469,6 +466,38 @@ const ProgressAnalytics = ({ onBack }) => {
               />
             </LineChart>
           </ResponsiveContainer>
+          {selectedDay ? (
+            <div className="mt-4 border-t pt-4">
+              <div className="flex items-center justify-between mb-2">
+                <h3 className="font-medium text-gray-800">Meals on {selectedDay.display_date}</h3>
+                <Button variant="ghost" size="sm" onClick={() => { selectedDateRef.current = null; setSelectedDay(null); }}>
+                  Close
+                </Button>
+              </div>
+              <ul className="space-y-2">
+                {dayMeals.map((meal) => (
+                  <li key={meal.id} className="flex items-center justify-between text-sm">
+                    <div className="flex items-center gap-2">
+                      <Badge variant="outline" className="capitalize">{meal.meal_type}</Badge>
+                      <span>{meal.meal_json?.dish_name || 'Meal'}</span>
+                    </div>
+                    <span className="text-gray-600">
+                      {Math.round(meal.meal_json?.macronutrients?.calories || 0)} kcal
+                    </span>
+                  </li>
+                ))}
+              </ul>
+              {isLoadingDayMeals && <p className="text-sm text-gray-500 mt-2">Loading meals...</p>}
+              {!isLoadingDayMeals && dayNextOffset !== null && (
+                <Button variant="outline" size="sm" className="mt-2"
+                        onClick={() => fetchDayMeals(selectedDay.date, dayNextOffset)}>
+                  Load more
+                </Button>
+              )}
+            </div>
+          ) : (
+            <p className="text-sm text-gray-500 mt-2">Click a day to see its meals.</p>
+          )}
         </CardContent>
       </Card>
 